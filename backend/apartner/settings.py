@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.QueryCountMiddleware",
+    "core.middleware.OffloadEmulationMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
@@ -67,6 +69,17 @@ MIDDLEWARE = [
 ]
 SESSION_ENGINE = "django.contrib.sessions.backends.db"
 
+# Per-request query headers and view query budgets, see core.middleware.
+QUERY_COUNT_HEADERS = DEBUG
+QUERY_BUDGET_RAISE = False
+
+# Upper bound on the sub-requests of one /batch/ call, see core.batch.
+BATCH_MAX_REQUESTS = 10
+
+# Offline address geocoding (core.geo); GEOCODER is a `(city, street)` callable.
+GEOCODER = "core.geo.gazetteer_geocode"
+GEO_GAZETTEER_PATH = BASE_DIR / "gazetteer.csv"
+
 INTERNAL_IPS = [
     # ...
     "127.0.0.1",
@@ -126,6 +139,20 @@ DATABASES = {
 if "DATABASE_URL" in os.environ:
     DATABASES["default"] = dj_database_url.config(conn_max_age=600, ssl_require=True)
 
+# Shared by all processes (core.feedcache); REDIS_URL switches it to Redis.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "apartner_cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+if "REDIS_URL" in os.environ:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+    }
+
 
 AUTH_USER_MODEL = "core.CustomUser"
 
@@ -170,6 +197,23 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "../frontend/build/static")]
 
+# Protected downloads are streamed by Django unless offloaded, see core.downloads.
+PROTECTED_MEDIA_OFFLOAD = None
+PROTECTED_MEDIA_INTERNAL_URL = "/protected-media/"
+PROTECTED_MEDIA_OFFLOAD_EMULATE = False
+
+# Resized copies of uploaded photos and avatars, see core.images.
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024)
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_DERIVATIVE_QUEUE_SIZE = 32
+IMAGE_DERIVATIVES_ASYNC = True
+IMAGE_DERIVATIVES_JOB_QUEUE = True
+
+# Limits and re-encoding of photo and avatar uploads, see core.uploads.
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_UPLOAD_MAX_DIMENSION = 2048
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -217,6 +261,11 @@ SIMPLE_JWT = {
 
 JWT_AUTH_USER_MODEL = "core.CustomUser"
 
+# JWT token and user caches, see login.cache.
+JWT_TOKEN_CACHE_SIZE = 1024
+JWT_USER_CACHE_SIZE = 1024
+JWT_USER_CACHE_TTL = 60
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "localhost"
 EMAIL_HOST_USER = ""
@@ -224,6 +273,25 @@ EMAIL_HOST_PASSWORD = ""
 EMAIL_PORT = 2525
 DEFAULT_FROM_EMAIL = "admin@admin.com"
 
+# Outgoing mail queue, delivered by `manage.py send_queued_email`.
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF = 60
+EMAIL_OUTBOX_MAX_BACKOFF = 3600
+EMAIL_OUTBOX_LEASE = 300
+
+# Background jobs (core.jobs), run by `manage.py run_jobs`.
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 30
+JOB_TIMEOUT = 600
+
+# Cached feed and owner dashboard responses, see core.feedcache.
+FEED_CACHE_ALIAS = "default"
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_CACHE_LOCK_TIMEOUT = 10
+
+# Lower edges of the /core/feed/facets/ price buckets (core.facets).
+FACET_PRICE_BUCKETS = [0, 1000, 2000, 3000, 5000]
+
 ADMINS = [("admin", "admin@admin.com")]
 
 LOGIN_REDIRECT_URL = "/home/"
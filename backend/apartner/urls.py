@@ -20,6 +20,7 @@ from django.urls import path, include
 import debug_toolbar
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_nested import routers
+from core.batch import BatchView
 
 admin.site.site_header = 'Apartner Admin'
 admin.site.index_title = 'Admin'
@@ -35,6 +36,7 @@ urlpatterns = [
     path('owner/', include(('owner.urls', 'owner'), namespace='owner'),name = 'owner'),
     path('searcher/', include(('searcher.urls', 'searcher'), namespace='searcher'),name = 'searcher'),
     path('renter/', include(('renter.urls', 'renter'), namespace='renter'),name = 'renter'),
+    path('batch/', BatchView.as_view(), name='batch'),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
     path('__debug__/', include(debug_toolbar.urls)),
@@ -1,6 +1,7 @@
 from urllib.parse import urlencode
 from django.contrib import admin
 from django.db.models.aggregates import Count
+from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import reverse
 from . import models
@@ -167,3 +168,35 @@ admin.site.register(Bill, BillAdmin)
 
 
 admin.site.register(models.CustomUser, CustomUserAdmin)
+
+
+@admin.register(models.OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ["id", "subject", "status", "attempts", "next_attempt_at", "sent_at"]
+    list_filter = ["status"]
+    readonly_fields = ["created_at", "sent_at", "last_error"]
+    actions = ["retry"]
+
+    @admin.action(description="Retry selected emails")
+    def retry(self, request, queryset):
+        queryset.update(
+            status=models.OutgoingEmail.Status.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+
+
+@admin.register(models.Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = [
+        "id",
+        "name",
+        "status",
+        "priority",
+        "run_at",
+        "attempts",
+        "duration_ms",
+        "wait_ms",
+    ]
+    list_filter = ["status", "name"]
+    readonly_fields = ["created_at", "started_at", "finished_at", "last_error"]
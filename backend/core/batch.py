@@ -0,0 +1,157 @@
+import json
+import logging
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework import permissions, serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Response headers passed back for each sub-request.
+FORWARDED_HEADERS = ("ETag", "Last-Modified")
+
+# Conditional headers of the batch itself, which do not apply to its items.
+CONDITIONAL_HEADERS = ("HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE")
+
+
+def get_max_requests():
+    return getattr(settings, "BATCH_MAX_REQUESTS", 10)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=["GET"], default="GET")
+    path = serializers.CharField()
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate_path(self, value):
+        if not value.startswith("/") or value.startswith("//"):
+            raise serializers.ValidationError("Must be a path relative to the site.")
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > get_max_requests():
+            raise serializers.ValidationError(
+                f"At most {get_max_requests()} requests per batch."
+            )
+        return value
+
+
+def build_subrequest(request, path, headers=None):
+    """
+    Build a GET request for `path` that carries the headers, cookies and
+    authentication result of the batch `request`.
+    """
+    url = urlsplit(path)
+    environ = {
+        key: value
+        for key, value in request.META.items()
+        if not key.startswith("CONTENT_") and key not in CONDITIONAL_HEADERS
+    }
+    environ.update(
+        {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "wsgi.input": BytesIO(),
+            "wsgi.url_scheme": request.scheme,
+        }
+    )
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    subrequest = WSGIRequest(environ)
+    subrequest.user = request.user
+    subrequest._dont_enforce_csrf_checks = True
+    # Reuse the token validated for the batch (see RequestAuthentication).
+    jwt_auth = getattr(request._request, "jwt_auth", None)
+    if jwt_auth is not None:
+        subrequest.jwt_auth = jwt_auth
+    return subrequest
+
+
+def get_body(response):
+    if response.status_code == status.HTTP_304_NOT_MODIFIED:
+        return None
+    if hasattr(response, "data"):
+        return response.data
+    if response.streaming:
+        return None
+    if hasattr(response, "render"):
+        response.render()
+    if response.get("Content-Type", "").startswith("application/json"):
+        return json.loads(response.content)
+    return response.content.decode(response.charset, errors="replace")
+
+
+def run_subrequest(request, item):
+    """Resolve and run one batch item in-process; return its result entry."""
+    path = item["path"]
+    entry = {"path": path}
+    subrequest = build_subrequest(request, path, item.get("headers"))
+    try:
+        match = resolve(subrequest.path_info)
+        if getattr(match.func, "view_class", None) is BatchView:
+            raise PermissionDenied("Batches cannot be nested.")
+        subrequest.resolver_match = match
+        response = match.func(subrequest, *match.args, **match.kwargs)
+    except (Http404, Resolver404):
+        entry.update(status=status.HTTP_404_NOT_FOUND, body=None)
+        return entry
+    except PermissionDenied as error:
+        entry.update(status=status.HTTP_403_FORBIDDEN, body={"detail": str(error)})
+        return entry
+    except Exception:
+        logger.exception("Batch sub-request %s failed", path)
+        entry.update(status=status.HTTP_500_INTERNAL_SERVER_ERROR, body=None)
+        return entry
+    entry["status"] = response.status_code
+    entry["headers"] = {
+        name: response[name] for name in FORWARDED_HEADERS if response.has_header(name)
+    }
+    entry["body"] = get_body(response)
+    return entry
+
+
+class BatchView(APIView):
+    """
+    Runs up to `BATCH_MAX_REQUESTS` GET requests in one round trip:
+
+        POST /batch/
+        {"requests": [
+            {"path": "/renter/my-room/"},
+            {"path": "/renter/my-bills/", "headers": {"If-None-Match": "..."}}
+        ]}
+
+    Each request goes through the URL resolver in-process, as the user that
+    authenticated the batch. The response lists `{path, status, headers,
+    body}` per request, in order; a failing request does not fail the batch.
+
+    The resolved views are called directly, so sub-requests skip the
+    middleware stack: only the batch itself passes through it (and its query
+    counts and budgets include every sub-request), and headers set by
+    middleware are not part of the per-request results.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            {
+                "responses": [
+                    run_subrequest(request, item)
+                    for item in serializer.validated_data["requests"]
+                ]
+            }
+        )
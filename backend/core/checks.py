@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+LOCMEM_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+@register(Tags.caches)
+def check_feed_cache(app_configs, **kwargs):
+    """
+    The feed cache holds version counters and recompute locks that every
+    process must see; a per-process LocMemCache would let each process serve
+    its own stale entries for up to `FEED_CACHE_TIMEOUT`.
+    """
+    alias = getattr(settings, "FEED_CACHE_ALIAS", "default")
+    config = settings.CACHES.get(alias)
+    if config is None:
+        return [
+            Error(
+                f"FEED_CACHE_ALIAS {alias!r} is not configured in CACHES.",
+                id="core.E002",
+            )
+        ]
+    if config.get("BACKEND") != LOCMEM_BACKEND:
+        return []
+    message = f"The feed cache {alias!r} is a per-process LocMemCache."
+    hint = "Use a shared backend such as DatabaseCache or RedisCache."
+    if settings.DEBUG:
+        return [Warning(message, hint=hint, id="core.W001")]
+    return [Error(message, hint=hint, id="core.E001")]
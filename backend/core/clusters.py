@@ -0,0 +1,152 @@
+import hashlib
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min, Q
+from django.db.models.functions import Substr
+from rest_framework import serializers
+
+from .feedcache import get_feed_cache, get_feed_version, normalize_query
+from .geo import GEOHASH_PRECISION, cell_size, encode_geohash, parse_bbox
+
+MAX_ZOOM = 20
+
+# Upper bound on the tiles one viewport may cover; a client asking for more
+# has sent a zoom level that does not match its viewport.
+MAX_TILES = 64
+
+# Query parameters that select tiles rather than rows.
+TILE_PARAMS = {"bbox", "zoom", "near", "radius", "ordering", "page", "cursor"}
+
+
+class ClusterQuerySerializer(serializers.Serializer):
+    bbox = serializers.CharField()
+    zoom = serializers.IntegerField(min_value=0, max_value=MAX_ZOOM)
+
+    def validate_bbox(self, value):
+        return parse_bbox(value)
+
+
+def tile_precision(zoom):
+    """
+    The geohash precision of the tiles at a map zoom level: the finest one
+    whose cells are still as wide as a 256px map tile. Clusters are the
+    cells one level finer, so a tile holds at most 32 of them.
+    """
+    tile_width = 360.0 / 2**zoom
+    precision = 1
+    for candidate in range(1, GEOHASH_PRECISION):
+        if cell_size(candidate)[1] < tile_width:
+            break
+        precision = candidate
+    return precision
+
+
+def grid_range(start, end, step):
+    first = math.floor(start / step)
+    return range(first, max(math.ceil(end / step), first + 1))
+
+
+def covering_tiles(bbox, precision):
+    """Return the geohash cells at `precision` that cover a bounding box."""
+    west, south, east, north = bbox
+    height, width = cell_size(precision)
+    spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    rows = grid_range(south + 90, north + 90, height)
+    tiles = []
+    for start, end in spans:
+        columns = grid_range(start + 180, end + 180, width)
+        if len(tiles) + len(rows) * len(columns) > MAX_TILES:
+            raise serializers.ValidationError(
+                {"zoom": "The bounding box is too large for this zoom level."}
+            )
+        for row in rows:
+            latitude = min(-90 + (row + 0.5) * height, 90.0)
+            for column in columns:
+                longitude = min(-180 + (column + 0.5) * width, 180.0)
+                tiles.append(encode_geohash(latitude, longitude, precision))
+    return list(dict.fromkeys(tiles))
+
+
+def aggregate_tiles(queryset, tiles, precision):
+    """
+    Aggregate the rows of `queryset` in `tiles` into their clusters with one
+    grouped query. Returns `{tile: [cluster, ...]}` with an entry per tile.
+    """
+    in_tiles = Q()
+    for tile in tiles:
+        in_tiles |= Q(geohash__startswith=tile)
+    rows = (
+        queryset.filter(in_tiles)
+        .annotate(cell=Substr("geohash", 1, precision + 1))
+        .order_by()
+        .values("cell")
+        .annotate(
+            count=Count("pk"),
+            min_price=Min("price_per_month"),
+            max_price=Max("price_per_month"),
+            latitude=Avg("latitude"),
+            longitude=Avg("longitude"),
+        )
+        .order_by("cell")
+    )
+    clusters = defaultdict(list)
+    for row in rows:
+        clusters[row["cell"][:precision]].append(
+            {
+                "geohash": row["cell"],
+                "count": row["count"],
+                "min_price": row["min_price"],
+                "max_price": row["max_price"],
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+            }
+        )
+    return {tile: clusters.get(tile, []) for tile in tiles}
+
+
+def get_clusters(request, queryset, filterset_class):
+    """
+    Return the map clusters of the vacant rooms in `?bbox=` at `?zoom=`,
+    narrowed by the other filter parameters of `filterset_class`. The caller
+    applies `?search=` to `queryset`; it is part of the cache key like the
+    filter parameters.
+
+    Clusters are computed and cached per tile (a geohash cell sized to the
+    zoom level) under the feed version, so panning only aggregates the tiles
+    not seen yet, in one query, and any write to the feed invalidates them.
+    """
+    params = ClusterQuerySerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    precision = tile_precision(params.validated_data["zoom"])
+    tiles = covering_tiles(params.validated_data["bbox"], precision)
+
+    data = request.query_params.copy()
+    for name in TILE_PARAMS:
+        data.pop(name, None)
+    filterset = filterset_class(data, queryset=queryset, request=request)
+    if not filterset.is_valid():
+        raise serializers.ValidationError(filterset.errors)
+
+    cache = get_feed_cache()
+    version = get_feed_version(cache)
+    digest = hashlib.sha1(normalize_query(data).encode("utf-8")).hexdigest()
+    keys = {tile: f"feed:clusters:{digest}:{tile}" for tile in tiles}
+    cached = {
+        key: entry[1]
+        for key, entry in cache.get_many(keys.values()).items()
+        if entry[0] == version
+    }
+    missing = [tile for tile, key in keys.items() if key not in cached]
+    if missing:
+        fresh = aggregate_tiles(filterset.qs, missing, precision)
+        cache.set_many(
+            {keys[tile]: (version, clusters) for tile, clusters in fresh.items()},
+            getattr(settings, "FEED_CACHE_TIMEOUT", 86400),
+        )
+        cached.update((keys[tile], clusters) for tile, clusters in fresh.items())
+    return {
+        "zoom": params.validated_data["zoom"],
+        "clusters": [cluster for tile in tiles for cluster in cached[keys[tile]]],
+    }
@@ -0,0 +1,94 @@
+import hashlib
+from datetime import datetime
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .feedcache import STALE, get_versions
+
+
+class ConditionalGetMixin:
+    """
+    Adds `ETag` and `Last-Modified` to `list` and `retrieve` and answers
+    `If-None-Match`/`If-Modified-Since` with a 304 without building the body.
+
+    The validators come from one aggregate over the filtered queryset (row
+    count, highest pk and latest `conditional_updated_field`) plus the
+    `conditional_versions` counters, which `core.signals` bumps on writes to
+    the nested models and on deletes. `retrieve` relies on `get_queryset`
+    being scoped to what the user may see, as object permissions are only
+    checked when the body is built. Stale feed cache bodies are sent without
+    validators.
+    """
+
+    conditional_updated_field = "updated_at"
+    conditional_versions = ("feed",)
+
+    def get_conditional_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == "retrieve":
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        return queryset
+
+    def get_validators(self, request):
+        """Return `(etag, last_modified)`, or None when there is nothing to validate."""
+        aggregates = {"count": Count("pk"), "top": Max("pk")}
+        if self.conditional_updated_field:
+            aggregates["last"] = Max(self.conditional_updated_field)
+        stats = self.get_conditional_queryset().order_by().aggregate(**aggregates)
+        if self.action == "retrieve" and not stats["count"]:
+            return None
+
+        versions = get_versions(self.conditional_versions)
+        timestamps = [changed for _, changed in versions.values()]
+        if isinstance(stats.get("last"), datetime):
+            timestamps.append(stats["last"].timestamp())
+        last_modified = None
+        if timestamps and None not in timestamps:
+            last_modified = int(max(timestamps))
+
+        user = request.user
+        raw = "|".join(
+            str(part)
+            for part in (
+                request.build_absolute_uri(),
+                request.accepted_renderer.format,
+                user.pk if user.is_authenticated else "",
+                sorted(version for version, _ in versions.values()),
+                stats["count"],
+                stats["top"],
+                stats.get("last"),
+            )
+        )
+        etag = 'W/"%s"' % hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return etag, last_modified
+
+    def conditional(self, handler, request, *args, **kwargs):
+        validators = self.get_validators(request)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.get("X-Feed-Cache") == STALE:
+                # The body predates the validators; a client revalidating
+                # with them would keep the stale copy.
+                return response
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,212 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+X_ACCEL_REDIRECT = "x-accel-redirect"
+X_SENDFILE = "x-sendfile"
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range `Range` header into an inclusive `(start, end)` pair.
+    Returns None when the header should be ignored (missing, malformed or
+    multi-range) and raises ValueError when the range is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or (last and end < start):
+        raise ValueError
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, last_modified):
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/"')):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    # A date only validates the range when it is exactly the Last-Modified.
+    return date is not None and date == int(last_modified)
+
+
+def read_chunks(file_path, start, length, chunk_size=CHUNK_SIZE):
+    with open(file_path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, file_path, content_type=None, filename=None):
+    """
+    Send `file_path` as an attachment. Without `content_type` it is guessed
+    from the file name, including the `Content-Encoding`.
+
+    With `PROTECTED_MEDIA_OFFLOAD` set, files under `MEDIA_ROOT` are handed
+    to the front proxy through `X-Accel-Redirect`/`X-Sendfile`; otherwise
+    they are streamed by `stream_file()`.
+    """
+    encoding = None
+    if content_type is None:
+        content_type, encoding = mimetypes.guess_type(file_path)
+        content_type = content_type or "application/octet-stream"
+    filename = filename or os.path.basename(file_path)
+
+    response = offload_file(file_path, content_type, encoding, filename)
+    if response is None:
+        response = stream_file(request, file_path, content_type, encoding, filename)
+    return response
+
+
+def offload_file(file_path, content_type, encoding, filename):
+    mode = getattr(settings, "PROTECTED_MEDIA_OFFLOAD", None)
+    if not mode:
+        return None
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real_path = os.path.realpath(file_path)
+    if os.path.commonpath([media_root, real_path]) != media_root:
+        return None
+
+    response = HttpResponse(content_type=content_type)
+    if mode == X_ACCEL_REDIRECT:
+        relative = os.path.relpath(real_path, media_root).replace(os.sep, "/")
+        internal_url = settings.PROTECTED_MEDIA_INTERNAL_URL.rstrip("/")
+        response["X-Accel-Redirect"] = f"{internal_url}/{quote(relative)}"
+    elif mode == X_SENDFILE:
+        response["X-Sendfile"] = real_path
+    else:
+        raise ImproperlyConfigured(
+            f"Unknown PROTECTED_MEDIA_OFFLOAD mode {mode!r}, expected "
+            f"{X_ACCEL_REDIRECT!r} or {X_SENDFILE!r}."
+        )
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return response
+
+
+def stream_file(request, file_path, content_type, encoding=None, filename=None):
+    """
+    Stream `file_path` in fixed-size chunks, so memory per download stays
+    constant. Sends `ETag`/`Last-Modified`, answers conditional requests
+    with 304, and honours single byte ranges with 206 (or 416 when
+    unsatisfiable).
+    """
+    stat = os.stat(file_path)
+    size = stat.st_size
+    etag = file_etag(stat)
+    last_modified = stat.st_mtime
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified)
+    )
+    if response is None:
+        try:
+            byte_range = None
+            if request.method == "GET" and if_range_matches(
+                request, etag, last_modified
+            ):
+                byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            response["Accept-Ranges"] = "bytes"
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+        response = StreamingHttpResponse(
+            read_chunks(file_path, start, length), content_type=content_type
+        )
+        if byte_range is not None:
+            response.status_code = 206
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(length)
+        response["Content-Disposition"] = (
+            f"attachment; filename={filename or os.path.basename(file_path)}"
+        )
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+class OffloadContractError(AssertionError):
+    pass
+
+
+def emulate_offload(request, response):
+    """
+    Local stand-in for the front proxy: check that an offloaded response
+    honours the header contract (empty 200 body, a location that maps to a
+    file under `MEDIA_ROOT`) and serve the file the way the proxy would.
+    Responses without an offload header are returned unchanged.
+    """
+    if response.has_header("X-Accel-Redirect"):
+        location = response["X-Accel-Redirect"]
+        internal_url = settings.PROTECTED_MEDIA_INTERNAL_URL.rstrip("/") + "/"
+        if not location.startswith(internal_url):
+            raise OffloadContractError(
+                f"X-Accel-Redirect {location!r} is outside {internal_url!r}"
+            )
+        relative = unquote(location[len(internal_url) :])
+        file_path = os.path.join(settings.MEDIA_ROOT, relative)
+    elif response.has_header("X-Sendfile"):
+        file_path = response["X-Sendfile"]
+        if not os.path.isabs(file_path):
+            raise OffloadContractError(f"X-Sendfile {file_path!r} is not absolute")
+    else:
+        return response
+
+    if response.status_code != 200 or response.streaming or response.content:
+        raise OffloadContractError("Offloaded responses must be empty 200s")
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real_path = os.path.realpath(file_path)
+    if os.path.commonpath([media_root, real_path]) != media_root:
+        raise OffloadContractError(f"{file_path!r} is outside MEDIA_ROOT")
+    if not os.path.isfile(real_path):
+        raise OffloadContractError(f"{file_path!r} does not exist")
+
+    served = stream_file(
+        request,
+        real_path,
+        response["Content-Type"],
+        response.get("Content-Encoding"),
+    )
+    if served.has_header("Content-Disposition"):
+        served["Content-Disposition"] = response["Content-Disposition"]
+    return served
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db.models import Count, Q
+from rest_framework import serializers
+
+from .feedcache import (
+    feed_cache_key,
+    get_feed_cache,
+    get_feed_version,
+    get_or_compute,
+)
+
+# Boolean filters counted as facets, and the filters of the price dimension.
+BOOLEAN_FACETS = ("balcony", "bbq_allowed", "smoking_allowed", "allowed_pets", "ac")
+PRICE_FILTERS = ("price_per_month__gt", "price_per_month__lt")
+
+
+def get_price_buckets():
+    return getattr(settings, "FACET_PRICE_BUCKETS", [0, 1000, 2000, 3000, 5000])
+
+
+def filter_q(filterset, name, value):
+    field = filterset.filters[name]
+    return Q(**{f"{field.field_name}__{field.lookup_expr}": value})
+
+
+def combine(conditions, exclude=()):
+    q = Q()
+    for name, condition in conditions.items():
+        if name not in exclude:
+            q &= condition
+    return q
+
+
+def compute_facets(queryset, filterset_class, data, request=None):
+    """
+    Count the rows of `queryset` per facet value and per price bucket in one
+    conditional-aggregation query. Each count applies every active filter
+    except the ones of its own dimension, so the numbers next to an option
+    are the results the user would get by switching to it.
+    """
+    filterset = filterset_class(data, queryset=queryset, request=request)
+    if not filterset.is_valid():
+        raise serializers.ValidationError(filterset.errors)
+    cleaned = filterset.form.cleaned_data
+    active = {
+        name: filter_q(filterset, name, cleaned[name])
+        for name in BOOLEAN_FACETS + PRICE_FILTERS
+        if cleaned.get(name) is not None
+    }
+
+    # The other filters (size, bbox, near, ...) narrow every count alike.
+    rest = data.copy()
+    for name in BOOLEAN_FACETS + PRICE_FILTERS:
+        rest.pop(name, None)
+    base = filterset_class(rest, queryset=queryset, request=request).qs
+
+    aggregates = {"count": Count("pk", filter=combine(active))}
+    for name in BOOLEAN_FACETS:
+        others = combine(active, exclude=[name])
+        for value in (True, False):
+            condition = filter_q(filterset, name, value) & others
+            aggregates[f"{name}_{str(value).lower()}"] = Count("pk", filter=condition)
+    edges = get_price_buckets()
+    price_field = filterset.filters[PRICE_FILTERS[0]].field_name
+    others = combine(active, exclude=PRICE_FILTERS)
+    for index, low in enumerate(edges):
+        condition = Q(**{f"{price_field}__gte": low})
+        if index + 1 < len(edges):
+            condition &= Q(**{f"{price_field}__lt": edges[index + 1]})
+        aggregates[f"price_{index}"] = Count("pk", filter=condition & others)
+    counts = base.order_by().aggregate(**aggregates)
+
+    return {
+        "count": counts["count"],
+        "facets": {
+            name: {
+                "true": counts[f"{name}_true"],
+                "false": counts[f"{name}_false"],
+            }
+            for name in BOOLEAN_FACETS
+        },
+        "price": [
+            {
+                "min": low,
+                "max": edges[index + 1] if index + 1 < len(edges) else None,
+                "count": counts[f"price_{index}"],
+            }
+            for index, low in enumerate(edges)
+        ],
+    }
+
+
+def get_facets(request, queryset, filterset_class):
+    """
+    `compute_facets` for the request's filters, cached like the feed: per
+    normalized query string under the feed version, with single-flight
+    recomputation (see `core.feedcache.get_or_compute`).
+    """
+    cache = get_feed_cache()
+
+    def compute():
+        return compute_facets(
+            queryset, filterset_class, request.query_params, request
+        )
+
+    data, _ = get_or_compute(
+        cache, feed_cache_key(request, "facets"), get_feed_version(cache), compute
+    )
+    return data
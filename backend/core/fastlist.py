@@ -0,0 +1,216 @@
+import threading
+from operator import attrgetter
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.fields import SkipField, is_simple_callable
+from rest_framework.relations import PKOnlyObject
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from .fieldsets import SparseFieldsetMixin
+from .prefetch import resolve_serializer
+
+
+# Context entries that change with each request; the rest is fixed when a
+# serializer is compiled.
+REQUEST_CONTEXT = ("request", "format", "view")
+
+
+class CompiledSerializer:
+    """
+    Read-only renderer that produces the same output as
+    `serializer.to_representation(instance)`, with the per-field getters and
+    nested serializers resolved once up front instead of per instance.
+    """
+
+    def __init__(self, serializer):
+        # Root serializers whose context is swapped in by `bind()`, with
+        # whether they render a `nested` method field.
+        self.roots = []
+        if (
+            type(serializer).to_representation
+            is not serializers.Serializer.to_representation
+        ):
+            # Custom representations are kept as they are.
+            self.render = serializer.to_representation
+            return
+        self.serializer = serializer
+        self.getters = [
+            (field.field_name, self.compile_field(field))
+            for field in serializer._readable_fields
+        ]
+        self.render = self.render_fields
+
+    def __call__(self, instance):
+        return self.render(instance)
+
+    def bind(self, context):
+        """
+        Point the roots at the request of `context`. Nested roots keep their
+        own context (and with it their part of the fieldset).
+        """
+        request_context = {key: context.get(key) for key in REQUEST_CONTEXT}
+        for root, nested in self.roots:
+            if nested:
+                root._context = dict(root._context, **request_context)
+            else:
+                root._context = context
+
+    def unbind(self):
+        """Drop the request references, which the per-thread cache would keep."""
+        for root, _ in self.roots:
+            root._context = {
+                key: value
+                for key, value in root._context.items()
+                if key not in REQUEST_CONTEXT
+            }
+
+    def render_fields(self, instance):
+        ret = {}
+        for name, getter in self.getters:
+            try:
+                ret[name] = getter(instance)
+            except SkipField:
+                continue
+        return ret
+
+    def compile_field(self, field):
+        if isinstance(field, serializers.SerializerMethodField):
+            return self.compile_method_field(field)
+        if isinstance(field, serializers.ListSerializer):
+            child = CompiledSerializer(field.child)
+            self.roots.extend(child.roots)
+            return self.compile_value(field, lambda data: render_many(child, data))
+        if isinstance(field, serializers.BaseSerializer):
+            child = CompiledSerializer(field)
+            self.roots.extend(child.roots)
+            return self.compile_value(field, child)
+        if isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)):
+            return self.compile_value(field, field.to_representation, fast=False)
+        return self.compile_value(field, field.to_representation)
+
+    def compile_method_field(self, field):
+        serializer = self.serializer
+        relations = getattr(getattr(serializer, "Meta", None), "method_field_relations", {})
+        source, nested = relations.get(field.field_name, (None, None))
+        nested = resolve_serializer(type(serializer), nested)
+        if nested is None:
+            method = getattr(serializer, field.method_name)
+            return method
+
+        # Method fields declared with a nested serializer render the related
+        # objects with that serializer and a `nested` context.
+        context = serializer.context.copy()
+        context["nested"] = True
+        fieldset = None
+        if isinstance(serializer, SparseFieldsetMixin):
+            fieldset = serializer.get_nested_fieldset(field.field_name)
+        context["fieldset"] = fieldset
+        root = nested(context=context)
+        child = CompiledSerializer(root)
+        self.roots.append((root, True))
+        self.roots.extend((root, True) for root, _ in child.roots)
+        getter = attrgetter(source.replace("__", "."))
+        return lambda instance: [child(item) for item in getter(instance).all()]
+
+    def compile_value(self, field, to_representation, fast=True):
+        get_attribute = field.get_attribute
+        fast_getter = attrgetter(".".join(field.source_attrs)) if fast else None
+
+        def getter(instance):
+            attribute = None
+            if fast_getter is not None:
+                try:
+                    attribute = fast_getter(instance)
+                except (AttributeError, ObjectDoesNotExist):
+                    # A missing related object; `get_attribute` below turns it
+                    # into None or SkipField exactly as DRF does.
+                    attribute = None
+                else:
+                    if attribute is None:
+                        return None
+                    if is_simple_callable(attribute):
+                        attribute = None
+            if attribute is None:
+                attribute = get_attribute(instance)
+                check_for_none = (
+                    attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                )
+                if check_for_none is None:
+                    return None
+            return to_representation(attribute)
+
+        return getter
+
+
+def render_many(child, data):
+    iterable = data.all() if isinstance(data, models.Manager) else data
+    return [child(item) for item in iterable]
+
+
+_compiled = threading.local()
+
+# Bounds the per-thread cache, which grows with each distinct fieldset.
+MAX_COMPILED = 256
+
+
+def get_compiled_serializer(serializer_class, context):
+    """
+    Return the `CompiledSerializer` for `serializer_class` bound to `context`.
+    Compiled serializers are built once per thread and fieldset and reused
+    across requests.
+    """
+    cache = getattr(_compiled, "serializers", None)
+    if cache is None:
+        cache = _compiled.serializers = {}
+    key = (serializer_class, context.get("fieldset"))
+    compiled = cache.get(key)
+    if compiled is None:
+        if len(cache) >= MAX_COMPILED:
+            cache.clear()
+        root = serializer_class(context=context)
+        compiled = cache[key] = CompiledSerializer(root)
+        compiled.roots.insert(0, (root, False))
+    compiled.bind(context)
+    return compiled
+
+
+class FastListSerializer:
+    """
+    Stand-in for `serializer_class(instances, many=True)` on read-only list
+    responses; exposes the same `.data` through a `CompiledSerializer`.
+    """
+
+    def __init__(self, instances, serializer_class, context):
+        self.instances = instances
+        self.serializer_class = serializer_class
+        self.context = context
+
+    @property
+    def data(self):
+        if not hasattr(self, "_data"):
+            compiled = get_compiled_serializer(self.serializer_class, self.context)
+            try:
+                self._data = ReturnList(
+                    render_many(compiled, self.instances), serializer=self
+                )
+            finally:
+                compiled.unbind()
+        return self._data
+
+
+class FastListMixin:
+    """
+    Opt-in viewset mixin that renders the `list` action through
+    `FastListSerializer`. The output is identical to the regular serializer.
+    """
+
+    fast_list = True
+
+    def get_serializer(self, *args, **kwargs):
+        if self.fast_list and self.action == "list" and kwargs.get("many") and args:
+            return FastListSerializer(
+                args[0], self.get_serializer_class(), self.get_serializer_context()
+            )
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,196 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+
+def get_feed_cache():
+    return caches[getattr(settings, "FEED_CACHE_ALIAS", "default")]
+
+
+def new_version():
+    # Time-based, so a version lost to eviction never restarts at a value
+    # whose cached responses are still around.
+    return int(time.time() * 1000)
+
+
+def get_versions(names, cache=None):
+    """
+    Return `{name: (version, changed_at)}` for the named version counters in
+    one cache round trip. `changed_at` is the time of the last bump; a counter
+    missing from the cache is recreated as if it had just been bumped.
+    """
+    cache = cache or get_feed_cache()
+    keys = {name: (f"{name}:version", f"{name}:changed") for name in names}
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    versions = {}
+    for name, (version_key, changed_key) in keys.items():
+        if version_key not in values or changed_key not in values:
+            cache.add(version_key, new_version(), timeout=None)
+            cache.add(changed_key, time.time(), timeout=None)
+            values.update(cache.get_many([version_key, changed_key]))
+        versions[name] = (values.get(version_key), values.get(changed_key))
+    return versions
+
+
+def bump_version(name):
+    cache = get_feed_cache()
+    try:
+        cache.incr(f"{name}:version")
+    except ValueError:
+        cache.set(f"{name}:version", new_version(), timeout=None)
+    cache.set(f"{name}:changed", time.time(), timeout=None)
+
+
+def get_feed_version(cache=None):
+    return get_versions(["feed"], cache)["feed"][0]
+
+
+def bump_feed_version():
+    """Invalidate every cached feed response."""
+    bump_version("feed")
+
+
+def normalize_query(query_params):
+    return urlencode(
+        sorted(
+            (key, value)
+            for key in query_params
+            for value in query_params.getlist(key)
+        )
+    )
+
+
+def feed_cache_key(request, prefix, user=None):
+    # Responses carry absolute URLs, so the host and scheme are part of the key.
+    raw = f"{request.scheme}://{request.get_host()}{request.path}?" + normalize_query(
+        request.query_params
+    )
+    if user is not None:
+        raw += f"#user={user.pk}"
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"feed:{prefix}:{digest}"
+
+
+HIT, MISS, STALE = "hit", "miss", "stale"
+STATS_KEY = "feed:stats:{}"
+
+
+def record_stat(cache, state):
+    key = STATS_KEY.format(state)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_cache_stats(cache=None):
+    cache = cache or get_feed_cache()
+    keys = {state: STATS_KEY.format(state) for state in (HIT, MISS, STALE)}
+    values = cache.get_many(keys.values())
+    return {state: values.get(key, 0) for state, key in keys.items()}
+
+
+def reset_cache_stats(cache=None):
+    cache = cache or get_feed_cache()
+    cache.delete_many([STATS_KEY.format(state) for state in (HIT, MISS, STALE)])
+
+
+def get_or_compute(cache, key, version, compute, timeout=None, lock_timeout=None):
+    """
+    Return `(value, state)` for `key` at `version`, with single-flight
+    recomputation: when the entry is missing or from an older version, only
+    the caller that wins the cache lock runs `compute()`. The others serve
+    the stale value meanwhile, or wait for the fresh one when there is none.
+    `compute` may return None to skip caching its result; a short-lived
+    marker then tells the waiters to compute their own instead of waiting.
+
+    Hits, misses and stale responses are counted in `cache` itself, so the
+    stats cover all processes only when it is shared (see `core.checks`).
+    """
+    if timeout is None:
+        timeout = getattr(settings, "FEED_CACHE_TIMEOUT", 86400)
+    if lock_timeout is None:
+        lock_timeout = getattr(settings, "FEED_CACHE_LOCK_TIMEOUT", 10)
+
+    entry = cache.get(key)
+    if entry is not None and entry[0] == version:
+        record_stat(cache, HIT)
+        return entry[1], HIT
+
+    lock_key, uncached_key = f"{key}:lock", f"{key}:uncached"
+    deadline = time.monotonic() + lock_timeout
+    locked = cache.add(lock_key, version, timeout=lock_timeout)
+    while not locked:
+        if entry is not None:
+            record_stat(cache, STALE)
+            return entry[1], STALE
+        if time.monotonic() >= deadline:
+            # The lock holder is stuck or gone; compute without it.
+            break
+        time.sleep(0.05)
+        values = cache.get_many([key, uncached_key])
+        entry = values.get(key)
+        if entry is not None and entry[0] == version:
+            record_stat(cache, HIT)
+            return entry[1], HIT
+        if values.get(uncached_key) == version:
+            # The lock holder's result was not cacheable.
+            break
+        entry = None
+        locked = cache.add(lock_key, version, timeout=lock_timeout)
+
+    try:
+        if locked:
+            # Another caller may have stored the entry since it was read.
+            entry = cache.get(key)
+            if entry is not None and entry[0] == version:
+                record_stat(cache, HIT)
+                return entry[1], HIT
+        value = compute()
+        if value is not None:
+            cache.set(key, (version, value), timeout)
+        elif locked:
+            cache.set(uncached_key, version, lock_timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    record_stat(cache, MISS)
+    return value, MISS
+
+
+class FeedCacheMixin:
+    """
+    Caches the `list` response data per normalized query string (and per
+    user with `feed_cache_per_user`). Entries are tagged with the feed
+    version, which `core.signals` bumps on every write that can change a
+    payload. An outdated entry is served as stale while a single request
+    recomputes it (see `get_or_compute`).
+
+    There is deliberately one "feed" version for every cached view: any write
+    invalidates them all, which cannot miss a dependency at the cost of some
+    extra recomputation. The cache must be shared by all processes (see
+    `core.checks`).
+    """
+
+    feed_cache_per_user = False
+
+    def list(self, request, *args, **kwargs):
+        cache = get_feed_cache()
+        user = request.user if self.feed_cache_per_user else None
+        key = feed_cache_key(request, type(self).__name__, user)
+        fresh = {}
+
+        def compute():
+            response = super(FeedCacheMixin, self).list(request, *args, **kwargs)
+            fresh["response"] = response
+            return response.data if response.status_code == 200 else None
+
+        data, state = get_or_compute(cache, key, get_feed_version(cache), compute)
+        response = fresh.get("response") or Response(data)
+        response["X-Feed-Cache"] = state
+        return response
@@ -0,0 +1,150 @@
+from collections import namedtuple
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+# `only` is the set of field names to keep (None keeps them all), `omit` the
+# names to drop and `nested` a sorted tuple of `(name, Fieldset)` pairs for
+# the nested serializers below this level. Fieldsets are hashable so that
+# prefetch plans and compiled serializers can be cached per fieldset.
+Fieldset = namedtuple("Fieldset", ["only", "omit", "nested"])
+
+
+def split_paths(value):
+    return [
+        tuple(part.strip() for part in path.split("."))
+        for path in value.split(",")
+        if path.strip()
+    ]
+
+
+def build_fieldset(only_paths, omit_paths):
+    only = None
+    if only_paths is not None:
+        only = frozenset(path[0] for path in only_paths)
+    omit = frozenset(path[0] for path in omit_paths if len(path) == 1)
+    nested = {}
+    for name in sorted(
+        {path[0] for path in (only_paths or []) + omit_paths if len(path) > 1}
+    ):
+        nested_only = [
+            path[1:] for path in only_paths or [] if path[0] == name and len(path) > 1
+        ]
+        # `fields=renter,renter.id` keeps the whole renter.
+        if not nested_only or (name,) in only_paths:
+            nested_only = None
+        nested_omit = [
+            path[1:] for path in omit_paths if path[0] == name and len(path) > 1
+        ]
+        nested[name] = build_fieldset(nested_only, nested_omit)
+    return Fieldset(only, omit, tuple(nested.items()))
+
+
+def parse_fieldset(query_params):
+    """
+    Parse `?fields=` and `?omit=` into a `Fieldset`, or None when neither is
+    given. Both take comma-separated names, dotted for nested serializers:
+    `?fields=id,price_per_month,renter.username&omit=images.srcset`.
+    """
+    fields = query_params.get("fields")
+    omit = query_params.get("omit")
+    if not fields and not omit:
+        return None
+    for value in (fields, omit):
+        if value and any("" in path for path in split_paths(value)):
+            raise serializers.ValidationError({"fields": "Invalid field path."})
+    return build_fieldset(
+        split_paths(fields) if fields else None, split_paths(omit or "")
+    )
+
+
+def get_nested(fieldset, name):
+    if fieldset is None:
+        return None
+    return dict(fieldset.nested).get(name)
+
+
+def nested_method_serializers(serializer):
+    meta = getattr(serializer, "Meta", None)
+    relations = getattr(meta, "method_field_relations", {})
+    return {name for name, (_, nested) in relations.items() if nested is not None}
+
+
+def apply_fieldset(serializer, fields, fieldset):
+    names = set(fieldset.only or ()) | fieldset.omit | {n for n, _ in fieldset.nested}
+    unknown = sorted(names - set(fields))
+    if unknown:
+        raise serializers.ValidationError(
+            {"fields": [f"Unknown field: {name}" for name in unknown]}
+        )
+    kept = {
+        name: field
+        for name, field in fields.items()
+        if field.write_only
+        or (
+            (fieldset.only is None or name in fieldset.only)
+            and name not in fieldset.omit
+        )
+    }
+    for name, nested in fieldset.nested:
+        if name not in kept:
+            continue
+        field = kept[name]
+        target = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(target, SparseFieldsetMixin):
+            target._fieldset = nested
+        elif not (
+            isinstance(field, serializers.SerializerMethodField)
+            and name in nested_method_serializers(serializer)
+        ):
+            raise serializers.ValidationError(
+                {"fields": [f"Field {name} has no nested fields."]}
+            )
+    return kept
+
+
+class SparseFieldsetMixin:
+    """
+    Model serializer mixin that renders only the fields selected by the
+    `Fieldset` in `context["fieldset"]`. Nested serializers receive their
+    part of the fieldset from their parent.
+    """
+
+    def get_fieldset(self):
+        if hasattr(self, "_fieldset"):
+            return self._fieldset
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return self.context.get("fieldset") if parent is None else None
+
+    def get_nested_fieldset(self, name):
+        return get_nested(self.get_fieldset(), name)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return fields
+        return apply_fieldset(self, fields, fieldset)
+
+
+class SparseFieldsetViewMixin:
+    """
+    Viewset mixin that passes `?fields=`/`?omit=` of read requests to the
+    serializer context, where `SparseFieldsetMixin` serializers and
+    `PrefetchPlanMixin` pick it up.
+    """
+
+    def get_fieldset(self):
+        if not hasattr(self, "_fieldset"):
+            request = self.request
+            self._fieldset = None
+            if request is not None and request.method in SAFE_METHODS:
+                self._fieldset = parse_fieldset(request.query_params)
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fieldset"] = self.get_fieldset()
+        return context
@@ -1,9 +1,66 @@
 from django_filters.rest_framework import FilterSet
-from .models import Room
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+from rest_framework.settings import api_settings
+from .geo import bbox_q, parse_bbox, parse_point, with_distance, within_radius
+from .models import Room, RoomListing
+from .search import get_search_backend
 import django_filters
 
+# Radius of `?near=` when `?radius=` is not given, in kilometres.
+DEFAULT_RADIUS_KM = 5
+MAX_RADIUS_KM = 200
+
+
+class GeoFilterSet(FilterSet):
+    """
+    `?bbox=west,south,east,north` and `?near=lat,lon&radius=km` over the
+    `latitude`/`longitude`/`geohash` columns found at `geo_prefix`. `near`
+    also sorts the rows nearest first, and enables `?ordering=distance`.
+    """
+
+    geo_prefix = ""
+
+    bbox = django_filters.CharFilter(method="filter_bbox")
+    near = django_filters.CharFilter(method="filter_near")
+    radius = django_filters.NumberFilter(method="filter_radius")
+
+    def filter_bbox(self, queryset, name, value):
+        return queryset.filter(bbox_q(parse_bbox(value), self.geo_prefix))
+
+    def filter_near(self, queryset, name, value):
+        # Applied last by `filter_queryset`, over the otherwise filtered rows.
+        return queryset
+
+    def filter_radius(self, queryset, name, value):
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        near = self.form.cleaned_data.get("near")
+        if not near:
+            return queryset
+        latitude, longitude = parse_point(near)
+        radius = self.form.cleaned_data.get("radius") or DEFAULT_RADIUS_KM
+        radius = min(float(radius), MAX_RADIUS_KM)
+        queryset = within_radius(queryset, latitude, longitude, radius, self.geo_prefix)
+        queryset = with_distance(queryset, latitude, longitude, self.geo_prefix)
+        return queryset.order_by("distance")
+
+
+class DistanceOrderingFilter(OrderingFilter):
+    """`OrderingFilter` that drops `?ordering=distance` when there is no `?near=`."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and "distance" not in queryset.query.annotations:
+            ordering = [term for term in ordering if term.lstrip("-") != "distance"]
+            return ordering or self.get_default_ordering(view)
+        return ordering
+
+
+class RoomFilter(GeoFilterSet):
+    geo_prefix = "apartment__"
 
-class RoomFilter(FilterSet):
     balcony = django_filters.BooleanFilter(field_name="apartment__balcony")
     bbq_allowed = django_filters.BooleanFilter(field_name="apartment__bbq_allowed")
     smoking_allowed = django_filters.BooleanFilter(
@@ -11,7 +68,45 @@ class RoomFilter(FilterSet):
     )
     allowed_pets = django_filters.BooleanFilter(field_name="apartment__allowed_pets")
     ac = django_filters.BooleanFilter(field_name="apartment__ac")
+    size__gte = django_filters.NumberFilter(field_name="size_sqm", lookup_expr="gte")
+    size__lte = django_filters.NumberFilter(field_name="size_sqm", lookup_expr="lte")
 
     class Meta:
         model = Room
         fields = {"price_per_month": ["gt", "lt"]}
+
+
+class RoomSearchFilter(BaseFilterBackend):
+    """
+    Full-text `?search=` over the room and apartment address fields, served
+    from the search index instead of an `icontains` OR-chain.
+    """
+
+    search_param = api_settings.SEARCH_PARAM
+    search_field = "pk"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        if not query.strip():
+            return queryset
+        backend = get_search_backend(queryset.db)
+        return backend.search(queryset, query, field=self.search_field)
+
+
+class RoomListingFilter(GeoFilterSet):
+    """
+    `RoomFilter` with the same query parameters, over the flat `RoomListing`
+    columns instead of `apartment__*` joins.
+    """
+
+    balcony = django_filters.BooleanFilter(field_name="balcony")
+    bbq_allowed = django_filters.BooleanFilter(field_name="bbq_allowed")
+    smoking_allowed = django_filters.BooleanFilter(field_name="smoking_allowed")
+    allowed_pets = django_filters.BooleanFilter(field_name="allowed_pets")
+    ac = django_filters.BooleanFilter(field_name="ac")
+    size__gte = django_filters.NumberFilter(field_name="size_sqm", lookup_expr="gte")
+    size__lte = django_filters.NumberFilter(field_name="size_sqm", lookup_expr="lte")
+
+    class Meta:
+        model = RoomListing
+        fields = {"price_per_month": ["gt", "lt"]}
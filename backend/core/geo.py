@@ -0,0 +1,285 @@
+import csv
+import math
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import ExpressionWrapper
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """Return `(height, width)` in degrees of a geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def radius_precision(latitude, radius_km):
+    """The finest geohash precision whose cells are at least `radius_km` wide."""
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    precision = 1
+    for candidate in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(candidate)
+        if min(height, width * cos_lat) * KM_PER_DEGREE < radius_km:
+            break
+        precision = candidate
+    return precision
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Return the geohash prefixes of the cell around a point and its eight
+    neighbours, at a precision where that 3x3 block covers the radius.
+    """
+    precision = radius_precision(latitude, radius_km)
+    height, width = cell_size(precision)
+    cells = set()
+    for dlat in (-height, 0, height):
+        for dlon in (-width, 0, width):
+            lat = min(max(latitude + dlat, -90.0), 90.0 - 1e-9)
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return sorted(cells)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(dphi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_floats(value, count, name):
+    try:
+        numbers = [float(part) for part in value.split(",")]
+    except (AttributeError, ValueError):
+        numbers = []
+    if len(numbers) != count or not all(map(math.isfinite, numbers)):
+        raise serializers.ValidationError(
+            {name: f"Expected {count} comma-separated numbers."}
+        )
+    return numbers
+
+
+def parse_point(value, name="near"):
+    latitude, longitude = parse_floats(value, 2, name)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise serializers.ValidationError({name: "Coordinates out of range."})
+    return latitude, longitude
+
+
+def parse_bbox(value, name="bbox"):
+    """Parse `west,south,east,north`; west > east crosses the antimeridian."""
+    west, south, east, north = parse_floats(value, 4, name)
+    if not (-90 <= south <= north <= 90 and -180 <= min(west, east)):
+        raise serializers.ValidationError({name: "Invalid bounding box."})
+    if max(west, east) > 180:
+        raise serializers.ValidationError({name: "Invalid bounding box."})
+    return west, south, east, north
+
+
+def bbox_q(bbox, prefix=""):
+    west, south, east, north = bbox
+    q = Q(**{f"{prefix}latitude__gte": south, f"{prefix}latitude__lte": north})
+    if west <= east:
+        return q & Q(
+            **{f"{prefix}longitude__gte": west, f"{prefix}longitude__lte": east}
+        )
+    return q & (
+        Q(**{f"{prefix}longitude__gte": west}) | Q(**{f"{prefix}longitude__lte": east})
+    )
+
+
+def radius_bbox(latitude, longitude, radius_km):
+    """
+    Return the `(west, south, east, north)` box around the circle of
+    `radius_km` around a point, for `bbox_q`. West is past east when the box
+    crosses the antimeridian.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+    # Degrees of longitude shrink towards the poles; widen the box for the
+    # latitude where they are the shortest.
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    if cos_lat <= 0 or dlat / cos_lat >= 180:
+        return -180.0, south, 180.0, north
+    dlon = dlat / cos_lat
+    west, east = longitude - dlon, longitude + dlon
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return west, south, east, north
+
+
+def great_circle_distance(latitude, longitude, prefix=""):
+    """The haversine distance in kilometres to a point, as a SQL expression."""
+    phi = math.radians(latitude)
+    lat = Radians(F(f"{prefix}latitude"))
+    lon = Radians(F(f"{prefix}longitude"))
+    a = Power(Sin((lat - phi) / 2), 2) + math.cos(phi) * Cos(lat) * Power(
+        Sin((lon - math.radians(longitude)) / 2), 2
+    )
+    return ExpressionWrapper(
+        2 * EARTH_RADIUS_KM * ASin(Sqrt(a)), output_field=FloatField()
+    )
+
+
+def within_radius(queryset, latitude, longitude, radius_km, prefix=""):
+    """
+    Narrow `queryset` to rows within `radius_km` of a point. The rows are
+    read from the 3x3 geohash cells around it (index prefix scans) and the
+    circle's bounding box, and only those are checked against the exact
+    haversine distance, all in the same query.
+    """
+    cells = Q()
+    for cell in covering_cells(latitude, longitude, radius_km):
+        cells |= Q(**{f"{prefix}geohash__startswith": cell})
+    bbox = bbox_q(radius_bbox(latitude, longitude, radius_km), prefix)
+    return (
+        queryset.filter(cells, bbox)
+        .alias(radius_distance=great_circle_distance(latitude, longitude, prefix))
+        .filter(radius_distance__lte=radius_km)
+    )
+
+
+def with_distance(queryset, latitude, longitude, prefix=""):
+    """
+    Annotate `distance`, the squared equirectangular distance to a point in
+    degrees. It orders like the true distance at city scale and needs no
+    trigonometry in SQL.
+    """
+    scale = math.cos(math.radians(latitude))
+    dlat = F(f"{prefix}latitude") - latitude
+    dlon = (F(f"{prefix}longitude") - longitude) * scale
+    return queryset.annotate(
+        distance=ExpressionWrapper(dlat * dlat + dlon * dlon, output_field=FloatField())
+    )
+
+
+def normalize_place(value):
+    return " ".join(str(value or "").lower().split())
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path):
+    """
+    Load a gazetteer CSV with `city,street,latitude,longitude` columns into
+    `{(city, street): (latitude, longitude)}`. Rows with an empty street give
+    the city's coordinates.
+    """
+    places = {}
+    try:
+        with open(path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                try:
+                    point = (float(row["latitude"]), float(row["longitude"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                city = normalize_place(row.get("city"))
+                street = normalize_place(row.get("street"))
+                places.setdefault((city, street), point)
+    except FileNotFoundError:
+        pass
+    return places
+
+
+def gazetteer_geocode(city, street=None):
+    """
+    Offline geocoder over `GEO_GAZETTEER_PATH`: the street's coordinates when
+    the gazetteer lists it, else the city's, else None.
+    """
+    path = getattr(settings, "GEO_GAZETTEER_PATH", None)
+    if not path or not city:
+        return None
+    places = load_gazetteer(str(path))
+    city = normalize_place(city)
+    return places.get((city, normalize_place(street))) or places.get((city, ""))
+
+
+def geocode(city, street=None):
+    """Geocode an address with the callable named by `GEOCODER`."""
+    geocoder = import_string(
+        getattr(settings, "GEOCODER", "core.geo.gazetteer_geocode")
+    )
+    return geocoder(city, street)
+
+
+class GeocodedMixin:
+    """
+    Model mixin that geocodes `city`/`street` with `geocode()` when the
+    coordinates are missing or the address changed without them, and keeps
+    `geohash` in step with `latitude`/`longitude`.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_geo = instance.get_geo_state()
+        return instance
+
+    def get_geo_state(self):
+        return (
+            self.__dict__.get("city"),
+            self.__dict__.get("street"),
+            self.__dict__.get("latitude"),
+            self.__dict__.get("longitude"),
+        )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        loaded = getattr(self, "_loaded_geo", None)
+        city, street, latitude, longitude = self.get_geo_state()
+        moved = loaded is not None and (
+            (city, street) != loaded[:2] and (latitude, longitude) == loaded[2:]
+        )
+        if moved or latitude is None or longitude is None:
+            point = geocode(city, street)
+            if point is not None or moved:
+                self.latitude, self.longitude = point or (None, None)
+                if update_fields is not None:
+                    update_fields = {*update_fields, "latitude", "longitude"}
+        geohash = ""
+        if self.latitude is not None and self.longitude is not None:
+            geohash = encode_geohash(self.latitude, self.longitude)
+        if geohash != self.geohash:
+            self.geohash = geohash
+            if update_fields is not None:
+                update_fields = {*update_fields, "geohash"}
+        if update_fields is not None:
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+        self._loaded_geo = self.get_geo_state()
@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .jobs import enqueue, job
+from .uploads import check_pixels
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_DIR = "derivatives"
+
+# Models whose uploads get derivatives, as `model label: image field`. Their
+# `derivatives` JSON field is kept in step by the signals in core.signals.
+DERIVATIVE_FIELDS = {
+    "core.ApartmentImage": "image",
+    "core.RoomImage": "image",
+    "core.Inquiry": "image",
+    "core.CustomUser": "avatar",
+}
+
+# Output formats as `name: (Pillow format, file extension, save options)`.
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "progressive": True, "optimize": True}),
+}
+
+
+def get_widths():
+    return tuple(getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", (320, 640, 1024)))
+
+
+def derivative_name(name, width, extension):
+    root, _ = os.path.splitext(name)
+    return f"{DERIVATIVE_DIR}/{root}_w{width}.{extension}"
+
+
+def render_derivative(image, width, image_format, options):
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS)
+    if image_format == "JPEG" and resized.mode != "RGB":
+        resized = resized.convert("RGB")
+    buffer = BytesIO()
+    resized.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, storage=default_storage):
+    """
+    Write the fixed-width derivatives of the stored image `name` and return
+    them as `{format: {width: name}}`. Widths at or above the original width
+    are skipped, so small uploads are never upscaled.
+    """
+    with storage.open(name, "rb") as fh:
+        image = Image.open(fh)
+        check_pixels(image)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        derivatives = {}
+        for key, (image_format, extension, options) in DERIVATIVE_FORMATS.items():
+            for width in get_widths():
+                if width >= image.width:
+                    continue
+                target = derivative_name(name, width, extension)
+                content = render_derivative(image, width, image_format, options)
+                if storage.exists(target):
+                    storage.delete(target)
+                saved = storage.save(target, ContentFile(content))
+                derivatives.setdefault(key, {})[str(width)] = saved
+    return derivatives
+
+
+def get_image_field(model):
+    """Name of the image field of `model` that gets derivatives, or None."""
+    return DERIVATIVE_FIELDS.get(model._meta.label)
+
+
+def delete_derivatives(derivatives, storage=default_storage):
+    """Delete the files listed in a `{format: {width: name}}` mapping."""
+    for names in (derivatives or {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def process_image(model, pk):
+    """
+    Generate and store the derivatives of one image of a `DERIVATIVE_FIELDS`
+    model. The row is updated in place, so no signals fire for it; room
+    images refresh their room's listing and the cache version of the model
+    (the feed, or inquiries) is bumped explicitly.
+    """
+    from .feedcache import bump_feed_version, bump_version
+    from .listings import sync_room_listings
+
+    field = get_image_field(model)
+    instance = model._default_manager.filter(pk=pk).first()
+    image = getattr(instance, field, None)
+    if not image:
+        return None
+    derivatives = generate_derivatives(image.name, image.storage)
+    # The image may have been replaced while this ran; the newer upload has
+    # its own job.
+    updated = model._default_manager.filter(pk=pk, **{field: image.name}).update(
+        derivatives=derivatives
+    )
+    if not updated:
+        delete_derivatives(derivatives, image.storage)
+        return None
+    room_id = getattr(instance, "room_id", None)
+    if room_id is not None:
+        sync_room_listings([room_id])
+    if model._meta.label == "core.Inquiry":
+        bump_version("inquiries")
+    else:
+        bump_feed_version()
+    return derivatives
+
+
+@job
+def generate_image_derivatives(model_label, pk):
+    process_image(apps.get_model(model_label), pk)
+
+
+class DerivativePool:
+    """
+    Bounded background pool for derivative jobs. At most `workers` images are
+    processed at once and `queue_size` wait; when the queue is full the job
+    runs on the calling thread instead, which throttles the uploader.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="image-derivatives"
+        )
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, model, pk):
+        if not self.slots.acquire(blocking=False):
+            self.run(model, pk, release=False)
+            return
+        self.executor.submit(self.run, model, pk)
+
+    def run(self, model, pk, release=True):
+        try:
+            process_image(model, pk)
+        except Exception:
+            logger.exception(
+                "Could not generate derivatives for %s %s", model.__name__, pk
+            )
+        finally:
+            if release:
+                self.slots.release()
+                close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DerivativePool(
+                getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+                getattr(settings, "IMAGE_DERIVATIVE_QUEUE_SIZE", 32),
+            )
+        return _pool
+
+
+def schedule_derivatives(instance):
+    """
+    Queue derivative generation for a saved image: as a `core.jobs` job with
+    `IMAGE_DERIVATIVES_JOB_QUEUE`, otherwise on the in-process pool once the
+    transaction commits.
+    """
+    if not getattr(instance, get_image_field(type(instance))):
+        return
+    model, pk = type(instance), instance.pk
+    if getattr(settings, "IMAGE_DERIVATIVES_JOB_QUEUE", False):
+        enqueue(generate_image_derivatives, args=[model._meta.label, pk])
+        return
+    if not getattr(settings, "IMAGE_DERIVATIVES_ASYNC", True):
+        transaction.on_commit(lambda: process_image(model, pk))
+        return
+    transaction.on_commit(lambda: get_pool().submit(model, pk))
+
+
+def get_srcset(derivatives, url):
+    """
+    Turn stored derivatives into `{format: "url 320w, url 640w"}`, ready for
+    `<source type="image/webp" srcset="...">`. `url` maps a name to a URL.
+    """
+    return {
+        key: ", ".join(
+            f"{url(name)} {width}w"
+            for width, name in sorted(
+                derivatives[key].items(), key=lambda item: int(item[0])
+            )
+        )
+        for key in DERIVATIVE_FORMATS
+        if derivatives and derivatives.get(key)
+    }
@@ -0,0 +1,115 @@
+from rest_framework import serializers as drf_serializers
+from rest_framework.response import Response
+
+from . import serializers
+from .prefetch import get_relation, prefetch_for
+
+# Related objects an apartment response can side-load, as
+# `include path: (block in "included", serializer)`.
+APARTMENT_INCLUDES = {
+    "rooms": ("rooms", serializers.RoomSerializer),
+    "rooms.contract": ("contracts", serializers.ContractSerializer),
+    "bills": ("bills", serializers.BillSerializer),
+    "images": ("images", serializers.ApartmentImageSerializer),
+}
+
+
+def parse_includes(value, allowed):
+    paths = {path.strip() for path in (value or "").split(",") if path.strip()}
+    unknown = sorted(paths - set(allowed))
+    if unknown:
+        raise drf_serializers.ValidationError(
+            {"include": [f"Unknown include: {path}" for path in unknown]}
+        )
+    return paths
+
+
+def related_queryset(model, queryset, name):
+    """
+    Return the objects reached from the rows of `queryset` through the
+    relation `name`, as one query with `queryset` as a subquery.
+    """
+    field = get_relation(model, name)
+    if field is None or field.many_to_many:
+        raise ValueError(f"{model.__name__}.{name} cannot be included")
+    related = field.related_model._default_manager
+    if field.concrete:
+        return related.filter(pk__in=queryset.values(field.attname))
+    return related.filter(**{f"{field.field.name}__in": queryset})
+
+
+class IncludeMixin:
+    """
+    Viewset mixin for `?include=rooms,rooms.contract`: the `list` and
+    `retrieve` responses get an `included` block with the related objects of
+    the returned rows, de-duplicated and rendered by the serializers listed
+    in `include_relations`. Each relation type costs one query (plus the
+    prefetches of its serializer), whatever the number of rows. A list
+    response is wrapped as `{"results": [...], "included": {...}}`.
+
+    Override `get_include_queryset` to limit what a path may side-load; the
+    limit carries over to the paths below it.
+    """
+
+    include_relations = {}
+
+    def get_include_queryset(self, path, queryset):
+        return queryset
+
+    def get_includes(self):
+        return parse_includes(
+            self.request.query_params.get("include"), self.include_relations
+        )
+
+    def get_included(self, includes, pks):
+        root = self.get_queryset().model
+        querysets = {"": (root, root._default_manager.filter(pk__in=pks))}
+        included = {}
+        # The primary fieldset does not apply to side-loaded objects.
+        context = dict(self.get_serializer_context(), fieldset=None)
+        parents = {
+            path.rsplit(".", depth)[0]
+            for path in includes
+            for depth in range(1, path.count(".") + 1)
+        }
+        # Parents sort before their children.
+        for path in sorted(includes | parents):
+            parent, _, name = path.rpartition(".")
+            model, queryset = querysets[parent]
+            queryset = self.get_include_queryset(
+                path, related_queryset(model, queryset, name)
+            )
+            querysets[path] = (queryset.model, queryset)
+            if path not in includes:
+                continue
+            key, serializer_class = self.include_relations[path]
+            objects = prefetch_for(queryset, serializer_class)
+            data = serializer_class(objects, many=True, context=context).data
+            block = included.setdefault(key, {})
+            for item in data:
+                block.setdefault(item["id"], item)
+        return {key: list(block.values()) for key, block in included.items()}
+
+    def add_included(self, response, includes):
+        if not includes or response.status_code != 200:
+            return response
+        data = response.data
+        rows = data.get("results", [data]) if isinstance(data, dict) else data
+        if any("id" not in row for row in rows):
+            raise drf_serializers.ValidationError(
+                {"include": "Included objects need the id field."}
+            )
+        included = self.get_included(includes, [row["id"] for row in rows])
+        if isinstance(data, dict):
+            response.data = dict(data, included=included)
+        else:
+            response.data = {"results": data, "included": included}
+        return response
+
+    def list(self, request, *args, **kwargs):
+        includes = self.get_includes()
+        return self.add_included(super().list(request, *args, **kwargs), includes)
+
+    def retrieve(self, request, *args, **kwargs):
+        includes = self.get_includes()
+        return self.add_included(super().retrieve(request, *args, **kwargs), includes)
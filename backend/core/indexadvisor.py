@@ -0,0 +1,277 @@
+from collections import defaultdict, namedtuple
+from itertools import product
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.db import DatabaseError
+from django.db.models import UniqueConstraint
+from django.db.models.expressions import Col
+from django.db.models.sql.where import OR, NothingNode, WhereNode
+from django.test import RequestFactory
+from django.http import Http404
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.generics import GenericAPIView
+from rest_framework.request import Request
+
+from .models import CustomUser
+
+# One way a viewset reads a model: the columns it filters on and the column
+# it sorts by, with where the access path comes from.
+AccessPath = namedtuple(
+    "AccessPath", ["view", "source", "model", "filters", "ordering"]
+)
+
+# `status` is "ok", "unindexed" (no index starts with a filtered column) or
+# "unsorted" (an index narrows the rows but the ordering needs a sort).
+Finding = namedtuple("Finding", ["path", "status", "index"])
+
+USER_TYPES = (None, "owner", "renter", "searcher")
+
+# Ordering on annotations that filters add, such as `distance` from `?near=`
+# (core.filters.GeoFilterSet); the filter itself is what reads the index.
+ANNOTATED_ORDERING = {"distance"}
+
+
+def get_viewsets(patterns=None):
+    """Return the DRF view classes routed in the URL configuration."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    views = {}
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            views.update((view, None) for view in get_viewsets(pattern.url_patterns))
+        elif isinstance(pattern, URLPattern):
+            view = getattr(pattern.callback, "cls", None)
+            if view is None or not issubclass(view, GenericAPIView):
+                continue
+            # Generic views without a queryset, such as the token views.
+            if view.queryset is None and (
+                view.get_queryset is GenericAPIView.get_queryset
+            ):
+                continue
+            views[view] = None
+    return list(views)
+
+
+def get_indexes(model):
+    """Return `(name, [field, ...])` for every index usable on `model`."""
+    opts = model._meta
+    indexes = [("primary key", [opts.pk])]
+    for field in opts.local_fields:
+        if field.primary_key:
+            continue
+        if field.db_index or field.unique:
+            indexes.append((field.column, [field]))
+    for index in opts.indexes:
+        if index.fields:
+            names = [name.lstrip("-") for name in index.fields]
+            indexes.append((index.name, [opts.get_field(name) for name in names]))
+    for constraint in opts.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.fields:
+            fields = [opts.get_field(name) for name in constraint.fields]
+            indexes.append((constraint.name, fields))
+    for names in opts.unique_together:
+        indexes.append(("unique_together", [opts.get_field(name) for name in names]))
+    return indexes
+
+
+def where_columns(node):
+    """
+    Return the alternative sets of `(model, field)` a WHERE tree filters on:
+    AND nodes merge their children, OR nodes yield one set per branch.
+    """
+    if isinstance(node, NothingNode):
+        raise EmptyResultSet
+    if isinstance(node, WhereNode):
+        branches = [where_columns(child) for child in node.children]
+        if node.connector == OR:
+            return [columns for branch in branches for columns in branch] or [set()]
+        return [set().union(*combo) for combo in product(*branches)] or [set()]
+    lhs = getattr(node, "lhs", None)
+    if isinstance(lhs, Col):
+        return [{(lhs.target.model, lhs.target)}]
+    return [set()]
+
+
+def resolve_path(model, path):
+    """Resolve a `related__field` lookup path to `(model, field)`, or None."""
+    field = None
+    for name in path.split("__"):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # A lookup such as `__gt` or `__isnull` ends the path.
+            break
+        if field.is_relation and field.related_model is not None:
+            if not field.concrete:
+                return None
+            if name != path.split("__")[-1]:
+                model = field.related_model
+                continue
+        return (model, field)
+    return (model, field) if field is not None else None
+
+
+def get_filter_paths(view):
+    """Return the lookup paths a viewset's filter backends filter on."""
+    paths = []
+    fields = getattr(view, "filterset_fields", None) or []
+    paths.extend(fields if isinstance(fields, (list, tuple)) else list(fields))
+    filterset_class = getattr(view, "filterset_class", None)
+    if filterset_class is not None:
+        # Method filters build their own lookups, which cannot be resolved here.
+        paths.extend(
+            f.field_name
+            for f in filterset_class.base_filters.values()
+            if f.method is None
+        )
+    return list(dict.fromkeys(paths))
+
+
+def get_ordering(model, queryset):
+    ordering = queryset.query.order_by or model._meta.ordering
+    if not ordering or not isinstance(ordering[0], str):
+        return None
+    name = ordering[0].lstrip("-")
+    if name == "?" or "__" in name:
+        return None
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+class AnyKwargs(dict):
+    """URL kwargs that answer any key, for calling `get_queryset` offline."""
+
+    def __missing__(self, key):
+        return "0"
+
+
+def get_querysets(view):
+    """
+    Call `view.get_queryset()` as an anonymous user and as each user type
+    the view's permissions let in. Returns `(querysets, errors)`.
+    """
+    querysets, errors = [], []
+    factory = RequestFactory()
+    for user_type in USER_TYPES:
+        instance = view()
+        request = Request(factory.get("/"))
+        if user_type is None:
+            request.user = AnonymousUser()
+        else:
+            request.user = CustomUser(pk=0, username="advisor", user_type=user_type)
+        instance.request = request
+        instance.args, instance.kwargs = (), AnyKwargs()
+        instance.action = "list"
+        instance.format_kwarg = None
+        try:
+            if not all(
+                permission.has_permission(request, instance)
+                for permission in instance.get_permissions()
+            ):
+                continue
+            queryset = instance.get_queryset()
+        except Http404:
+            # Scoped to an object the made-up user does not have.
+            continue
+        except DatabaseError as error:
+            name = user_type or "anonymous"
+            errors.append(
+                f"{name}: {type(error).__name__}: {error} (the index advisor "
+                f"needs a migrated database)"
+            )
+            continue
+        except Exception as error:
+            name = user_type or "anonymous"
+            errors.append(f"{name}: {type(error).__name__}: {error}")
+            continue
+        querysets.append(queryset)
+    return querysets, errors
+
+
+def get_access_paths(view):
+    """Return the `AccessPath`s of `view` and any errors met building them."""
+    querysets, errors = get_querysets(view)
+    paths = set()
+    filter_paths = get_filter_paths(view)
+    ordering_fields = [
+        name
+        for name in getattr(view, "ordering_fields", None) or []
+        if isinstance(name, str) and name not in ANNOTATED_ORDERING
+    ]
+    for queryset in querysets:
+        model = queryset.model
+        try:
+            alternatives = where_columns(queryset.query.where)
+        except EmptyResultSet:
+            continue
+        default_ordering = get_ordering(model, queryset)
+        for base in alternatives:
+            variants = [("get_queryset", base, default_ordering)]
+            for lookup in filter_paths:
+                resolved = resolve_path(model, lookup)
+                if resolved is None:
+                    errors.append(f"cannot resolve filter {lookup!r}")
+                    continue
+                variants.append(
+                    (f"filter {lookup}", base | {resolved}, default_ordering)
+                )
+            for name in ordering_fields:
+                try:
+                    field = model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    errors.append(f"ordering field {name!r} is not a column")
+                    continue
+                variants.append((f"ordering {name}", base, field))
+            for source, columns, ordering in variants:
+                by_model = defaultdict(set)
+                for column_model, field in columns:
+                    by_model[column_model].add(field)
+                for column_model in set(by_model) | {model}:
+                    fields = frozenset(by_model.get(column_model, ()))
+                    sort = ordering if column_model is model else None
+                    if fields or sort is not None:
+                        paths.add(
+                            AccessPath(view, source, column_model, fields, sort)
+                        )
+    return sorted(paths, key=describe), list(dict.fromkeys(errors))
+
+
+def check_path(path):
+    """Return the `Finding` for one access path against its model's indexes."""
+    indexes = get_indexes(path.model)
+    usable = [name for name, fields in indexes if fields[0] in path.filters]
+    if path.ordering is not None:
+        # A filter on the sort column itself (a price range) reads the index
+        # in order, so only the other filters have to form the prefix.
+        equal = path.filters - {path.ordering}
+        for name, fields in indexes:
+            prefix = 0
+            while prefix < len(fields) and fields[prefix] in equal:
+                prefix += 1
+            if prefix < len(fields) and fields[prefix] == path.ordering:
+                if prefix or not equal:
+                    return Finding(path, "ok", name)
+        if usable or not path.filters:
+            return Finding(path, "unsorted", usable[0] if usable else None)
+        return Finding(path, "unindexed", None)
+    if usable:
+        return Finding(path, "ok", usable[0])
+    return Finding(path, "unindexed", None)
+
+
+def describe(path):
+    filters = ", ".join(sorted(field.name for field in path.filters)) or "-"
+    text = f"{path.view.__name__}: {path.model.__name__}({filters})"
+    if path.ordering is not None:
+        text += f" order by {path.ordering.name}"
+    return f"{text} [{path.source}]"
+
+
+def advise(views=None):
+    """Yield `(view, findings, errors)` for every routed viewset."""
+    for view in views or get_viewsets():
+        paths, errors = get_access_paths(view)
+        yield view, [check_path(path) for path in paths], errors
@@ -0,0 +1,357 @@
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing.connection import wait as wait_for_processes
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+# Time a worker has past `JOB_TIMEOUT` to stop a job and record it before the
+# job's lease runs out and another worker may claim it.
+LEASE_GRACE = 60
+
+
+def job(func=None, *, name=None):
+    """
+    Register `func` so that the worker may run it. Registered functions are
+    enqueued by reference and must take JSON-serializable arguments:
+
+        @job
+        def rebuild_something(apartment_id): ...
+
+        enqueue(rebuild_something, args=[apartment.id])
+    """
+
+    def register(func):
+        func.job_name = name or f"{func.__module__}.{func.__qualname__}"
+        _registry[func.job_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def get_job_function(name):
+    if name not in _registry:
+        # Importing the module runs its `@job` decorators.
+        try:
+            import_string(name)
+        except ImportError:
+            pass
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f"{name!r} is not a registered job")
+
+
+def enqueue(func, args=(), kwargs=None, priority=0, run_at=None, max_attempts=None):
+    """
+    Queue a call to the registered job `func` (or its name). The row joins
+    the caller's transaction, so the job only exists if the request commits.
+    """
+    name = func if isinstance(func, str) else func.job_name
+    get_job_function(name)
+    return Job.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or getattr(settings, "JOB_MAX_ATTEMPTS", 3),
+    )
+
+
+def get_backoff(attempts):
+    base = getattr(settings, "JOB_RETRY_BACKOFF", 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def get_timeout():
+    return getattr(settings, "JOB_TIMEOUT", 600)
+
+
+def claim_jobs(limit):
+    """
+    Mark up to `limit` due jobs as running for this worker, highest priority
+    first. The worker stops its jobs at `JOB_TIMEOUT`, so a job whose lease
+    (the timeout plus `LEASE_GRACE`) ran out lost its worker; it is claimed
+    again or given up on.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=get_timeout() + LEASE_GRACE)
+    due = Job.objects.filter(
+        Q(status=Job.Status.QUEUED, run_at__lte=now)
+        | Q(status=Job.Status.RUNNING, locked_until__lt=now)
+    ).order_by("-priority", "run_at", "pk")
+    features = connection.features
+    with transaction.atomic():
+        if features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        elif features.has_select_for_update:
+            due = due.select_for_update()
+        claimed = []
+        for item in due[:limit]:
+            if item.status == Job.Status.RUNNING and item.attempts >= item.max_attempts:
+                item.status = Job.Status.DEAD
+                item.last_error = "Timed out"
+                item.locked_until = None
+                item.save(update_fields=["status", "last_error", "locked_until"])
+                continue
+            item.status = Job.Status.RUNNING
+            item.attempts += 1
+            item.started_at = now
+            item.locked_until = now + lease
+            item.wait_ms = max((now - item.run_at).total_seconds() * 1000, 0)
+            item.save(
+                update_fields=[
+                    "status",
+                    "attempts",
+                    "started_at",
+                    "locked_until",
+                    "wait_ms",
+                ]
+            )
+            claimed.append(item)
+    return claimed
+
+
+OUTCOME_FIELDS = [
+    "status",
+    "run_at",
+    "last_error",
+    "duration_ms",
+    "finished_at",
+    "locked_until",
+]
+
+
+def finish_job(item):
+    """
+    Record the outcome of the claimed attempt `item` unless the worker has
+    already given up on it (a timed-out thread that finished late).
+    """
+    updated = Job.objects.filter(
+        pk=item.pk, status=Job.Status.RUNNING, attempts=item.attempts
+    ).update(**{name: getattr(item, name) for name in OUTCOME_FIELDS})
+    if not updated:
+        logger.warning("Job %s finished after it was given up on", item)
+    return bool(updated)
+
+
+def fail_job(item, error, retry=True):
+    item.last_error = error
+    if retry and item.attempts < item.max_attempts:
+        item.status = Job.Status.QUEUED
+        item.run_at = timezone.now() + get_backoff(item.attempts)
+    else:
+        item.status = Job.Status.DEAD
+        logger.error("Job %s failed for good:\n%s", item, item.last_error)
+
+
+def execute_job(pk):
+    """Run one claimed job and record its outcome and timing."""
+    try:
+        item = Job.objects.get(pk=pk)
+        start = time.perf_counter()
+        try:
+            func = get_job_function(item.name)
+            func(*item.args, **item.kwargs)
+        except Exception:
+            fail_job(item, traceback.format_exc())
+        else:
+            item.status = Job.Status.SUCCEEDED
+            item.last_error = ""
+        item.duration_ms = (time.perf_counter() - start) * 1000
+        item.finished_at = timezone.now()
+        item.locked_until = None
+        finish_job(item)
+        return item.status
+    finally:
+        close_old_connections()
+
+
+def stop_job(pk, error, retry):
+    """
+    Record a claimed attempt that its worker stopped (timed out or crashed)
+    as failed: retried when `retry` and attempts are left, else dead.
+    """
+    item = Job.objects.filter(pk=pk, status=Job.Status.RUNNING).first()
+    if item is None:
+        # The job recorded its own outcome.
+        return
+    fail_job(item, error, retry)
+    item.finished_at = timezone.now()
+    if item.started_at is not None:
+        item.duration_ms = (item.finished_at - item.started_at).total_seconds() * 1000
+    item.locked_until = None
+    finish_job(item)
+
+
+class ThreadRunner:
+    """
+    Runs jobs on a thread pool. Threads cannot be stopped: a job past its
+    timeout is given up on (marked dead, so it is not run a second time
+    while its thread may still be busy) and its late outcome is discarded.
+    """
+
+    can_stop = False
+
+    def __init__(self, concurrency):
+        self.executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="jobs"
+        )
+        self.abandoned = set()
+
+    def start(self, pk):
+        return self.executor.submit(execute_job, pk)
+
+    def wait(self, handles, timeout):
+        done, _ = wait(handles, timeout=timeout, return_when=FIRST_COMPLETED)
+        return done
+
+    def crashed(self, handle):
+        error = handle.exception()
+        if error is not None:
+            logger.error("Job worker crashed", exc_info=error)
+        return error is not None
+
+    def stop(self, handle):
+        self.abandoned.add(handle)
+
+    def busy(self):
+        self.abandoned = {handle for handle in self.abandoned if not handle.done()}
+        return len(self.abandoned)
+
+    def close(self):
+        # Abandoned threads are left to finish on their own.
+        self.executor.shutdown(wait=not self.busy())
+
+
+class ProcessRunner:
+    """
+    Runs each job in its own forked process, which is killed when the job
+    runs past its timeout. The parent closes its database connections
+    before forking so none are shared.
+    """
+
+    can_stop = True
+
+    def __init__(self, concurrency):
+        self.context = multiprocessing.get_context("fork")
+
+    def start(self, pk):
+        connections.close_all()
+        process = self.context.Process(target=execute_job, args=(pk,), daemon=True)
+        process.start()
+        return process
+
+    def wait(self, handles, timeout):
+        ready = set(wait_for_processes([h.sentinel for h in handles], timeout))
+        done = {handle for handle in handles if handle.sentinel in ready}
+        for handle in done:
+            handle.join()
+        return done
+
+    def crashed(self, handle):
+        if handle.exitcode:
+            logger.error("Job process exited with code %s", handle.exitcode)
+        return bool(handle.exitcode)
+
+    def stop(self, handle):
+        handle.terminate()
+        handle.join(5)
+        if handle.is_alive():
+            handle.kill()
+            handle.join()
+
+    def busy(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def make_runner(pool, concurrency):
+    if pool == "process":
+        return ProcessRunner(concurrency)
+    return ThreadRunner(concurrency)
+
+
+def run_worker(concurrency=4, pool="thread", poll_interval=1.0, once=False):
+    """
+    Claim and run jobs on a pool of `concurrency` threads or processes. With
+    `once`, return as soon as the queue is empty; otherwise poll forever.
+    Jobs still running after `JOB_TIMEOUT` are stopped (see `ThreadRunner`
+    and `ProcessRunner`). Returns the number of jobs run.
+    """
+    runner = make_runner(pool, concurrency)
+    timeout = get_timeout()
+    # Running handles as `handle: (job pk, deadline)`.
+    running = {}
+    count = 0
+    try:
+        while True:
+            free = concurrency - len(running) - runner.busy()
+            claimed = claim_jobs(free) if free > 0 else []
+            deadline = time.monotonic() + timeout
+            for item in claimed:
+                running[runner.start(item.pk)] = (item.pk, deadline)
+            count += len(claimed)
+            if running:
+                next_deadline = min(deadline for _, deadline in running.values())
+                wait_time = min(poll_interval, max(next_deadline - time.monotonic(), 0))
+                for handle in runner.wait(list(running), wait_time):
+                    pk, _ = running.pop(handle)
+                    if runner.crashed(handle):
+                        stop_job(pk, "Job worker crashed", retry=True)
+                now = time.monotonic()
+                for handle, (pk, deadline) in list(running.items()):
+                    if deadline <= now:
+                        del running[handle]
+                        runner.stop(handle)
+                        stop_job(
+                            pk, f"Timed out after {timeout}s", retry=runner.can_stop
+                        )
+            elif once:
+                break
+            else:
+                time.sleep(poll_interval)
+    finally:
+        for handle in running:
+            if runner.can_stop:
+                runner.stop(handle)
+        runner.close()
+    return count
+
+
+def job_metrics(since=None):
+    """Per-job-name counts and timings, for `run_jobs --stats`."""
+    jobs = Job.objects.all()
+    if since is not None:
+        jobs = jobs.filter(created_at__gte=since)
+    return (
+        jobs.values("name")
+        .annotate(
+            total=Count("pk"),
+            succeeded=Count("pk", filter=Q(status=Job.Status.SUCCEEDED)),
+            dead=Count("pk", filter=Q(status=Job.Status.DEAD)),
+            pending=Count(
+                "pk", filter=Q(status__in=[Job.Status.QUEUED, Job.Status.RUNNING])
+            ),
+            avg_duration_ms=Avg("duration_ms"),
+            max_duration_ms=Max("duration_ms"),
+            avg_wait_ms=Avg("wait_ms"),
+        )
+        .order_by("name")
+    )
@@ -0,0 +1,103 @@
+from django.db import router, transaction
+
+from .feedcache import bump_feed_version
+from .jobs import job
+from .models import Room, RoomListing
+
+LISTING_ROOM_FIELDS = [
+    "description",
+    "size",
+    "size_sqm",
+    "price_per_month",
+    "window",
+]
+LISTING_APARTMENT_FIELDS = [
+    "city",
+    "street",
+    "building_number",
+    "apartment_number",
+    "floor",
+    "latitude",
+    "longitude",
+    "geohash",
+    "balcony",
+    "bbq_allowed",
+    "smoking_allowed",
+    "allowed_pets",
+    "ac",
+]
+
+
+def build_listing(room):
+    """
+    Return the `RoomListing` column values for a room. Expects `apartment`
+    and `contract` to be loaded and `images` to be prefetched.
+    """
+    values = {
+        "room_id": room.pk,
+        "apartment_id": room.apartment_id,
+        "images": [
+            {
+                "id": image.pk,
+                "image": image.image.name or None,
+                "derivatives": image.derivatives,
+            }
+            for image in room.images.all()
+        ],
+        "contract": None,
+    }
+    for field in LISTING_ROOM_FIELDS:
+        values[field] = getattr(room, field)
+    for field in LISTING_APARTMENT_FIELDS:
+        values[field] = getattr(room.apartment, field)
+
+    contract = room.contract
+    if contract is not None:
+        values["contract"] = {
+            "id": contract.pk,
+            "start_date": contract.start_date.isoformat(),
+            "end_date": contract.end_date.isoformat(),
+            "deposit_amount": str(contract.deposit_amount),
+            "rent_amount": str(contract.rent_amount),
+            "file": contract.file.name or None,
+        }
+    return values
+
+
+def listing_rooms(queryset):
+    return queryset.filter(renter=None).select_related(
+        "apartment", "contract"
+    ).prefetch_related("images")
+
+
+def sync_room_listings(room_ids, using=None):
+    """
+    Bring the listings of the given rooms up to date: vacant rooms get a fresh
+    row, rented or deleted rooms lose theirs.
+    """
+    room_ids = list(room_ids)
+    if not room_ids:
+        return
+    using = using or router.db_for_write(RoomListing)
+    rooms = listing_rooms(Room.objects.using(using).filter(pk__in=room_ids))
+    listings = [RoomListing(**build_listing(room)) for room in rooms]
+    with transaction.atomic(using=using):
+        RoomListing.objects.using(using).filter(room_id__in=room_ids).delete()
+        RoomListing.objects.using(using).bulk_create(listings)
+
+
+@job
+def rebuild_room_listings(using=None, batch_size=500):
+    using = using or router.db_for_write(RoomListing)
+    room_ids = Room.objects.using(using).values_list("pk", flat=True).order_by("pk")
+    with transaction.atomic(using=using):
+        RoomListing.objects.using(using).all().delete()
+        batch = []
+        for room_id in room_ids.iterator(chunk_size=batch_size):
+            batch.append(room_id)
+            if len(batch) >= batch_size:
+                sync_room_listings(batch, using)
+                batch = []
+        sync_room_listings(batch, using)
+    transaction.on_commit(bump_feed_version, using=using)
+    return RoomListing.objects.using(using).count()
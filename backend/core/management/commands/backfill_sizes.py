@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.feedcache import bump_feed_version
+from core.models import Apartment, Room, RoomListing
+from core.sizes import backfill_sizes
+
+
+class Command(BaseCommand):
+    help = "Parse the free-text sizes into the numeric size_sqm columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database alias to backfill the sizes on.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of rows to update per batch.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        for model in (Apartment, Room, RoomListing):
+            changed = backfill_sizes(model, using, options["batch_size"])
+            self.stdout.write(f"{model.__name__}: updated {changed} rows.")
+        transaction.on_commit(bump_feed_version, using=using)
+        self.stdout.write(self.style.SUCCESS("Sizes backfilled."))
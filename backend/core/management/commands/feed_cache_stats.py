@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.feedcache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show the feed cache hit/miss/stale counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Reset the counters after printing."
+        )
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        total = sum(stats.values())
+        for state, value in stats.items():
+            share = value / total * 100 if total else 0
+            self.stdout.write(f"{state}: {value} ({share:.1f}%)")
+        if options["reset"]:
+            reset_cache_stats()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.images import process_image
+from core.models import ApartmentImage, RoomImage
+
+
+class Command(BaseCommand):
+    help = "Generate the resized derivatives of apartment and room images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate derivatives for images that already have them.",
+        )
+
+    def handle(self, *args, **options):
+        count = 0
+        for model in (ApartmentImage, RoomImage):
+            images = model.objects.exclude(image="").exclude(image=None)
+            if not options["force"]:
+                images = images.filter(derivatives={})
+            for pk in images.values_list("pk", flat=True).iterator():
+                try:
+                    process_image(model, pk)
+                except Exception as error:
+                    self.stderr.write(f"{model.__name__} {pk}: {error}")
+                    continue
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"Generated derivatives for {count} images."))
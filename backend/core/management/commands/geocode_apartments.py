@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core.feedcache import bump_feed_version
+from core.geo import encode_geohash, geocode
+from core.listings import sync_room_listings
+from core.models import Apartment, Room
+
+
+class Command(BaseCommand):
+    help = (
+        "Geocode apartments without coordinates and recompute their geohashes, "
+        "then refresh the affected room listings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database alias to geocode the apartments on.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of apartments to update per batch.",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        batch_size = options["batch_size"]
+        apartments = Apartment.objects.using(using).order_by("pk")
+        fields = ["latitude", "longitude", "geohash"]
+        changed = missing = 0
+        last_pk = 0
+        while True:
+            batch = list(apartments.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            stale = []
+            for apartment in batch:
+                before = [getattr(apartment, field) for field in fields]
+                if apartment.latitude is None or apartment.longitude is None:
+                    point = geocode(apartment.city, apartment.street)
+                    if point is None:
+                        missing += 1
+                    else:
+                        apartment.latitude, apartment.longitude = point
+                apartment.geohash = ""
+                if apartment.latitude is not None and apartment.longitude is not None:
+                    apartment.geohash = encode_geohash(
+                        apartment.latitude, apartment.longitude
+                    )
+                if [getattr(apartment, field) for field in fields] != before:
+                    stale.append(apartment)
+            with transaction.atomic(using=using):
+                Apartment.objects.using(using).bulk_update(stale, fields)
+                rooms = Room.objects.using(using).filter(apartment__in=stale)
+                sync_room_listings(rooms.values_list("pk", flat=True), using)
+            changed += len(stale)
+        transaction.on_commit(bump_feed_version, using=using)
+        self.stdout.write(f"Updated {changed} apartments, {missing} not found.")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.indexadvisor import advise, describe
+
+
+class Command(BaseCommand):
+    help = (
+        "Cross-reference each viewset's filters, ordering and get_queryset "
+        "against the model indexes and report the uncovered access paths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Also list the covered paths."
+        )
+        parser.add_argument(
+            "--fail",
+            action="store_true",
+            help="Exit with an error when a path is not covered.",
+        )
+
+    def handle(self, *args, **options):
+        uncovered = 0
+        for view, findings, errors in advise():
+            for finding in findings:
+                if finding.status == "ok" and not options["all"]:
+                    continue
+                line = f"{finding.status}: {describe(finding.path)}"
+                if finding.index:
+                    line += f" via {finding.index}"
+                if finding.status == "ok":
+                    self.stdout.write(line)
+                else:
+                    uncovered += 1
+                    self.stdout.write(self.style.WARNING(line))
+            for error in errors:
+                self.stdout.write(self.style.NOTICE(f"{view.__name__}: {error}"))
+        self.stdout.write(f"{uncovered} uncovered access path(s).")
+        if uncovered and options["fail"]:
+            raise CommandError("Some access paths are not covered by an index.")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from core.listings import rebuild_room_listings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized room listings used by the public feed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database alias to rebuild the listings on.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of rooms to rebuild per batch.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_room_listings(options["database"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} room listings."))
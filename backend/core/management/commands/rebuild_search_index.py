@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from core.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for rooms and apartments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Database alias to rebuild the index on.",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options["database"])
+        count = backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {count} rooms with {backend.__class__.__name__}."
+            )
+        )
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import job_metrics, run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a pool of worker threads or processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of jobs to run at the same time.",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=["thread", "process"],
+            default="thread",
+            help=(
+                "Run jobs in worker threads or in separate processes. Jobs past "
+                "JOB_TIMEOUT are killed in a process; in a thread they are given "
+                "up on instead of being run again."
+            ),
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling forever.",
+        )
+        parser.add_argument(
+            "--stats",
+            action="store_true",
+            help="Print per-job counts and timings instead of running jobs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for row in job_metrics():
+                self.stdout.write(
+                    "{name}: {total} total, {succeeded} succeeded, {dead} dead, "
+                    "{pending} pending, avg {avg_duration_ms:.1f}ms, "
+                    "max {max_duration_ms:.1f}ms, avg wait {avg_wait_ms:.1f}ms".format(
+                        **{
+                            key: value if value is not None else 0
+                            for key, value in row.items()
+                        }
+                    )
+                )
+            return
+        count = run_worker(
+            concurrency=options["concurrency"],
+            pool=options["pool"],
+            poll_interval=options["interval"],
+            once=options["once"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {count} jobs."))
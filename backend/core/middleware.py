@@ -1,10 +1,16 @@
-import jwt
+import logging
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
 from django.contrib.auth import get_user_model
 from django.utils.functional import SimpleLazyObject
 from django.contrib.auth.middleware import get_user
+from rest_framework.exceptions import AuthenticationFailed
+from login.authentication import CustomAuthentication, RequestAuthentication
+from .downloads import emulate_offload
+from .querybudget import QueryBudgetExceeded, QueryStats, get_view_budget
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 class JWTAuthenticationMiddleware:
     def __init__(self, get_response):
@@ -15,15 +21,86 @@ class JWTAuthenticationMiddleware:
 
         if access_token:
             try:
-                payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=['HS256'])
-                user_id = payload.get('user_id')
-                request.user = User.objects.get(pk=user_id)
-            except jwt.ExpiredSignatureError:
-                pass
-            except (jwt.exceptions.DecodeError, User.DoesNotExist):
+                request.user, _ = RequestAuthentication.for_request(request).authenticate(
+                    access_token, CustomAuthentication()
+                )
+            except AuthenticationFailed:
                 pass
 
         response = self.get_response(request)
         response['Authorization'] = f'Bearer {access_token}'
 
         return response
+
+
+class QueryCountMiddleware:
+    """
+    Records the queries run by each request. With `QUERY_COUNT_HEADERS` on,
+    adds `X-DB-Query-Count`, `X-DB-Duplicate-Queries` and `X-DB-Time` headers,
+    `X-DB-Cache-Query-Count` for database cache statements (not part of the
+    query count or budgets), plus `X-Auth-Token-Decodes`/`X-Auth-User-Lookups`
+    (0 for requests without a JWT).
+    Requests to views declaring a `query_budget` are checked against it and
+    raise `QueryBudgetExceeded` when `QUERY_BUDGET_RAISE` is on (tests), or
+    log a warning otherwise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.add_headers = getattr(settings, 'QUERY_COUNT_HEADERS', False)
+        self.raise_on_budget = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+        if not (self.add_headers or self.raise_on_budget):
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with stats.record():
+            response = self.get_response(request)
+        response.query_stats = stats
+
+        if self.add_headers:
+            response['X-DB-Query-Count'] = str(stats.count)
+            response['X-DB-Cache-Query-Count'] = str(stats.cache_count)
+            response['X-DB-Duplicate-Queries'] = str(
+                sum(repeats - 1 for _, repeats in stats.duplicates)
+            )
+            response['X-DB-Time'] = f'{stats.time * 1000:.1f}ms'
+            auth = getattr(request, 'jwt_auth', None)
+            response['X-Auth-Token-Decodes'] = str(auth.token_decodes if auth else 0)
+            response['X-Auth-User-Lookups'] = str(auth.user_lookups if auth else 0)
+
+        self.check_budget(request, stats)
+        return response
+
+    def check_budget(self, request, stats):
+        match = getattr(request, 'resolver_match', None)
+        view_class = getattr(getattr(match, 'func', None), 'cls', None)
+        if view_class is None:
+            return
+        actions = getattr(match.func, 'actions', None) or {}
+        budget = get_view_budget(view_class, actions.get(request.method.lower()))
+        if budget is None:
+            return
+        violations = budget.violations(stats)
+        if not violations:
+            return
+        message = f'{request.method} {request.path} ({view_class.__name__}): ' + '; '.join(violations)
+        if self.raise_on_budget:
+            raise QueryBudgetExceeded(message)
+        logger.warning('Query budget exceeded: %s', message)
+
+
+class OffloadEmulationMiddleware:
+    """
+    Serves `X-Accel-Redirect`/`X-Sendfile` responses from Django, checking
+    their header contract on the way, when `PROTECTED_MEDIA_OFFLOAD_EMULATE`
+    is on. Lets the offload mode run without nginx/Apache in front.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(settings, 'PROTECTED_MEDIA_OFFLOAD_EMULATE', False):
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        return emulate_offload(request, self.get_response(request))
@@ -0,0 +1,116 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:46
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FULLTEXT_SQL = {
+    "sqlite": (
+        [
+            "CREATE VIRTUAL TABLE core_roomsearchdocument_fts USING fts5(document)",
+            "CREATE TRIGGER core_roomsearchdocument_ai AFTER INSERT ON core_roomsearchdocument BEGIN "
+            "INSERT INTO core_roomsearchdocument_fts(rowid, document) VALUES (new.room_id, new.document); END",
+            "CREATE TRIGGER core_roomsearchdocument_ad AFTER DELETE ON core_roomsearchdocument BEGIN "
+            "DELETE FROM core_roomsearchdocument_fts WHERE rowid = old.room_id; END",
+            "CREATE TRIGGER core_roomsearchdocument_au AFTER UPDATE ON core_roomsearchdocument BEGIN "
+            "DELETE FROM core_roomsearchdocument_fts WHERE rowid = old.room_id; "
+            "INSERT INTO core_roomsearchdocument_fts(rowid, document) VALUES (new.room_id, new.document); END",
+        ],
+        [
+            "DROP TRIGGER IF EXISTS core_roomsearchdocument_au",
+            "DROP TRIGGER IF EXISTS core_roomsearchdocument_ad",
+            "DROP TRIGGER IF EXISTS core_roomsearchdocument_ai",
+            "DROP TABLE IF EXISTS core_roomsearchdocument_fts",
+        ],
+    ),
+    "mysql": (
+        [
+            "ALTER TABLE core_roomsearchdocument "
+            "ADD FULLTEXT INDEX core_roomsearchdocument_ft (document)",
+        ],
+        [
+            "ALTER TABLE core_roomsearchdocument DROP INDEX core_roomsearchdocument_ft",
+        ],
+    ),
+    "postgresql": (
+        [
+            "CREATE INDEX core_roomsearchdocument_ft ON core_roomsearchdocument "
+            "USING GIN (to_tsvector('simple', document))",
+        ],
+        [
+            "DROP INDEX IF EXISTS core_roomsearchdocument_ft",
+        ],
+    ),
+}
+
+
+def create_fulltext_index(apps, schema_editor):
+    forwards, _ = FULLTEXT_SQL.get(schema_editor.connection.vendor, ([], []))
+    for sql in forwards:
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    _, backwards = FULLTEXT_SQL.get(schema_editor.connection.vendor, ([], []))
+    for sql in backwards:
+        schema_editor.execute(sql)
+
+
+# A frozen copy of `core.search.build_document` as of this migration, so that
+# later changes to the search fields do not change what it builds.
+SEARCH_FIELDS = [
+    "apartment__city",
+    "apartment__street",
+    "apartment__building_number",
+    "apartment__apartment_number",
+    "apartment__floor",
+    "size",
+]
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def build_document(room):
+    tokens = []
+    for field in SEARCH_FIELDS:
+        value = room
+        for attr in field.split("__"):
+            value = getattr(value, attr, None)
+            if value is None:
+                break
+        if value is not None:
+            tokens.extend(TOKEN_RE.findall(str(value).lower()))
+    return " ".join(tokens)
+
+
+def build_documents(apps, schema_editor):
+    Room = apps.get_model("core", "Room")
+    RoomSearchDocument = apps.get_model("core", "RoomSearchDocument")
+    RoomSearchDocument.objects.bulk_create(
+        (
+            RoomSearchDocument(room_id=room.pk, document=build_document(room))
+            for room in Room.objects.select_related("apartment").iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_alter_apartment_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomSearchDocument',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='core.room')),
+                ('document', models.TextField(help_text='Normalized tokens of the searchable room and apartment fields.')),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# A frozen copy of `core.listings.build_listing` for the columns of this
+# migration; later columns are filled in by their own migrations or commands.
+ROOM_FIELDS = ["description", "size", "price_per_month", "window"]
+APARTMENT_FIELDS = [
+    "city",
+    "street",
+    "building_number",
+    "apartment_number",
+    "floor",
+    "balcony",
+    "bbq_allowed",
+    "smoking_allowed",
+    "allowed_pets",
+    "ac",
+]
+
+
+def build_listing(room):
+    values = {
+        "room_id": room.pk,
+        "apartment_id": room.apartment_id,
+        "images": [
+            {"id": image.pk, "image": image.image.name or None}
+            for image in room.images.all()
+        ],
+        "contract": None,
+    }
+    for field in ROOM_FIELDS:
+        values[field] = getattr(room, field)
+    for field in APARTMENT_FIELDS:
+        values[field] = getattr(room.apartment, field)
+    contract = room.contract
+    if contract is not None:
+        values["contract"] = {
+            "id": contract.pk,
+            "start_date": contract.start_date.isoformat(),
+            "end_date": contract.end_date.isoformat(),
+            "deposit_amount": str(contract.deposit_amount),
+            "rent_amount": str(contract.rent_amount),
+            "file": contract.file.name or None,
+        }
+    return values
+
+
+def build_listings(apps, schema_editor):
+    Room = apps.get_model("core", "Room")
+    RoomListing = apps.get_model("core", "RoomListing")
+    rooms = (
+        Room.objects.filter(renter=None)
+        .select_related("apartment", "contract")
+        .prefetch_related("images")
+    )
+    RoomListing.objects.bulk_create(
+        [RoomListing(**build_listing(room)) for room in rooms], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_roomsearchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomListing',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='core.room')),
+                ('description', models.TextField(blank=True, null=True)),
+                ('size', models.CharField(max_length=50)),
+                ('price_per_month', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('window', models.BooleanField(default=False)),
+                ('city', models.CharField(max_length=100, null=True)),
+                ('street', models.CharField(max_length=100, null=True)),
+                ('building_number', models.CharField(max_length=10, null=True)),
+                ('apartment_number', models.CharField(max_length=10, null=True)),
+                ('floor', models.IntegerField(null=True)),
+                ('balcony', models.BooleanField(default=False)),
+                ('bbq_allowed', models.BooleanField(default=False)),
+                ('smoking_allowed', models.BooleanField(default=False)),
+                ('allowed_pets', models.BooleanField(default=False)),
+                ('ac', models.BooleanField(default=False, help_text='Whether the apartment has air conditioning.')),
+                ('images', models.JSONField(default=list)),
+                ('contract', models.JSONField(blank=True, null=True)),
+                ('apartment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_listings', to='core.apartment')),
+            ],
+            options={
+                'ordering': ['price_per_month'],
+                'indexes': [models.Index(fields=['price_per_month', 'room'], name='core_roomlisting_price_idx')],
+            },
+        ),
+        migrations.RunPython(build_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['balcony'], name='core_apartment_balcony_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['bbq_allowed'], name='core_apartment_bbq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['smoking_allowed'], name='core_apartment_smoking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['allowed_pets'], name='core_apartment_pets_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['ac'], name='core_apartment_ac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['apartment', '-date'], name='core_bill_apartment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inquiry',
+            index=models.Index(fields=['sender', '-created_at'], name='core_inquiry_sender_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inquiry',
+            index=models.Index(fields=['receiver', '-created_at'], name='core_inquiry_receiver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inquiryreply',
+            index=models.Index(fields=['inquiry', '-created_at'], name='core_inquiryreply_inquiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['price_per_month'], name='core_room_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['renter', 'price_per_month'], name='core_room_renter_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlisting',
+            index=models.Index(fields=['balcony', 'price_per_month'], name='core_roomlisting_balcony_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlisting',
+            index=models.Index(fields=['bbq_allowed', 'price_per_month'], name='core_roomlisting_bbq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlisting',
+            index=models.Index(fields=['smoking_allowed', 'price_per_month'], name='core_roomlisting_smoking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlisting',
+            index=models.Index(fields=['allowed_pets', 'price_per_month'], name='core_roomlisting_pets_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlisting',
+            index=models.Index(fields=['ac', 'price_per_month'], name='core_roomlisting_ac_idx'),
+        ),
+    ]
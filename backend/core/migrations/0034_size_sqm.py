@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='size_sqm',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, help_text='The size in square metres, parsed from `size`.', max_digits=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='size_sqm',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, help_text='The size in square metres, parsed from `size`.', max_digits=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='roomlisting',
+            name='size_sqm',
+            field=models.DecimalField(db_index=True, decimal_places=2, max_digits=7, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_size_sqm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='apartment',
+            name='latitude',
+            field=models.FloatField(blank=True, help_text='Geocoded from the address unless given.', null=True),
+        ),
+        migrations.AddField(
+            model_name='apartment',
+            name='longitude',
+            field=models.FloatField(blank=True, help_text='Geocoded from the address unless given.', null=True),
+        ),
+        migrations.AddField(
+            model_name='roomlisting',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='roomlisting',
+            name='latitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='roomlisting',
+            name='longitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['latitude', 'longitude'], name='core_apartment_latlon_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlisting',
+            index=models.Index(fields=['latitude', 'longitude'], name='core_roomlisting_latlon_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:07
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_cache_table'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='apartment',
+            name='core_apartment_balcony_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='apartment',
+            name='core_apartment_bbq_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='apartment',
+            name='core_apartment_smoking_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='apartment',
+            name='core_apartment_pets_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='apartment',
+            name='core_apartment_ac_idx',
+        ),
+    ]
@@ -2,7 +2,10 @@ from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from uuid import uuid4
+from .geo import GeocodedMixin
+from .sizes import ParsedSizeMixin
 from .validators import validate_file_size
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.utils.translation import gettext as _
@@ -29,6 +32,7 @@ class CustomUser(AbstractUser):
     is_active = models.BooleanField(default=True)
     date_joined = models.DateTimeField(auto_now_add=True)
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
     phone = PhoneNumberField(blank=True, null=True)
 
     age = models.PositiveIntegerField(blank=True, null=True)
@@ -40,7 +44,7 @@ class CustomUser(AbstractUser):
     preferred_rent = models.PositiveIntegerField(blank=True, null=True)
 
 
-class Apartment(models.Model):
+class Apartment(GeocodedMixin, ParsedSizeMixin, models.Model):
     owner = models.ForeignKey(
         CustomUser,
         on_delete=models.CASCADE,
@@ -72,10 +76,32 @@ class Apartment(models.Model):
         help_text=_("The floor of the apartment."),
         null=True,
     )
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        help_text=_("Geocoded from the address unless given."),
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        help_text=_("Geocoded from the address unless given."),
+    )
+    geohash = models.CharField(
+        max_length=12, blank=True, default="", editable=False, db_index=True
+    )
     description = models.TextField(
         blank=True, null=True, help_text=_("A description of the apartment.")
     )
     size = models.CharField(max_length=50, help_text=_("The size of the apartment."))
+    size_sqm = models.DecimalField(
+        max_digits=7,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text=_("The size in square metres, parsed from `size`."),
+    )
     balcony = models.BooleanField(
         default=False, help_text=_("Whether the apartment has a balcony.")
     )
@@ -91,6 +117,7 @@ class Apartment(models.Model):
     ac = models.BooleanField(
         default=False, help_text=_("Whether the apartment has air conditioning.")
     )
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property
     def address(self):
@@ -101,6 +128,11 @@ class Apartment(models.Model):
 
     class Meta:
         ordering = ["city", "street", "building_number", "apartment_number"]
+        indexes = [
+            models.Index(
+                fields=["latitude", "longitude"], name="core_apartment_latlon_idx"
+            ),
+        ]
 
 
 class ApartmentImage(models.Model):
@@ -118,6 +150,8 @@ class ApartmentImage(models.Model):
         blank=True,
         null=True,
     )
+    # Resized copies written by `core.images`, as `{format: {width: name}}`.
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
 
 class Contract(models.Model):
@@ -136,9 +170,10 @@ class Contract(models.Model):
     )
     terms_and_conditions = models.TextField(blank=True, null=True)
     file = models.FileField(upload_to="contracts/", blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
-class Room(models.Model):
+class Room(ParsedSizeMixin, models.Model):
     apartment = models.ForeignKey(
         Apartment, on_delete=models.PROTECT, related_name="rooms"
     )
@@ -158,8 +193,18 @@ class Room(models.Model):
         max_digits=8, decimal_places=2, validators=[MinValueValidator(1)]
     )
     size = models.CharField(max_length=50)
+    size_sqm = models.DecimalField(
+        max_digits=7,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text=_("The size in square metres, parsed from `size`."),
+    )
     window = models.BooleanField(default=False, blank=True)
     ac = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         return f"{self.apartment.address}, Room {self.id}"
@@ -171,6 +216,14 @@ class Room(models.Model):
 
     class Meta:
         ordering = ["price_per_month"]
+        indexes = [
+            models.Index(fields=["price_per_month"], name="core_room_price_idx"),
+            # Vacant rooms (`renter=None`) and a renter's room, by price.
+            models.Index(
+                fields=["renter", "price_per_month"],
+                name="core_room_renter_price_idx",
+            ),
+        ]
 
 
 class RoomImage(models.Model):
@@ -184,6 +237,8 @@ class RoomImage(models.Model):
     room = models.ForeignKey(
         Room, on_delete=models.CASCADE, related_name="images", blank=True, null=True
     )
+    # Resized copies written by `core.images`, as `{format: {width: name}}`.
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
 
 class Bill(models.Model):
@@ -219,6 +274,11 @@ class Bill(models.Model):
 
     class Meta:
         ordering = ["-date"]
+        indexes = [
+            models.Index(
+                fields=["apartment", "-date"], name="core_bill_apartment_date_idx"
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -256,15 +316,25 @@ class Inquiry(models.Model):
         null=True,
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     type = models.CharField(max_length=20, choices=INQUIRY_TYPE_CHOICES)
     message = models.TextField()
     image = models.ImageField(upload_to="inquiry/", blank=True, null=True)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Inquiry #{self.id} about {self.apartment.address}"
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["sender", "-created_at"], name="core_inquiry_sender_idx"
+            ),
+            models.Index(
+                fields=["receiver", "-created_at"], name="core_inquiry_receiver_idx"
+            ),
+        ]
 
 
 class InquiryReply(models.Model):
@@ -282,6 +352,12 @@ class InquiryReply(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["inquiry", "-created_at"],
+                name="core_inquiryreply_inquiry_idx",
+            ),
+        ]
 
 
 class Review(models.Model):
@@ -289,3 +365,173 @@ class Review(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     date = models.DateField(auto_now_add=True)
+
+
+class RoomSearchDocument(models.Model):
+    room = models.OneToOneField(
+        Room,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    document = models.TextField(
+        help_text=_("Normalized tokens of the searchable room and apartment fields.")
+    )
+
+    def __str__(self):
+        return f"Search document for room #{self.room_id}"
+
+
+class RoomListing(models.Model):
+    """
+    Flat, read-only projection of a vacant room with everything the public
+    feed cards and `RoomFilter` need. Maintained by `core.listings`.
+    """
+
+    room = models.OneToOneField(
+        Room, on_delete=models.CASCADE, primary_key=True, related_name="listing"
+    )
+    apartment = models.ForeignKey(
+        Apartment, on_delete=models.CASCADE, related_name="room_listings"
+    )
+    description = models.TextField(null=True, blank=True)
+    size = models.CharField(max_length=50)
+    size_sqm = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, db_index=True
+    )
+    price_per_month = models.DecimalField(max_digits=8, decimal_places=2)
+    window = models.BooleanField(default=False)
+    city = models.CharField(max_length=100, null=True)
+    street = models.CharField(max_length=100, null=True)
+    building_number = models.CharField(max_length=10, null=True)
+    apartment_number = models.CharField(max_length=10, null=True)
+    floor = models.IntegerField(null=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    geohash = models.CharField(max_length=12, blank=True, default="", db_index=True)
+    balcony = models.BooleanField(default=False)
+    bbq_allowed = models.BooleanField(default=False)
+    smoking_allowed = models.BooleanField(default=False)
+    allowed_pets = models.BooleanField(default=False)
+    ac = models.BooleanField(
+        default=False, help_text=_("Whether the apartment has air conditioning.")
+    )
+    images = models.JSONField(default=list)
+    contract = models.JSONField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Listing for room #{self.room_id}"
+
+    class Meta:
+        ordering = ["price_per_month"]
+        indexes = [
+            models.Index(
+                fields=["price_per_month", "room"],
+                name="core_roomlisting_price_idx",
+            ),
+            # `RoomFilter` amenities, read in price order.
+            models.Index(
+                fields=["balcony", "price_per_month"],
+                name="core_roomlisting_balcony_idx",
+            ),
+            models.Index(
+                fields=["bbq_allowed", "price_per_month"],
+                name="core_roomlisting_bbq_idx",
+            ),
+            models.Index(
+                fields=["smoking_allowed", "price_per_month"],
+                name="core_roomlisting_smoking_idx",
+            ),
+            models.Index(
+                fields=["allowed_pets", "price_per_month"],
+                name="core_roomlisting_pets_idx",
+            ),
+            models.Index(
+                fields=["ac", "price_per_month"], name="core_roomlisting_ac_idx"
+            ),
+            models.Index(
+                fields=["latitude", "longitude"], name="core_roomlisting_latlon_idx"
+            ),
+        ]
+
+
+class OutgoingEmail(models.Model):
+    """
+    Transactional email outbox. Rows are written with the request that sends
+    the mail and delivered by the `send_queued_email` worker (`core.outbox`).
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        DEAD = "dead", "Dead"
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)} ({self.status})"
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="core_outgoingemail_due_idx",
+            ),
+        ]
+
+
+class Job(models.Model):
+    """
+    Deferred unit of work run by the `run_jobs` worker. `name` is the dotted
+    path of a function registered with `core.jobs.job`.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Queued"
+        RUNNING = "running", "Running"
+        SUCCEEDED = "succeeded", "Succeeded"
+        DEAD = "dead", "Dead"
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(
+        default=0, help_text=_("Jobs with a higher priority run first.")
+    )
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Time spent running the last attempt, and between `run_at` and its start.
+    duration_ms = models.FloatField(null=True, blank=True)
+    wait_ms = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ["-priority", "run_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "priority", "run_at"], name="core_job_due_idx"
+            ),
+        ]
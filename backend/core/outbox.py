@@ -0,0 +1,142 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .jobs import job
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def get_outbox_setting(name, default):
+    return getattr(settings, f"EMAIL_OUTBOX_{name}", default)
+
+
+def enqueue_email(subject, message, from_email, recipient_list):
+    """
+    Queue an email for the outbox worker. The row joins the caller's
+    transaction, so the mail only goes out if the request commits.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+    )
+
+
+def get_backoff(attempts):
+    base = get_outbox_setting("BACKOFF", 60)
+    cap = get_outbox_setting("MAX_BACKOFF", 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def claim_batch(batch_size):
+    """
+    Lease up to `batch_size` due emails to this worker by pushing their
+    `next_attempt_at` past the lease. Rows locked by another worker are
+    skipped, and rows of a worker that died come back once the lease ends.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=get_outbox_setting("LEASE", 300))
+    due = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.Status.PENDING, next_attempt_at__lte=now
+    ).order_by("next_attempt_at", "pk")
+    features = connections[router.db_for_write(OutgoingEmail)].features
+    with transaction.atomic():
+        if features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        elif features.has_select_for_update:
+            due = due.select_for_update()
+        emails = list(due[:batch_size])
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + lease
+        )
+    return emails
+
+
+def deliver(email, connection):
+    message = EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.recipients,
+        connection=connection,
+    )
+    message.send(fail_silently=False)
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    if email.attempts >= get_outbox_setting("MAX_ATTEMPTS", 5):
+        email.status = OutgoingEmail.Status.DEAD
+        logger.error("Giving up on email %s: %s", email.pk, email.last_error)
+    else:
+        email.next_attempt_at = timezone.now() + get_backoff(email.attempts)
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def reset_connection(connection):
+    # A failed send may leave the SMTP session unusable; start a fresh one
+    # for the rest of the batch.
+    connection.close()
+    try:
+        connection.open()
+    except Exception:
+        pass
+
+
+def send_batch(emails, connection):
+    sent = failed = 0
+    for email in emails:
+        try:
+            deliver(email, connection)
+        except Exception as error:
+            record_failure(email, error)
+            failed += 1
+            reset_connection(connection)
+            continue
+        email.status = OutgoingEmail.Status.SENT
+        email.attempts += 1
+        email.sent_at = timezone.now()
+        email.last_error = ""
+        email.save(update_fields=["status", "attempts", "sent_at", "last_error"])
+        sent += 1
+    return sent, failed
+
+
+@job
+def drain_outbox(batch_size=100, connection=None, max_batches=None):
+    """
+    Deliver due emails in batches over a single reused mail connection.
+    Returns `(sent, failed)`; failed emails are retried with exponential
+    backoff and marked dead after `EMAIL_OUTBOX_MAX_ATTEMPTS`.
+    """
+    connection = connection or get_connection()
+    total_sent = total_failed = batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            emails = claim_batch(batch_size)
+            if not emails:
+                break
+            try:
+                connection.open()
+            except Exception as error:
+                # The server is unreachable: count it as a failed attempt for
+                # the whole batch instead of holding it until the lease ends.
+                for email in emails:
+                    record_failure(email, error)
+                total_failed += len(emails)
+                break
+            sent, failed = send_batch(emails, connection)
+            total_sent += sent
+            total_failed += failed
+            batches += 1
+    finally:
+        connection.close()
+    return total_sent, total_failed
@@ -1,4 +1,224 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
 
 class DefaultPagination(PageNumberPagination):
-  page_size = 10
\ No newline at end of file
+    page_size = 10
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek ("keyset") pagination over the view's ordering plus the primary key.
+
+    Each page is fetched with a `WHERE (ordering) > (last row)` predicate, so
+    page N costs the same as page 1 and no `COUNT(*)` is run. NULLs in a
+    nullable ordering column sort after every value, whatever the database's
+    default, and the predicate compares them explicitly.
+    """
+
+    page_size = 10
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable = {
+            name for name, _ in self.ordering if self.is_nullable(queryset, name)
+        }
+        self.cursor = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.get_order_by(reverse=self.is_reverse))
+        if self.cursor is not None:
+            queryset = queryset.filter(self.get_seek_filter(self.cursor["v"]))
+
+        results = list(queryset[: self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if self.is_reverse:
+            results.reverse()
+
+        self.page = results
+        if self.is_reverse:
+            self.has_next = self.cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return results
+
+    @property
+    def is_reverse(self):
+        return bool(self.cursor and self.cursor.get("r"))
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Return the ordering as a list of `(field, descending)` pairs, always
+        ending with the primary key so that every position is unique.
+        """
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = queryset.query.order_by or queryset.model._meta.ordering
+
+        fields = []
+        for field in ordering:
+            field = str(field)
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            if name == "pk":
+                name = queryset.model._meta.pk.attname
+            fields.append((name, descending))
+
+        pk_name = queryset.model._meta.pk.attname
+        if pk_name not in [name for name, _ in fields]:
+            fields.append((pk_name, fields[-1][1] if fields else False))
+        return fields
+
+    def is_nullable(self, queryset, name):
+        try:
+            return queryset.model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            # An annotation, such as `distance`.
+            return True
+
+    def get_order_by(self, reverse=False):
+        order_by = []
+        for name, descending in self.ordering:
+            descending = descending != reverse
+            if name not in self.nullable:
+                order_by.append(("-" if descending else "") + name)
+            elif descending:
+                order_by.append(F(name).desc(nulls_first=True))
+            else:
+                order_by.append(F(name).asc(nulls_last=True))
+        return order_by
+
+    def get_seek_filter(self, values):
+        """
+        Build the lexicographic `(a, b, c) > (x, y, z)` predicate as
+        `a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)`, where
+        NULL is greater than any value.
+        """
+        seek = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            after = self.get_after_filter(name, value, descending != self.is_reverse)
+            if after is not None:
+                seek |= equal & after
+            equal &= Q(**{f"{name}__isnull": True} if value is None else {name: value})
+        return seek
+
+    def get_after_filter(self, name, value, descending):
+        """
+        The rows past `value` in the column `name`, or None when there are
+        none.
+        """
+        if value is None:
+            # Only values come after a NULL when descending, and none
+            # ascending.
+            return Q(**{f"{name}__isnull": False}) if descending else None
+        after = Q(**{f"{name}__lt" if descending else f"{name}__gt": value})
+        if name in self.nullable and not descending:
+            after |= Q(**{f"{name}__isnull": True})
+        return after
+
+    def get_position(self, instance):
+        values = []
+        for name, _ in self.ordering:
+            value = instance
+            for attr in name.split("__"):
+                value = getattr(value, attr)
+            values.append(value)
+        return values
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if len(cursor["v"]) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, values, reverse=False):
+        cursor = {"v": values}
+        if reverse:
+            cursor["r"] = 1
+        data = json.dumps(cursor, cls=DjangoJSONEncoder, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(data.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # An empty cursor starts over from the first keyset page.
+            return replace_query_param(self.base_url, self.cursor_query_param, "")
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class FeedPagination(DefaultPagination):
+    """
+    Page-number pagination (with totals) by default; switches to keyset
+    pagination when the request carries a `cursor` parameter. Clients start
+    the cursor mode with an empty `?cursor=` and follow the `next` links.
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,199 @@
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .fieldsets import get_nested
+
+# `select` holds `select_related` paths; `prefetch` holds
+# `(lookup, related model, nested plan)` triples for to-many relations;
+# `only` holds the columns to load, or None to load them all.
+PrefetchPlan = namedtuple("PrefetchPlan", ["select", "prefetch", "only"])
+
+EMPTY_PLAN = PrefetchPlan((), (), None)
+
+
+def resolve_serializer(serializer_class, reference):
+    """
+    Resolve a serializer given either as a class or as the name of a class
+    defined in the same module as `serializer_class`.
+    """
+    if reference is None or not isinstance(reference, str):
+        return reference
+    return getattr(sys.modules[serializer_class.__module__], reference)
+
+
+def get_relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.is_relation or field.related_model is None:
+        return None
+    return field
+
+
+def get_column(model, attr):
+    """
+    Return the name to pass to `only()` for the serializer source `attr`, ""
+    for reverse relations, which need no local column, or None when `attr`
+    is not a model field (a property or method that may read any column).
+    """
+    try:
+        field = model._meta.get_field(attr)
+    except FieldDoesNotExist:
+        return None
+    if field.concrete:
+        return field.name
+    return "" if field.is_relation else None
+
+
+@lru_cache(maxsize=1024)
+def get_prefetch_plan(serializer_class, fieldset=None):
+    """
+    Walk the declared fields of a model serializer and return the relations it
+    reads: nested serializers, dotted `source=` paths and the method fields
+    listed in `Meta.method_field_relations`, e.g.
+    `{"rooms": ("rooms", "RoomSerializer"), "bill_ids": ("bills", None)}`.
+    With a `core.fieldsets.Fieldset`, only the selected fields are walked and
+    the plan also restricts the loaded columns when it can tell which ones
+    the fields read.
+    """
+    meta = getattr(serializer_class, "Meta", None)
+    model = getattr(meta, "model", None)
+    if model is None:
+        return EMPTY_PLAN
+
+    select = []
+    prefetch = []
+    only = [model._meta.pk.name] if fieldset is not None else None
+
+    def add_column(attr):
+        nonlocal only
+        if only is None:
+            return
+        column = get_column(model, attr)
+        if column is None:
+            only = None
+        elif column:
+            only.append(column)
+
+    def add_path(attrs, nested_serializer=None, nested_fieldset=None):
+        add_column(attrs[0])
+        current = model
+        path = []
+        for index, attr in enumerate(attrs):
+            field = get_relation(current, attr)
+            if field is None:
+                return
+            path.append(attr)
+            nested_plan = EMPTY_PLAN
+            if nested_serializer is not None and index == len(attrs) - 1:
+                nested_plan = get_prefetch_plan(nested_serializer, nested_fieldset)
+            if field.many_to_many or field.one_to_many:
+                if nested_plan.only is not None:
+                    # The prefetch joins back to the parent rows through the
+                    # foreign key, so it has to be loaded.
+                    remote = field.field.name if field.one_to_many else None
+                    nested_plan = nested_plan._replace(
+                        only=nested_plan.only + (remote,) if remote else None
+                    )
+                prefetch.append(("__".join(path), field.related_model, nested_plan))
+                return
+            current = field.related_model
+            if index == len(attrs) - 1:
+                lookup = "__".join(path)
+                select.append(lookup)
+                select.extend(f"{lookup}__{nested}" for nested in nested_plan.select)
+                prefetch.extend(
+                    (f"{lookup}__{nested}", related_model, plan)
+                    for nested, related_model, plan in nested_plan.prefetch
+                )
+
+    serializer = serializer_class(context={"fieldset": fieldset})
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            relations = getattr(meta, "method_field_relations", {})
+            if field.field_name in relations:
+                source, nested = relations[field.field_name]
+                nested = resolve_serializer(serializer_class, nested)
+                nested_fieldset = get_nested(fieldset, field.field_name)
+                add_path(source.split("__"), nested, nested_fieldset)
+            else:
+                only = None
+        elif field.source == "*":
+            only = None
+        elif isinstance(field, serializers.ListSerializer):
+            child = field.child
+            add_path(
+                field.source_attrs, child.__class__, getattr(child, "_fieldset", None)
+            )
+        elif isinstance(field, serializers.BaseSerializer):
+            add_path(
+                field.source_attrs, field.__class__, getattr(field, "_fieldset", None)
+            )
+        elif isinstance(field, serializers.ManyRelatedField):
+            add_path(field.source_attrs)
+        elif len(field.source_attrs) > 1:
+            add_path(field.source_attrs[:-1])
+        else:
+            add_column(field.source_attrs[0])
+
+    return PrefetchPlan(
+        tuple(dict.fromkeys(select)),
+        tuple({lookup: (lookup, m, p) for lookup, m, p in prefetch}.values()),
+        tuple(dict.fromkeys(only)) if only is not None else None,
+    )
+
+
+def build_prefetches(plan):
+    prefetches = []
+    for lookup, related_model, nested_plan in plan.prefetch:
+        if nested_plan.select or nested_plan.prefetch or nested_plan.only:
+            queryset = apply_prefetch_plan(
+                related_model._default_manager.all(), nested_plan
+            )
+            prefetches.append(Prefetch(lookup, queryset=queryset))
+        else:
+            prefetches.append(lookup)
+    return prefetches
+
+
+def apply_prefetch_plan(queryset, plan):
+    if plan.only is not None:
+        queryset = queryset.only(*plan.only)
+    if plan.select:
+        queryset = queryset.select_related(*plan.select)
+    if plan.prefetch:
+        queryset = queryset.prefetch_related(*build_prefetches(plan))
+    return queryset
+
+
+def prefetch_for(queryset, serializer_class, fieldset=None):
+    """
+    Return `queryset` with the `select_related`/`prefetch_related` calls needed
+    to serialize it with `serializer_class` in a constant number of queries,
+    limited to the fields in `fieldset` when one is given.
+    """
+    return apply_prefetch_plan(queryset, get_prefetch_plan(serializer_class, fieldset))
+
+
+class PrefetchPlanMixin:
+    """
+    Viewset mixin that applies the prefetch plan of the viewset's serializer
+    to every queryset passed through `filter_queryset`, i.e. to the
+    `get_queryset()` result used by list, retrieve and the object actions.
+    The plan follows the fieldset in the serializer context, if any.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "destroy" or getattr(queryset, "model", None) is None:
+            return queryset
+        fieldset = self.get_serializer_context().get("fieldset")
+        return prefetch_for(queryset, self.get_serializer_class(), fieldset)
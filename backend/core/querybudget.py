@@ -0,0 +1,162 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+IN_LIST_RE = re.compile(r"\bIN \((?:%s, )*%s\)", re.IGNORECASE)
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def sql_shape(sql):
+    """
+    Reduce a statement to its shape: parameters, literals and `IN` lists are
+    folded so that the N queries of an N+1 pattern share one shape.
+    """
+    shape = IN_LIST_RE.sub("IN (...)", sql)
+    shape = STRING_RE.sub("?", shape)
+    return NUMBER_RE.sub("?", shape)
+
+
+TRANSACTION_RE = re.compile(r"^(?:BEGIN|(?:RELEASE |ROLLBACK TO )?SAVEPOINT)\b")
+
+
+def cache_table_re():
+    """
+    Match statements on the tables of `DatabaseCache` backends, or None when
+    there are none. These are cache round trips rather than ORM queries.
+    """
+    tables = [
+        config["LOCATION"]
+        for config in settings.CACHES.values()
+        if config.get("BACKEND") == "django.core.cache.backends.db.DatabaseCache"
+    ]
+    if not tables:
+        return None
+    return re.compile(r"\b(?:%s)\b" % "|".join(map(re.escape, tables)))
+
+
+class QueryStats:
+    """
+    `connection.execute_wrapper` that records every statement run while it is
+    installed, with its shape and duration. `BEGIN` and savepoints, which only
+    mark `atomic()` blocks, are skipped; statements on `DatabaseCache` tables
+    are kept apart in `cache_queries`, so they are reported without counting
+    against query budgets.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.cache_queries = []
+        self.time = 0.0
+        self.cache_table = cache_table_re()
+
+    def __call__(self, execute, sql, params, many, context):
+        if TRANSACTION_RE.search(sql):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.time += duration
+            if self.cache_table is not None and self.cache_table.search(sql):
+                self.cache_queries.append((sql, duration))
+            else:
+                self.queries.append((sql, duration))
+
+    @property
+    def cache_count(self):
+        return len(self.cache_queries)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def shapes(self):
+        return Counter(sql_shape(sql) for sql, _ in self.queries)
+
+    @property
+    def duplicates(self):
+        """Shapes that ran more than once, most repeated first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > 1]
+
+    @property
+    def max_repeats(self):
+        shapes = self.shapes
+        return max(shapes.values()) if shapes else 0
+
+    @contextmanager
+    def record(self, using=None):
+        aliases = [using] if using else list(connections)
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+
+class QueryBudget:
+    """
+    Declarative per-view query budget, e.g. on a viewset:
+
+        query_budget = QueryBudget(max_queries=6, max_repeats=1)
+
+    or per action: `query_budget = {"list": QueryBudget(...), ...}`.
+    """
+
+    def __init__(self, max_queries=None, max_repeats=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+
+    def violations(self, stats):
+        violations = []
+        if self.max_queries is not None and stats.count > self.max_queries:
+            violations.append(
+                f"{stats.count} queries run, budget is {self.max_queries}"
+            )
+        if self.max_repeats is not None:
+            for shape, repeats in stats.duplicates:
+                if repeats > self.max_repeats:
+                    violations.append(
+                        f"query shape repeated {repeats} times, budget is "
+                        f"{self.max_repeats}: {shape}"
+                    )
+        return violations
+
+    def __repr__(self):
+        return (
+            f"QueryBudget(max_queries={self.max_queries}, "
+            f"max_repeats={self.max_repeats})"
+        )
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def get_view_budget(view_class, action=None):
+    budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        budget = budget.get(action)
+    return budget
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, max_repeats=None, using=None):
+    """
+    Test helper: fail when the block runs more than `max_queries` queries or
+    repeats one query shape more than `max_repeats` times.
+
+        with assert_query_budget(max_queries=5, max_repeats=1):
+            self.client.get("/core/feed/")
+    """
+    stats = QueryStats()
+    with stats.record(using):
+        yield stats
+    violations = QueryBudget(max_queries, max_repeats).violations(stats)
+    if violations:
+        raise QueryBudgetExceeded("; ".join(violations))
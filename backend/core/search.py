@@ -0,0 +1,172 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Room, RoomSearchDocument
+
+SEARCH_FIELDS = [
+    "apartment__city",
+    "apartment__street",
+    "apartment__building_number",
+    "apartment__apartment_number",
+    "apartment__floor",
+    "size",
+]
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def build_document(room):
+    """
+    Flatten the searchable fields of a room and its apartment into one
+    lowercase, whitespace separated token string.
+    """
+    tokens = []
+    for field in SEARCH_FIELDS:
+        value = room
+        for attr in field.split("__"):
+            value = getattr(value, attr, None)
+            if value is None:
+                break
+        if value is not None:
+            tokens.extend(tokenize(value))
+    return " ".join(tokens)
+
+
+class BaseSearchBackend:
+    """
+    Keeps `RoomSearchDocument` rows in sync with rooms and narrows room
+    querysets down to the ones matching a free-text query. Subclasses only
+    provide the SQL that matches the database's full-text index.
+    """
+
+    batch_size = 500
+
+    def __init__(self, using):
+        self.using = using
+        self.table = RoomSearchDocument._meta.db_table
+
+    def index_rooms(self, rooms):
+        documents = [
+            RoomSearchDocument(room_id=room.pk, document=build_document(room))
+            for room in rooms
+        ]
+        if not documents:
+            return
+        with transaction.atomic(using=self.using):
+            RoomSearchDocument.objects.using(self.using).filter(
+                room_id__in=[document.room_id for document in documents]
+            ).delete()
+            RoomSearchDocument.objects.using(self.using).bulk_create(
+                documents, batch_size=self.batch_size
+            )
+
+    def remove_rooms(self, room_ids):
+        RoomSearchDocument.objects.using(self.using).filter(
+            room_id__in=room_ids
+        ).delete()
+
+    def rebuild(self):
+        rooms = Room.objects.using(self.using).select_related("apartment")
+        with transaction.atomic(using=self.using):
+            RoomSearchDocument.objects.using(self.using).all().delete()
+            batch = []
+            for room in rooms.iterator(chunk_size=self.batch_size):
+                batch.append(room)
+                if len(batch) >= self.batch_size:
+                    self.index_rooms(batch)
+                    batch = []
+            self.index_rooms(batch)
+        return RoomSearchDocument.objects.using(self.using).count()
+
+    def search(self, queryset, query, field="pk"):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset
+        sql, params = self.match_sql(tokens)
+        return queryset.filter(**{f"{field}__in": RawSQL(sql, params)})
+
+    def match_sql(self, tokens):
+        sql = f"SELECT room_id FROM {self.table} WHERE " + " AND ".join(
+            ["document LIKE %s"] * len(tokens)
+        )
+        return sql, [f"%{token}%" for token in tokens]
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    def __init__(self, using):
+        super().__init__(using)
+        self.fts_table = f"{self.table}_fts"
+
+    def match_sql(self, tokens):
+        # Quote every token so user input can never be read as FTS5 syntax.
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return f"SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s", [
+            match
+        ]
+
+    def rebuild(self):
+        count = super().rebuild()
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('optimize')"
+            )
+        return count
+
+
+class MySQLSearchBackend(BaseSearchBackend):
+    # InnoDB does not index tokens shorter than `innodb_ft_min_token_size`.
+    min_token_size = 3
+
+    def match_sql(self, tokens):
+        long_tokens = [token for token in tokens if len(token) >= self.min_token_size]
+        short_tokens = [token for token in tokens if len(token) < self.min_token_size]
+        conditions = []
+        params = []
+        if long_tokens:
+            conditions.append("MATCH(document) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(" ".join(f"+{token}*" for token in long_tokens))
+        for token in short_tokens:
+            conditions.append("document LIKE %s")
+            params.append(f"%{token}%")
+        sql = f"SELECT room_id FROM {self.table} WHERE " + " AND ".join(conditions)
+        return sql, params
+
+
+class PostgreSQLSearchBackend(BaseSearchBackend):
+    def match_sql(self, tokens):
+        query = " & ".join(f"{token}:*" for token in tokens)
+        sql = (
+            f"SELECT room_id FROM {self.table} "
+            "WHERE to_tsvector('simple', document) @@ to_tsquery('simple', %s)"
+        )
+        return sql, [query]
+
+
+SEARCH_BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "mysql": MySQLSearchBackend,
+    "postgresql": PostgreSQLSearchBackend,
+}
+
+
+def get_search_backend(using=None):
+    """
+    Return the search backend for a database alias. `ROOM_SEARCH_BACKEND` may
+    point at a custom backend class; otherwise it is picked by vendor.
+    """
+    using = using or router.db_for_read(Room)
+    backend_path = getattr(settings, "ROOM_SEARCH_BACKEND", None)
+    if backend_path:
+        backend_class = import_string(backend_path)
+    else:
+        vendor = connections[using].vendor
+        backend_class = SEARCH_BACKENDS.get(vendor, BaseSearchBackend)
+    return backend_class(using)
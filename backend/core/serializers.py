@@ -10,13 +10,20 @@ from .models import (
     CustomUser,
     Contract,
     Bill,
+    RoomListing,
 )
+from decimal import Decimal
+from django.core.files.storage import default_storage
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from .fieldsets import SparseFieldsetMixin
+from .images import get_srcset
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    avatar_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = CustomUser
         fields = (
@@ -28,6 +35,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "avatar",
+            "avatar_srcset",
             "age",
             "gender",
             "bio",
@@ -37,6 +45,11 @@ class CustomUserSerializer(serializers.ModelSerializer):
         )
         extra_kwargs = {"password": {"write_only": True}}
 
+    def get_avatar_srcset(self, obj):
+        return get_srcset(
+            obj.derivatives, lambda name: build_file_url(name, self.context)
+        )
+
     def create(self, validated_data):
         password = validated_data.pop("password")
         user = CustomUser(**validated_data)
@@ -45,7 +58,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class BillSerializer(serializers.ModelSerializer):
+class BillSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Bill
         fields = [
@@ -75,7 +88,28 @@ class BillSerializer(serializers.ModelSerializer):
         return data
 
 
-class ApartmentImageSerializer(serializers.ModelSerializer):
+def build_file_url(name, context):
+    if not name:
+        return None
+    url = default_storage.url(name)
+    request = context.get("request", None)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class ImageSrcsetMixin:
+    def get_srcset(self, obj):
+        return get_srcset(
+            obj.derivatives, lambda name: build_file_url(name, self.context)
+        )
+
+
+class ApartmentImageSerializer(
+    SparseFieldsetMixin, ImageSrcsetMixin, serializers.ModelSerializer
+):
+    srcset = serializers.SerializerMethodField()
+
     def create(self, validated_data):
         apartment_id = self.context["apartment_id"]
         return ApartmentImage.objects.create(
@@ -84,10 +118,10 @@ class ApartmentImageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ApartmentImage
-        fields = ["id", "image", "apartment_id"]
+        fields = ["id", "image", "srcset", "apartment_id"]
 
 
-class ApartmentSerializer(serializers.ModelSerializer):
+class ApartmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source="owner.email")
     owner_id = serializers.ReadOnlyField(source="owner.id")
     rooms = serializers.SerializerMethodField()
@@ -98,6 +132,7 @@ class ApartmentSerializer(serializers.ModelSerializer):
         rooms_queryset = obj.rooms.all()
         context = self.context.copy()
         context["nested"] = True
+        context["fieldset"] = self.get_nested_fieldset("rooms")
         return RoomSerializer(rooms_queryset, many=True, context=context).data
 
     def get_bill_ids(self, obj):
@@ -116,6 +151,8 @@ class ApartmentSerializer(serializers.ModelSerializer):
             "building_number",
             "apartment_number",
             "floor",
+            "latitude",
+            "longitude",
             "description",
             "size",
             "balcony",
@@ -127,9 +164,13 @@ class ApartmentSerializer(serializers.ModelSerializer):
             "rooms",
             "images",
         ]
+        method_field_relations = {
+            "rooms": ("rooms", "RoomSerializer"),
+            "bill_ids": ("bills", None),
+        }
 
 
-class ContractSerializer(serializers.ModelSerializer):
+class ContractSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     room_id = serializers.IntegerField(source="room.id", read_only=True)
     apartment_id = serializers.PrimaryKeyRelatedField(
         source="room.apartment.id", read_only=True
@@ -150,17 +191,21 @@ class ContractSerializer(serializers.ModelSerializer):
         ]
 
 
-class RoomImageSerializer(serializers.ModelSerializer):
+class RoomImageSerializer(
+    SparseFieldsetMixin, ImageSrcsetMixin, serializers.ModelSerializer
+):
+    srcset = serializers.SerializerMethodField()
+
     def create(self, validated_data):
         room_id = self.context["room_id"]
         return RoomImage.objects.create(room_id=room_id, **validated_data)
 
     class Meta:
         model = RoomImage
-        fields = ["id", "image", "room_id"]
+        fields = ["id", "image", "srcset", "room_id"]
 
 
-class RoomSerializer(serializers.ModelSerializer):
+class RoomSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     images = RoomImageSerializer(many=True, read_only=True)
     apartment = serializers.PrimaryKeyRelatedField(
         queryset=Apartment.objects.all(), write_only=True
@@ -177,11 +222,6 @@ class RoomSerializer(serializers.ModelSerializer):
     apartment_number = serializers.ReadOnlyField(source="apartment.apartment_number")
     floor = serializers.ReadOnlyField(source="apartment.floor")
 
-    def to_representation(self, instance):
-        if self.context.get("nested"):
-            self.fields.pop("apartment", None)
-        return super().to_representation(instance)
-
     class Meta:
         model = Room
         fields = [
@@ -227,6 +267,71 @@ class RoomSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RoomListingSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """
+    Renders a `RoomListing` row in the same shape as `RoomSerializer` renders
+    the vacant room it was built from.
+    """
+
+    id = serializers.IntegerField(source="room_id", read_only=True)
+    images = serializers.SerializerMethodField()
+    contract = serializers.SerializerMethodField()
+    renter = serializers.SerializerMethodField()
+    apartment_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = RoomListing
+        fields = [
+            "id",
+            "description",
+            "size",
+            "price_per_month",
+            "window",
+            "images",
+            "contract",
+            "renter",
+            "apartment_id",
+            "city",
+            "street",
+            "building_number",
+            "apartment_number",
+            "floor",
+        ]
+
+    def get_file_url(self, name):
+        return build_file_url(name, self.context)
+
+    def get_images(self, obj):
+        return [
+            {
+                "id": image["id"],
+                "image": self.get_file_url(image["image"]),
+                "srcset": get_srcset(image.get("derivatives"), self.get_file_url),
+                "room_id": obj.room_id,
+            }
+            for image in obj.images
+        ]
+
+    def get_contract(self, obj):
+        if obj.contract is None:
+            return None
+        contract = obj.contract
+        return {
+            "id": contract["id"],
+            "room_id": obj.room_id,
+            "apartment_id": obj.apartment_id,
+            "start_date": contract["start_date"],
+            "end_date": contract["end_date"],
+            "deposit_amount": Decimal(contract["deposit_amount"]),
+            "rent_amount": Decimal(contract["rent_amount"]),
+            "file": self.get_file_url(contract["file"]),
+        }
+
+    def get_renter(self, obj):
+        # Listings only exist for vacant rooms.
+        return None
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -237,18 +342,19 @@ class ReviewSerializer(serializers.ModelSerializer):
         return Review.objects.create(product_id=product_id, **validated_data)
 
 
-class SimpleUserSerializer(serializers.ModelSerializer):
+class SimpleUserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ["id", "first_name", "last_name"]
 
 
-class InquirySerializer(serializers.ModelSerializer):
+class InquirySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     sender = SimpleUserSerializer(read_only=True)
     receiver = SimpleUserSerializer(read_only=True)
     apartment = ApartmentSerializer(read_only=True)
     status = serializers.ChoiceField(choices=Inquiry.InquiryStatus.choices)
     apartment_address = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Inquiry
@@ -263,13 +369,20 @@ class InquirySerializer(serializers.ModelSerializer):
             "created_at",
             "status",
             "image",
+            "image_srcset",
         ]
+        method_field_relations = {"apartment_address": ("apartment", None)}
 
     def get_apartment_address(self, obj):
         return obj.apartment.address
 
+    def get_image_srcset(self, obj):
+        return get_srcset(
+            obj.derivatives, lambda name: build_file_url(name, self.context)
+        )
+
 
-class InquiryReplySerializer(serializers.ModelSerializer):
+class InquiryReplySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     sender = SimpleUserSerializer(read_only=True)
     apartment = ApartmentSerializer(read_only=True)
     room = RoomSerializer(read_only=True)
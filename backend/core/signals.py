@@ -0,0 +1,187 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .feedcache import bump_feed_version, bump_version
+from .images import (
+    DERIVATIVE_FIELDS,
+    delete_derivatives,
+    get_image_field,
+    schedule_derivatives,
+)
+from .listings import LISTING_APARTMENT_FIELDS, sync_room_listings
+from .models import (
+    Apartment,
+    ApartmentImage,
+    Bill,
+    Contract,
+    CustomUser,
+    Inquiry,
+    InquiryReply,
+    Room,
+    RoomImage,
+)
+from .search import SEARCH_FIELDS, get_search_backend
+
+ROOM_SEARCH_FIELDS = {field.split("__", 1)[0] for field in SEARCH_FIELDS}
+APARTMENT_SEARCH_FIELDS = {
+    field.split("__", 1)[1] for field in SEARCH_FIELDS if field.startswith("apartment__")
+}
+
+
+@receiver(post_save, sender=Room)
+def sync_room(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    if raw:
+        return
+    sync_room_listings([instance.pk], using)
+    if update_fields is not None and not ROOM_SEARCH_FIELDS & set(update_fields):
+        return
+    get_search_backend(using).index_rooms([instance])
+
+
+@receiver(post_save, sender=Apartment)
+def sync_apartment_rooms(
+    sender, instance, created=False, raw=False, using=None, update_fields=None, **kwargs
+):
+    if raw or created:
+        return
+    changed = set(update_fields) if update_fields is not None else None
+    if changed is None or set(LISTING_APARTMENT_FIELDS) & changed:
+        sync_room_listings(instance.rooms.using(using).values_list("pk", flat=True), using)
+    if changed is None or APARTMENT_SEARCH_FIELDS & changed:
+        rooms = instance.rooms.using(using).select_related("apartment")
+        get_search_backend(using).index_rooms(rooms)
+
+
+@receiver(post_save, sender=RoomImage)
+@receiver(post_delete, sender=RoomImage)
+def sync_room_image_listing(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance.room_id is None:
+        return
+    sync_room_listings([instance.room_id], using)
+
+
+@receiver(post_save, sender=Contract)
+def sync_contract_listing(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    room_ids = Room.objects.using(using).filter(contract=instance).values_list(
+        "pk", flat=True
+    )
+    sync_room_listings(room_ids, using)
+
+
+# Deleting a contract or a renter nulls `Room.contract`/`Room.renter` with a
+# bulk UPDATE that sends no `post_save` for the room, so the affected rooms
+# are collected before the delete and re-synced after it.
+@receiver(pre_delete, sender=Contract)
+def collect_contract_rooms(sender, instance, using=None, **kwargs):
+    instance._listing_room_ids = list(
+        Room.objects.using(using).filter(contract=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(pre_delete, sender=CustomUser)
+def collect_rented_rooms(sender, instance, using=None, **kwargs):
+    instance._listing_room_ids = list(
+        Room.objects.using(using).filter(renter=instance).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Contract)
+@receiver(post_delete, sender=CustomUser)
+def sync_collected_rooms(sender, instance, using=None, **kwargs):
+    sync_room_listings(getattr(instance, "_listing_room_ids", []), using)
+
+
+# Feed responses embed rooms, their apartment (with its images, bill ids and
+# owner) and contracts, so a write to any of these invalidates the feed cache.
+FEED_MODELS = [Room, Apartment, RoomImage, Contract, ApartmentImage, Bill, CustomUser]
+
+
+def invalidate_feed(sender, raw=False, using=None, update_fields=None, **kwargs):
+    if raw:
+        return
+    if sender is CustomUser and update_fields is not None and set(update_fields) <= {
+        "last_login"
+    }:
+        return
+    transaction.on_commit(bump_feed_version, using=using)
+
+
+for model in FEED_MODELS:
+    post_save.connect(invalidate_feed, sender=model)
+    post_delete.connect(invalidate_feed, sender=model)
+
+
+# Inquiries are not part of the feed but have their own version, so that
+# conditional GETs notice deletions (see `core.conditional`).
+def invalidate_inquiries(sender, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: bump_version("inquiries"), using=using)
+
+
+for model in [Inquiry, InquiryReply]:
+    post_save.connect(invalidate_inquiries, sender=model)
+    post_delete.connect(invalidate_inquiries, sender=model)
+
+
+# Image derivatives follow their image: a new or replaced upload queues them
+# (see `core.images.schedule_derivatives`), and the files of the previous
+# image's derivatives are deleted once a replacement or removal commits.
+def reset_image_derivatives(
+    sender, instance, raw=False, using=None, update_fields=None, **kwargs
+):
+    field = get_image_field(sender)
+    if raw or (update_fields is not None and field not in update_fields):
+        return
+    name, derivatives = "", {}
+    if not instance._state.adding:
+        row = (
+            sender._default_manager.using(using)
+            .filter(pk=instance.pk)
+            .values_list(field, "derivatives")
+            .first()
+        )
+        name, derivatives = row or (name, derivatives)
+    image = getattr(instance, field)
+    if image._committed and (image.name or "") == (name or ""):
+        return
+    instance.derivatives = {}
+    instance._replaced_derivatives = derivatives
+
+
+def sync_image_derivatives(
+    sender, instance, raw=False, using=None, update_fields=None, **kwargs
+):
+    derivatives = instance.__dict__.pop("_replaced_derivatives", None)
+    if raw or derivatives is None:
+        return
+    if derivatives:
+        if update_fields is not None and "derivatives" not in update_fields:
+            sender._default_manager.using(using).filter(pk=instance.pk).update(
+                derivatives={}
+            )
+        storage = getattr(instance, get_image_field(sender)).storage
+        transaction.on_commit(
+            lambda: delete_derivatives(derivatives, storage), using=using
+        )
+    schedule_derivatives(instance)
+
+
+def delete_image_derivatives(sender, instance, using=None, **kwargs):
+    derivatives = instance.derivatives
+    if derivatives:
+        storage = getattr(instance, get_image_field(sender)).storage
+        transaction.on_commit(
+            lambda: delete_derivatives(derivatives, storage), using=using
+        )
+
+
+for label in DERIVATIVE_FIELDS:
+    model = apps.get_model(label)
+    pre_save.connect(reset_image_derivatives, sender=model)
+    post_save.connect(sync_image_derivatives, sender=model)
+    post_delete.connect(delete_image_derivatives, sender=model)
@@ -0,0 +1,82 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import router, transaction
+
+# A comma followed by exactly three digits groups thousands ("1,200"); any
+# other comma is a decimal separator ("18,5").
+SIZE_RE = re.compile(
+    r"(?P<grouped>\d{1,3}(?:,\d{3})+(?!\d)(?:\.\d+)?)|(?P<plain>\d+(?:[.,]\d+)?)"
+)
+FEET_RE = re.compile(r"\b(?:sq\.?\s*)?(?:ft|feet|foot|sqft)\b|ft²", re.IGNORECASE)
+
+SQUARE_METRES_PER_FOOT = Decimal("0.09290304")
+MAX_SIZE = Decimal("99999.99")
+
+
+def parse_size(text):
+    """
+    Return the square metres in a free-text size such as "18", "18.5 m²",
+    "18,5 sqm", "200 sq ft" or "1,200 sq ft", or None when there is no number
+    in it. Ranges ("18-20 m2") take their first number.
+    """
+    if not text:
+        return None
+    match = SIZE_RE.search(str(text))
+    if match is None:
+        return None
+    try:
+        if match["grouped"]:
+            size = Decimal(match["grouped"].replace(",", ""))
+        else:
+            size = Decimal(match["plain"].replace(",", "."))
+    except InvalidOperation:
+        return None
+    if FEET_RE.search(str(text)):
+        size *= SQUARE_METRES_PER_FOOT
+    size = size.quantize(Decimal("0.01"))
+    return size if size <= MAX_SIZE else None
+
+
+class ParsedSizeMixin:
+    """
+    Model mixin that keeps `size_sqm` in step with the free-text `size` on
+    every `save()`, including `save(update_fields=["size"])`. Bulk
+    `QuerySet.update(size=...)` bypasses it; `backfill_sizes` repairs that.
+    """
+
+    def save(self, *args, **kwargs):
+        self.size_sqm = parse_size(self.size)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "size" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "size_sqm"}
+        super().save(*args, **kwargs)
+
+
+def backfill_sizes(model, using=None, batch_size=500):
+    """
+    Recompute `size_sqm` for every row of `model`, `batch_size` rows per
+    transaction, walking the primary key so no batch holds more than its
+    rows. Returns the number of rows whose size changed.
+    """
+    using = using or router.db_for_write(model)
+    manager = model._base_manager.using(using)
+    changed = 0
+    last_pk = None
+    while True:
+        rows = manager.order_by("pk").only("pk", "size", "size_sqm")
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        batch = list(rows[:batch_size])
+        if not batch:
+            return changed
+        last_pk = batch[-1].pk
+        stale = []
+        for row in batch:
+            size = parse_size(row.size)
+            if row.size_sqm != size:
+                row.size_sqm = size
+                stale.append(row)
+        with transaction.atomic(using=using):
+            manager.bulk_update(stale, ["size_sqm"])
+        changed += len(stale)
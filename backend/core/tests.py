@@ -1,3 +1,1758 @@
-from django.test import TestCase
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from smtplib import SMTPException
+from unittest import mock, skipUnless
+from urllib.parse import quote, urlsplit
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse, QueryDict
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APITestCase
+from rest_framework.viewsets import ReadOnlyModelViewSet
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from login.authentication import CustomAuthentication
+from login.cache import user_cache
+from .checks import LOCMEM_BACKEND, check_feed_cache
+from .downloads import OffloadContractError, emulate_offload, if_range_matches
+from .fastlist import FastListSerializer, _compiled, get_compiled_serializer
+from .fieldsets import get_nested, parse_fieldset
+from .geo import KM_PER_DEGREE, haversine, radius_bbox, within_radius
+from .indexadvisor import advise, get_querysets
+from .listings import rebuild_room_listings, sync_room_listings
+from .feedcache import (
+    HIT,
+    MISS,
+    STALE,
+    feed_cache_key,
+    get_cache_stats,
+    get_feed_cache,
+    get_or_compute,
+)
+from .jobs import enqueue, execute_job, job, run_worker
+from .models import (
+    Apartment,
+    ApartmentImage,
+    Bill,
+    Contract,
+    CustomUser,
+    Inquiry,
+    Job,
+    OutgoingEmail,
+    Room,
+    RoomImage,
+    RoomListing,
+    RoomSearchDocument,
+)
+from .outbox import drain_outbox, enqueue_email
+from .pagination import FeedPagination
+from .prefetch import get_prefetch_plan
+from .querybudget import QueryBudget, QueryBudgetExceeded, QueryStats
+from .search import (
+    BaseSearchBackend,
+    MySQLSearchBackend,
+    PostgreSQLSearchBackend,
+    SQLiteSearchBackend,
+    get_search_backend,
+)
+from .serializers import (
+    ApartmentSerializer,
+    CustomUserSerializer,
+    InquirySerializer,
+    RoomListingSerializer,
+    RoomSerializer,
+)
+from .sizes import parse_size
+from .uploads import ImageUploadHandler, fit_image
+from .validators import MAX_FILE_SIZE_KB
+from .views import PublicRoomViewSet
+from searcher.serializers import SearcherRoomSerializer
+
+
+def create_users():
+    owner = CustomUser.objects.create_user(
+        "owner", "owner@example.com", "pw", user_type="owner"
+    )
+    renter = CustomUser.objects.create_user(
+        "renter",
+        "renter@example.com",
+        "pw",
+        user_type="renter",
+        avatar="avatars/r.jpg",
+    )
+    searcher = CustomUser.objects.create_user(
+        "searcher", "searcher@example.com", "pw", user_type="searcher"
+    )
+    return owner, renter, searcher
+
+
+def create_apartment(owner, **kwargs):
+    fields = {
+        "city": "Haifa",
+        "street": "Herzl",
+        "building_number": "1",
+        "apartment_number": "1",
+        "floor": 1,
+        "size": "80",
+    }
+    fields.update(kwargs)
+    return Apartment.objects.create(owner=owner, **fields)
+
+
+def create_contract(owner, **kwargs):
+    return Contract.objects.create(
+        owner=owner,
+        start_date=datetime.date(2023, 1, 1),
+        end_date=datetime.date(2024, 1, 1),
+        rent_amount=Decimal("1000"),
+        deposit_amount=Decimal("500"),
+        **kwargs,
+    )
+
+
+class FastListParityTests(TestCase):
+    """`FastListSerializer` renders what the serializer it stands in for does."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, cls.searcher = create_users()
+        apartment = create_apartment(cls.owner)
+        other = create_apartment(cls.owner, city="Tel Aviv", building_number="2")
+        # Vacant without a contract or images, vacant with a contract file and
+        # an image, and rented with a contract without a file.
+        Room.objects.create(apartment=apartment, price_per_month=1000, size="10 sqm")
+        room = Room.objects.create(
+            apartment=apartment,
+            price_per_month=1200,
+            size="12",
+            contract=create_contract(cls.owner, file="contracts/c.pdf"),
+        )
+        RoomImage.objects.create(room=room, image="room_images/1.jpg")
+        image = RoomImage.objects.create(room=room, image="room_images/2.jpg")
+        # As stored by `core.images.process_image`.
+        RoomImage.objects.filter(pk=image.pk).update(
+            derivatives={"webp": {"320": "derivatives/room_images/2_w320.webp"}}
+        )
+        sync_room_listings([room.pk])
+        Room.objects.create(
+            apartment=other,
+            price_per_month=900,
+            renter=cls.renter,
+            contract=create_contract(cls.owner),
+        )
+        Inquiry.objects.create(
+            apartment=apartment,
+            sender=cls.renter,
+            receiver=cls.owner,
+            type="defects",
+            message="Broken window",
+            image="inquiry/window.jpg",
+        )
+        # A sender who deleted their account and no image.
+        Inquiry.objects.create(
+            apartment=other, receiver=cls.owner, type="other", message="Hello"
+        )
+
+    def setUp(self):
+        request = RequestFactory().get("/")
+        self.context = {"request": request}
+
+    def assertParity(self, serializer_class, queryset, context=None):
+        context = context or self.context
+        instances = list(queryset)
+        expected = serializer_class(instances, many=True, context=context).data
+        actual = FastListSerializer(instances, serializer_class, context).data
+        # Byte for byte: key order and value types included.
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(actual), renderer.render(expected))
+        return actual
+
+    def test_rooms(self):
+        data = self.assertParity(RoomSerializer, Room.objects.order_by("pk"))
+        self.assertIsNone(data[0]["contract"])
+        self.assertIsNone(data[0]["renter"])
+        self.assertTrue(data[1]["contract"]["file"].endswith("/media/contracts/c.pdf"))
+        self.assertIsNone(data[2]["contract"]["file"])
+        self.assertTrue(data[2]["renter"]["avatar"].endswith("/media/avatars/r.jpg"))
+
+    def test_searcher_rooms(self):
+        self.assertParity(SearcherRoomSerializer, Room.objects.order_by("pk"))
+
+    def test_room_listings(self):
+        data = self.assertParity(
+            RoomListingSerializer, RoomListing.objects.order_by("room_id")
+        )
+        self.assertEqual(len(data), 2)
+        self.assertEqual(len(data[1]["images"]), 2)
+        self.assertIn("webp", data[1]["images"][1]["srcset"])
+
+    def test_inquiries(self):
+        data = self.assertParity(InquirySerializer, Inquiry.objects.order_by("pk"))
+        self.assertTrue(data[0]["image"].endswith("/media/inquiry/window.jpg"))
+        self.assertIsNone(data[1]["sender"])
+        self.assertIsNone(data[1]["image"])
+
+    def test_nested_fieldsets(self):
+        apartments = Apartment.objects.order_by("pk")
+        for fields in ["id,rooms.id,rooms.renter.username", "id,rooms", None]:
+            with self.subTest(fields=fields):
+                query = QueryDict(f"fields={fields}" if fields else "")
+                fieldset = parse_fieldset(query)
+                context = dict(self.context, fieldset=fieldset)
+                # The second pass reuses the compiled serializer.
+                for _ in range(2):
+                    data = self.assertParity(ApartmentSerializer, apartments, context)
+                if fields == "id,rooms.id,rooms.renter.username":
+                    self.assertEqual(list(data[0]["rooms"][0]), ["id", "renter"])
+                compiled = get_compiled_serializer(ApartmentSerializer, context)
+                for root, nested in compiled.roots:
+                    if nested and isinstance(root, RoomSerializer):
+                        self.assertEqual(
+                            root.context["fieldset"], get_nested(fieldset, "rooms")
+                        )
+
+    def test_request_is_not_kept(self):
+        rooms = list(Room.objects.all())
+        FastListSerializer(rooms, RoomSerializer, self.context).data
+        compiled = _compiled.serializers[(RoomSerializer, None)]
+        for root, _ in compiled.roots:
+            self.assertNotIn("request", root.context)
+
+    def test_unexpected_errors_propagate(self):
+        rooms = list(Room.objects.all())
+        broken = mock.PropertyMock(side_effect=ValueError("broken"))
+        with mock.patch.object(Room, "description", broken):
+            with self.assertRaises(ValueError):
+                FastListSerializer(rooms, RoomSerializer, self.context).data
+
+
+def seed_feed(owner, renter, apartments=4, rooms=3):
+    """Apartments with rooms, images, contracts, bills and inquiries."""
+    for a in range(apartments):
+        apartment = create_apartment(
+            owner,
+            city=["Haifa", "Tel Aviv"][a % 2],
+            building_number=str(a),
+            balcony=a % 2 == 0,
+            latitude=32.08 + a * 0.001,
+            longitude=34.78 + a * 0.001,
+        )
+        ApartmentImage.objects.create(
+            apartment=apartment, image=f"apartment_images/{a}.jpg"
+        )
+        Bill.objects.create(
+            apartment=apartment,
+            bill_type="gas",
+            amount=10,
+            date=datetime.date(2023, 1, 1),
+            created_by=owner,
+        )
+        for r in range(rooms):
+            room = Room.objects.create(
+                apartment=apartment,
+                price_per_month=1000 + r * 500,
+                size=f"{10 + r} sqm",
+                contract=create_contract(owner) if r % 2 else None,
+            )
+            RoomImage.objects.create(room=room, image=f"room_images/{a}_{r}.jpg")
+        for k in range(2):
+            Inquiry.objects.create(
+                apartment=apartment,
+                sender=renter,
+                receiver=owner,
+                type="other",
+                message=f"Message {k}",
+            )
+
+
+class CacheResetMixin:
+    def setUp(self):
+        super().setUp()
+        # Neither is rolled back with the test database.
+        user_cache.clear()
+        get_feed_cache().clear()
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+
+class TemporaryMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.media_root = os.path.realpath(media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class QueryBudgetTests(CacheResetMixin, APITestCase):
+    """The declared `query_budget`s hold on realistic data, cold and cached."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, cls.searcher = create_users()
+        seed_feed(cls.owner, cls.renter)
+
+    def get(self, url, **params):
+        for _ in range(2):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_feed(self):
+        room = RoomListing.objects.first()
+        self.get("/core/feed/")
+        self.get("/core/feed/", ordering="-size_sqm", balcony="true")
+        self.get("/core/feed/", search="Haifa", cursor="")
+        self.get("/core/feed/", ordering="size_sqm", cursor="")
+        self.get("/core/feed/", near="32.08,34.78", radius=5, ordering="distance")
+        self.get(f"/core/feed/{room.pk}/")
+
+    def test_feed_clusters_and_facets(self):
+        self.get("/core/feed/clusters/", bbox="34.7,32.0,34.9,32.2", zoom=12)
+        self.get("/core/feed/facets/")
+        self.get("/core/feed/facets/", balcony="true", price_per_month__lt=2000)
+        self.get("/core/feed/facets/", search="Tel Aviv")
+
+    def test_inquiries(self):
+        self.authenticate(self.renter)
+        inquiry = Inquiry.objects.first()
+        self.get("/core/inquiries/")
+        self.get(f"/core/inquiries/{inquiry.pk}/")
+
+    def test_owner_apartments(self):
+        self.authenticate(self.owner)
+        apartment = Apartment.objects.first()
+        includes = "rooms,rooms.contract,bills,images"
+        self.get("/owner/owner-apartments/")
+        self.get("/owner/owner-apartments/", include=includes)
+        self.get(f"/owner/owner-apartments/{apartment.pk}/")
+        self.get(f"/owner/owner-apartments/{apartment.pk}/", include=includes)
+
+    def test_cache_round_trips_are_counted_apart(self):
+        with QueryStats().record() as stats:
+            get_feed_cache().set("key", "value")
+            get_feed_cache().get("key")
+            with transaction.atomic():
+                Room.objects.count()
+        self.assertEqual(stats.count, 1)
+        self.assertGreaterEqual(stats.cache_count, 2)
+
+    @override_settings(QUERY_COUNT_HEADERS=True)
+    def test_cache_query_count_header(self):
+        self.client.handler.load_middleware()
+        response = self.get("/core/feed/")
+        self.assertEqual(response["X-Feed-Cache"], "hit")
+        self.assertGreater(int(response["X-DB-Cache-Query-Count"]), 0)
+        self.assertLessEqual(int(response["X-DB-Query-Count"]), 5)
+
+    def test_exceeded_budget_raises(self):
+        budget = {"list": QueryBudget(max_queries=0)}
+        with mock.patch.object(PublicRoomViewSet, "query_budget", budget):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get("/core/feed/")
+
+
+class ProtectedDownloadTests(TemporaryMediaMixin, CacheResetMixin, APITestCase):
+    """Bill and contract downloads, streamed, offloaded and emulated."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, cls.searcher = create_users()
+        cls.other_owner = CustomUser.objects.create_user(
+            "other-owner", "other-owner@example.com", "pw", user_type="owner"
+        )
+        cls.other_renter = CustomUser.objects.create_user(
+            "other-renter", "other-renter@example.com", "pw", user_type="renter"
+        )
+        apartment = create_apartment(cls.owner)
+        cls.bill = Bill.objects.create(
+            apartment=apartment,
+            bill_type="gas",
+            amount=10,
+            date=datetime.date(2023, 1, 1),
+            created_by=cls.owner,
+            file="bills/gas bill.txt",
+        )
+        cls.contract = create_contract(cls.owner, file="contracts/lease.pdf")
+        cls.room = Room.objects.create(
+            apartment=apartment,
+            price_per_month=1000,
+            renter=cls.renter,
+            contract=cls.contract,
+        )
+        other = create_apartment(cls.other_owner, building_number="9")
+        Room.objects.create(
+            apartment=other, price_per_month=1000, renter=cls.other_renter
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.files = {
+            "bills/gas bill.txt": b"gas: 10\n",
+            "contracts/lease.pdf": b"%PDF-1.4 lease\n",
+        }
+        for name, content in self.files.items():
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as fh:
+                fh.write(content)
+        self.urls = {
+            "owner bill": (
+                self.owner,
+                f"/owner/owner-apartments/{self.bill.apartment_id}"
+                f"/bills/{self.bill.pk}/download/",
+                "bills/gas bill.txt",
+            ),
+            "renter bill": (
+                self.renter,
+                f"/renter/my-bills/{self.bill.pk}/download/",
+                "bills/gas bill.txt",
+            ),
+            "owner contract": (
+                self.owner,
+                f"/owner/owner-contarcts/{self.contract.pk}/download/",
+                "contracts/lease.pdf",
+            ),
+            "renter contract": (
+                self.renter,
+                f"/renter/my-room/{self.room.pk}/contracts/"
+                f"{self.contract.pk}/download/",
+                "contracts/lease.pdf",
+            ),
+        }
+
+    def download(self, user, url):
+        self.authenticate(user)
+        return self.client.get(url)
+
+    def test_streamed(self):
+        for label, (user, url, name) in self.urls.items():
+            with self.subTest(label):
+                response = self.download(user, url)
+                self.assertEqual(response.status_code, 200)
+                content = b"".join(response.streaming_content)
+                self.assertEqual(content, self.files[name])
+                self.assertFalse(response.has_header("X-Accel-Redirect"))
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD="x-accel-redirect")
+    def test_x_accel_redirect(self):
+        for label, (user, url, name) in self.urls.items():
+            with self.subTest(label):
+                response = self.download(user, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response["X-Accel-Redirect"], "/protected-media/" + quote(name)
+                )
+                self.assertEqual(response.content, b"")
+                self.assertEqual(
+                    response["Content-Disposition"],
+                    f"attachment; filename={os.path.basename(name)}",
+                )
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD="x-sendfile")
+    def test_x_sendfile(self):
+        for label, (user, url, name) in self.urls.items():
+            with self.subTest(label):
+                response = self.download(user, url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response["X-Sendfile"], os.path.join(self.media_root, name)
+                )
+                self.assertEqual(response.content, b"")
+
+    def test_emulated(self):
+        for mode in ("x-accel-redirect", "x-sendfile"):
+            offload = override_settings(
+                PROTECTED_MEDIA_OFFLOAD=mode, PROTECTED_MEDIA_OFFLOAD_EMULATE=True
+            )
+            for label, (user, url, name) in self.urls.items():
+                with self.subTest(mode=mode, download=label), offload:
+                    # The middleware is set up on the first request.
+                    self.client.handler.load_middleware()
+                    response = self.download(user, url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(response.has_header("X-Accel-Redirect"))
+                    self.assertFalse(response.has_header("X-Sendfile"))
+                    self.assertEqual(
+                        b"".join(response.streaming_content), self.files[name]
+                    )
+                    self.assertEqual(
+                        response["Content-Disposition"],
+                        f"attachment; filename={os.path.basename(name)}",
+                    )
+                    self.assertTrue(response.has_header("ETag"))
+
+    @override_settings(
+        PROTECTED_MEDIA_OFFLOAD="x-accel-redirect",
+        PROTECTED_MEDIA_OFFLOAD_EMULATE=True,
+    )
+    def test_denied(self):
+        denied = {
+            "owner bill": self.other_owner,
+            "renter bill": self.other_renter,
+            "owner contract": self.other_owner,
+            "renter contract": self.other_renter,
+        }
+        for label, user in denied.items():
+            _, url, _ = self.urls[label]
+            with self.subTest(label):
+                response = self.download(user, url)
+                self.assertIn(response.status_code, (403, 404))
+                self.assertFalse(response.has_header("X-Accel-Redirect"))
+                self.assertNotIn(b"gas: 10", response.content)
+                self.assertNotIn(b"lease", response.content)
+
+    @override_settings(PROTECTED_MEDIA_OFFLOAD_EMULATE=True)
+    def test_emulation_checks_the_header_contract(self):
+        request = RequestFactory().get("/")
+        outside = HttpResponse()
+        outside["X-Accel-Redirect"] = "/elsewhere/bills/gas%20bill.txt"
+        escaping = HttpResponse()
+        escaping["X-Sendfile"] = os.path.join(self.media_root, "..", "etc")
+        relative = HttpResponse()
+        relative["X-Sendfile"] = "bills/gas bill.txt"
+        with_body = HttpResponse(b"body")
+        with_body["X-Accel-Redirect"] = "/protected-media/bills/gas%20bill.txt"
+        for response in (outside, escaping, relative, with_body):
+            with self.assertRaises(OffloadContractError):
+                emulate_offload(request, response)
+        plain = HttpResponse(b"plain")
+        self.assertIs(emulate_offload(request, plain), plain)
+
+    def test_if_range(self):
+        last_modified = 1_700_000_000
+        cases = {
+            None: True,
+            '"etag"': True,
+            '"other"': False,
+            http_date(last_modified): True,
+            http_date(last_modified + 60): False,
+            http_date(last_modified - 60): False,
+            "not a date": False,
+        }
+        for if_range, matches in cases.items():
+            with self.subTest(if_range=if_range):
+                headers = {"HTTP_IF_RANGE": if_range} if if_range else {}
+                request = RequestFactory().get("/", **headers)
+                self.assertIs(
+                    if_range_matches(request, '"etag"', last_modified), matches
+                )
+
+
+def image_file(width=800, height=600, image_format="PNG"):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(buffer, image_format)
+    return ContentFile(buffer.getvalue())
+
+
+@override_settings(
+    IMAGE_DERIVATIVE_WIDTHS=(320, 640),
+    IMAGE_DERIVATIVES_ASYNC=False,
+    IMAGE_DERIVATIVES_JOB_QUEUE=False,
+)
+class ImageDerivativeTests(TemporaryMediaMixin, TestCase):
+    """Derivatives are generated on upload and deleted with their image."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, cls.searcher = create_users()
+        cls.apartment = create_apartment(cls.owner)
+
+    def save(self, instance, field, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            if name is None:
+                setattr(instance, field, None)
+            else:
+                getattr(instance, field).save(name, image_file(), save=False)
+            instance.save()
+        instance.refresh_from_db()
+        return instance
+
+    def names(self, derivatives):
+        return [name for names in derivatives.values() for name in names.values()]
+
+    def assertStored(self, names, stored=True):
+        for name in names:
+            self.assertEqual(default_storage.exists(name), stored, name)
+
+    def test_avatar(self):
+        user = self.save(self.renter, "avatar", "first.png")
+        first = self.names(user.derivatives)
+        self.assertEqual(len(first), 4)
+        self.assertStored(first)
+        srcset = CustomUserSerializer(user).data["avatar_srcset"]
+        self.assertIn(" 320w, ", srcset["webp"])
+
+        user = self.save(user, "avatar", "second.png")
+        second = self.names(user.derivatives)
+        self.assertEqual(len(second), 4)
+        self.assertStored(first, stored=False)
+        self.assertStored(second)
+
+        user = self.save(user, "avatar", None)
+        self.assertEqual(user.derivatives, {})
+        self.assertStored(second, stored=False)
+
+    def test_unrelated_saves_keep_derivatives(self):
+        user = self.save(self.renter, "avatar", "first.png")
+        derivatives = user.derivatives
+        with mock.patch("core.signals.schedule_derivatives") as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                user.bio = "Hello"
+                user.save()
+                user.save(update_fields=["last_login"])
+        schedule.assert_not_called()
+        user.refresh_from_db()
+        self.assertEqual(user.derivatives, derivatives)
+        self.assertStored(self.names(derivatives))
+
+    def test_inquiry_image(self):
+        inquiry = Inquiry(
+            apartment=self.apartment,
+            sender=self.renter,
+            receiver=self.owner,
+            type="defects",
+            message="Leak",
+        )
+        inquiry = self.save(inquiry, "image", "leak.png")
+        names = self.names(inquiry.derivatives)
+        self.assertEqual(len(names), 4)
+        self.assertStored(names)
+        data = InquirySerializer(inquiry, context={"request": None}).data
+        self.assertIn("jpeg", data["image_srcset"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inquiry.delete()
+        self.assertStored(names, stored=False)
+
+    def test_room_image(self):
+        room = Room.objects.create(apartment=self.apartment, price_per_month=1000)
+        image = self.save(RoomImage(room=room), "image", "room.png")
+        names = self.names(image.derivatives)
+        self.assertEqual(len(names), 4)
+        listing = RoomListing.objects.get(room=room)
+        self.assertEqual(listing.images[0]["derivatives"], image.derivatives)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertStored(names, stored=False)
+
+
+@override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000 * 1000)
+class ImageUploadTests(TestCase):
+    """`ImageUploadHandler` and `fit_image` refuse images above the pixel ceiling."""
+
+    def upload(self, content, content_type="image/png"):
+        handler = ImageUploadHandler()
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file("image", "upload.png", content_type, len(content))
+        handler.receive_data_chunk(content, 0)
+        return handler.file_complete(len(content))
+
+    def temporary_upload(self, content):
+        file = TemporaryUploadedFile("upload.png", "image/png", len(content), None)
+        file.write(content)
+        file.flush()
+        self.addCleanup(file.close)
+        return file
+
+    def test_small_file_above_pixel_ceiling(self):
+        # A flat image compresses to a few KB whatever its dimensions.
+        content = image_file(1100, 1000).read()
+        self.assertLess(len(content), MAX_FILE_SIZE_KB * 1024)
+        with self.assertRaises(RequestDataTooBig):
+            self.upload(content)
+
+    def test_fit_image_refuses_before_decoding(self):
+        for image_format in ("PNG", "GIF", "JPEG"):
+            with self.subTest(image_format):
+                content = image_file(1100, 1000, image_format).read()
+                with mock.patch.object(Image.Image, "load") as load:
+                    with self.assertRaises(Image.DecompressionBombError):
+                        fit_image(self.temporary_upload(content), 1024)
+                load.assert_not_called()
+
+    def test_below_pixel_ceiling(self):
+        content = image_file(1000, 1000).read()
+        file = self.upload(content)
+        self.addCleanup(file.close)
+        self.assertEqual(file.read(), content)
+        fitted = fit_image(self.temporary_upload(content), 1024 * 1024)
+        self.addCleanup(fitted.close)
+        self.assertEqual(Image.open(fitted).size, (1000, 1000))
+
+    def test_not_an_image(self):
+        file = self.upload(b"not an image")
+        self.addCleanup(file.close)
+        self.assertEqual(file.read(), b"not an image")
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False, IMAGE_DERIVATIVES_JOB_QUEUE=False)
+class ImageUploadEndpointTests(TemporaryMediaMixin, CacheResetMixin, APITestCase):
+    """Only the photo and avatar endpoints re-encode uploaded images."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, _, cls.searcher = create_users()
+        cls.apartment = create_apartment(cls.owner)
+        cls.room = Room.objects.create(
+            apartment=cls.apartment, price_per_month=1000, size="10"
+        )
+
+    def noisy_png(self):
+        # Noise does not compress, so this is well above the size budget.
+        image = Image.frombytes("RGB", (600, 600), os.urandom(600 * 600 * 3))
+        buffer = BytesIO()
+        image.save(buffer, "PNG")
+        self.assertGreater(buffer.tell(), MAX_FILE_SIZE_KB * 1024)
+        buffer.seek(0)
+        buffer.name = "photo.png"
+        return buffer
+
+    def assertTranscoded(self, field):
+        self.assertTrue(field.name.endswith(".jpg"), field.name)
+        self.assertLessEqual(field.size, MAX_FILE_SIZE_KB * 1024)
+        with Image.open(field) as image:
+            self.assertEqual(image.format, "JPEG")
+
+    def test_photos_are_transcoded(self):
+        self.authenticate(self.owner)
+        urls = {
+            ApartmentImage: (
+                f"/owner/owner-apartments/{self.apartment.pk}/upload_image/"
+            ),
+            RoomImage: f"/owner/owner-rooms/{self.room.pk}/upload_image/",
+        }
+        for model, url in urls.items():
+            with self.subTest(model.__name__):
+                response = self.client.patch(
+                    url, {"image": self.noisy_png()}, format="multipart"
+                )
+                self.assertEqual(response.status_code, 201, response.content)
+                self.assertTranscoded(model.objects.get(pk=response.data["id"]).image)
+
+    def test_avatar_is_transcoded(self):
+        self.authenticate(self.searcher)
+        response = self.client.patch(
+            f"/core/me/{self.searcher.pk}/",
+            {"avatar": self.noisy_png()},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.searcher.refresh_from_db()
+        self.assertTranscoded(self.searcher.avatar)
+
+    def test_other_uploads_are_left_alone(self):
+        self.authenticate(self.searcher)
+        upload = self.noisy_png()
+        content = upload.getvalue()
+        response = self.client.post(
+            f"/searcher/searcher-search/{self.apartment.pk}/inquiries/",
+            {
+                "type": "questions",
+                "status": "open",
+                "message": "Is it quiet?",
+                "image": upload,
+            },
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        image = Inquiry.objects.get().image
+        self.assertTrue(image.name.endswith(".png"), image.name)
+        with image.open("rb"):
+            self.assertEqual(image.read(), content)
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+    EMAIL_OUTBOX_BACKOFF=60,
+)
+class OutboxTests(TestCase):
+    """Queued mail is delivered by `send_queued_email`, retried and given up on."""
+
+    def drain(self):
+        call_command("send_queued_email", stdout=StringIO())
+
+    def make_due(self):
+        OutgoingEmail.objects.filter(status=OutgoingEmail.Status.PENDING).update(
+            next_attempt_at=timezone.now()
+        )
+
+    def failing_for(self, recipient):
+        """A `send_messages` that fails for the messages to `recipient`."""
+        send_messages = EmailBackend.send_messages
+
+        def send(backend, messages):
+            if any(recipient in message.to for message in messages):
+                raise SMTPException("Recipient refused")
+            return send_messages(backend, messages)
+
+        return mock.patch.object(EmailBackend, "send_messages", send)
+
+    def test_sent(self):
+        for n in range(3):
+            enqueue_email(f"Subject {n}", "Body", None, [f"user{n}@example.com"])
+        self.assertEqual(len(mail.outbox), 0)
+        self.drain()
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [["user0@example.com"], ["user1@example.com"], ["user2@example.com"]],
+        )
+        self.assertEqual(mail.outbox[0].from_email, settings.DEFAULT_FROM_EMAIL)
+        for email in OutgoingEmail.objects.all():
+            self.assertEqual(email.status, OutgoingEmail.Status.SENT)
+            self.assertEqual(email.attempts, 1)
+            self.assertIsNotNone(email.sent_at)
+        self.drain()
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_rolled_back_mail_is_not_sent(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue_email("Subject", "Body", None, ["user@example.com"])
+            raise RuntimeError
+        self.drain()
+        self.assertEqual(mail.outbox, [])
+
+    def test_retried_after_backoff(self):
+        enqueue_email("Good", "Body", None, ["good@example.com"])
+        bad = enqueue_email("Bad", "Body", None, ["bad@example.com"])
+        with self.failing_for("bad@example.com"):
+            self.drain()
+        # One failure does not hold back the rest of the batch.
+        self.assertEqual([message.subject for message in mail.outbox], ["Good"])
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, OutgoingEmail.Status.PENDING)
+        self.assertEqual(bad.attempts, 1)
+        self.assertIn("Recipient refused", bad.last_error)
+        self.assertGreater(bad.next_attempt_at, timezone.now())
+
+        # Not due before the backoff ends.
+        self.drain()
+        self.assertEqual(len(mail.outbox), 1)
+
+        self.make_due()
+        self.drain()
+        self.assertEqual([message.subject for message in mail.outbox], ["Good", "Bad"])
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, OutgoingEmail.Status.SENT)
+        self.assertEqual(bad.attempts, 2)
+        self.assertEqual(bad.last_error, "")
+
+    def test_dead_after_max_attempts(self):
+        email = enqueue_email("Bad", "Body", None, ["bad@example.com"])
+        with self.failing_for("bad@example.com"):
+            for attempt in range(1, 3):
+                self.make_due()
+                self.drain()
+                email.refresh_from_db()
+                self.assertEqual(email.attempts, attempt)
+                self.assertEqual(email.status, OutgoingEmail.Status.PENDING)
+            self.make_due()
+            with self.assertLogs("core.outbox", "ERROR"):
+                self.drain()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.Status.DEAD)
+        self.make_due()
+        self.drain()
+        self.assertEqual(mail.outbox, [])
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 3)
+
+    def test_unreachable_server_fails_the_batch(self):
+        for n in range(2):
+            enqueue_email(f"Subject {n}", "Body", None, [f"user{n}@example.com"])
+        error = ConnectionRefusedError("Connection refused")
+        with mock.patch.object(EmailBackend, "open", side_effect=error, create=True):
+            sent, failed = drain_outbox()
+        self.assertEqual((sent, failed), (0, 2))
+        self.assertEqual(mail.outbox, [])
+        for email in OutgoingEmail.objects.all():
+            self.assertEqual(email.status, OutgoingEmail.Status.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertIn("ConnectionRefusedError", email.last_error)
+
+
+release_job = threading.Event()
+
+
+@job
+def blocking_job(seconds=10):
+    release_job.wait(seconds)
+
+
+@job
+def failing_job():
+    raise ValueError("Broken")
+
+
+@job
+def reclaiming_job(pk):
+    # As if another worker claimed the job again while it ran.
+    Job.objects.filter(pk=pk).update(attempts=F("attempts") + 1)
+
+
+@override_settings(JOB_TIMEOUT=0.5)
+class JobWorkerTests(TransactionTestCase):
+    """`run_worker` records outcomes and stops jobs at `JOB_TIMEOUT`."""
+
+    def setUp(self):
+        release_job.clear()
+        self.addCleanup(release_job.set)
+
+    def run_worker(self, pool="thread"):
+        return run_worker(concurrency=2, pool=pool, poll_interval=0.05, once=True)
+
+    def test_outcomes(self):
+        succeeded = enqueue(blocking_job, args=[0])
+        failed = enqueue(failing_job, max_attempts=2)
+        self.assertEqual(self.run_worker(), 2)
+        succeeded.refresh_from_db()
+        self.assertEqual(succeeded.status, Job.Status.SUCCEEDED)
+        self.assertIsNotNone(succeeded.duration_ms)
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, Job.Status.QUEUED)
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn("ValueError: Broken", failed.last_error)
+        self.assertGreater(failed.run_at, timezone.now())
+
+    def test_timed_out_thread_is_not_run_again(self):
+        item = enqueue(blocking_job)
+        start = time.monotonic()
+        with self.assertLogs("core.jobs", "ERROR"):
+            self.assertEqual(self.run_worker(), 1)
+        self.assertLess(time.monotonic() - start, 5)
+        item.refresh_from_db()
+        self.assertEqual(item.status, Job.Status.DEAD)
+        self.assertEqual(item.attempts, 1)
+        self.assertEqual(item.last_error, "Timed out after 0.5s")
+
+        # The abandoned thread's outcome arrives late and is dropped.
+        with self.assertLogs("core.jobs", "WARNING") as logs:
+            release_job.set()
+            deadline = time.monotonic() + 5
+            while not logs.records and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.assertIn("after it was given up on", logs.output[0])
+        item.refresh_from_db()
+        self.assertEqual(item.status, Job.Status.DEAD)
+
+    def test_timed_out_process_is_killed_and_retried(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Forked jobs cannot share an in-memory database.")
+        item = enqueue(blocking_job, args=[30])
+        start = time.monotonic()
+        self.assertEqual(self.run_worker(pool="process"), 1)
+        self.assertLess(time.monotonic() - start, 10)
+        item.refresh_from_db()
+        self.assertEqual(item.status, Job.Status.QUEUED)
+        self.assertEqual(item.attempts, 1)
+        self.assertEqual(item.last_error, "Timed out after 0.5s")
+        self.assertGreater(item.run_at, timezone.now())
+
+    def test_result_of_a_reclaimed_attempt_is_dropped(self):
+        item = enqueue(reclaiming_job, args=[0])
+        Job.objects.filter(pk=item.pk).update(
+            args=[item.pk], status=Job.Status.RUNNING, attempts=1
+        )
+        with self.assertLogs("core.jobs", "WARNING"):
+            execute_job(item.pk)
+        item.refresh_from_db()
+        self.assertEqual(item.status, Job.Status.RUNNING)
+        self.assertEqual(item.attempts, 2)
+
+
+class ContractCreateTests(CacheResetMixin, APITestCase):
+    def test_listing_follows_the_contract(self):
+        owner, _, _ = create_users()
+        room = Room.objects.create(
+            apartment=create_apartment(owner), price_per_month=1000, size="10"
+        )
+        self.authenticate(owner)
+        url = f"/owner/owner-apartments/{room.apartment_id}/room/{room.pk}/contracts/"
+        response = self.client.post(
+            url,
+            {
+                "start_date": "2024-01-01",
+                "end_date": "2025-01-01",
+                "deposit_amount": "500",
+                "rent_amount": "1000",
+            },
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        room.refresh_from_db()
+        self.assertEqual(room.contract_id, response.data["id"])
+        listing = RoomListing.objects.get(room=room)
+        self.assertEqual(listing.contract["id"], response.data["id"])
+
+
+class SparseFieldsetTests(CacheResetMixin, APITestCase):
+    """`?fields=`/`?omit=` on read requests, and the columns they load."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, _ = create_users()
+        cls.apartment = create_apartment(cls.owner, description="Sunny")
+        Room.objects.create(
+            apartment=cls.apartment, price_per_month=1000, renter=cls.renter
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate(self.owner)
+
+    def get(self, **params):
+        return self.client.get(f"/owner/owner-apartments/{self.apartment.pk}/", params)
+
+    def test_fields_and_omit(self):
+        response = self.get(fields="id,city")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data, {"id": self.apartment.pk, "city": "Haifa"})
+        response = self.get(omit="rooms,images,description")
+        self.assertNotIn("rooms", response.data)
+        self.assertNotIn("description", response.data)
+        self.assertIn("city", response.data)
+
+    def test_nested_fields(self):
+        response = self.get(fields="id,rooms.id,rooms.renter.username")
+        self.assertEqual(response.status_code, 200, response.content)
+        [room] = response.data["rooms"]
+        self.assertEqual(room, {"id": room["id"], "renter": {"username": "renter"}})
+        response = self.get(fields="rooms", omit="rooms.images,rooms.renter.bio")
+        [room] = response.data["rooms"]
+        self.assertNotIn("images", room)
+        self.assertIn("price_per_month", room)
+        self.assertNotIn("bio", room["renter"])
+
+    def test_unknown_fields_are_rejected(self):
+        for params, message in [
+            ({"fields": "id,nope"}, "Unknown field: nope"),
+            ({"omit": "rooms.nope"}, "Unknown field: nope"),
+            ({"fields": "city.name"}, "Field city has no nested fields."),
+            ({"fields": "rooms..id"}, "Invalid field path."),
+        ]:
+            with self.subTest(params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, str(response.data["fields"]))
+
+    def test_only_selected_columns_are_loaded(self):
+        fieldset = parse_fieldset(QueryDict("fields=id,city,rooms.price_per_month"))
+        plan = get_prefetch_plan(ApartmentSerializer, fieldset)
+        self.assertEqual(plan.only, ("id", "city"))
+        [(lookup, _, rooms_plan)] = plan.prefetch
+        self.assertEqual(lookup, "rooms")
+        # The foreign key is loaded to join the rooms back to their apartment.
+        self.assertEqual(rooms_plan.only, ("id", "price_per_month", "apartment"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(fields="id,city")
+        self.assertEqual(response.status_code, 200, response.content)
+        selects = " ".join(query["sql"] for query in queries)
+        self.assertIn('SELECT "core_apartment"."id", "core_apartment"."city" ', selects)
+        self.assertNotIn('"core_apartment"."description"', selects)
+
+
+class IndexAdvisorTests(TestCase):
+    """`index_advisor` against the routed viewsets and the model indexes."""
+
+    def test_access_path_indexes_are_used(self):
+        used = {
+            finding.index
+            for _, findings, _ in advise()
+            for finding in findings
+            if finding.status == "ok"
+        }
+        for index in [
+            "core_room_renter_price_idx",
+            "core_inquiry_sender_idx",
+            "core_bill_apartment_date_idx",
+        ]:
+            with self.subTest(index):
+                self.assertIn(index, used)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("index_advisor", "--all", stdout=out)
+        output = out.getvalue()
+        self.assertIn(
+            "ok: BillViewSet: Bill(apartment) order by date [get_queryset] "
+            "via core_bill_apartment_date_idx\n",
+            output,
+        )
+        self.assertRegex(output, r"\d+ uncovered access path\(s\)\.\n$")
+
+    def test_database_errors_ask_for_migrations(self):
+        class UnmigratedViewSet(ReadOnlyModelViewSet):
+            queryset = Room.objects.all()
+            permission_classes = []
+
+            def get_queryset(self):
+                raise OperationalError("no such table: core_room")
+
+        querysets, errors = get_querysets(UnmigratedViewSet)
+        self.assertEqual(querysets, [])
+        self.assertIn("needs a migrated database", errors[0])
+
+
+class BatchTests(CacheResetMixin, APITestCase):
+    """`POST /batch/` runs GET sub-requests as the batch's user."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, _ = create_users()
+        Room.objects.create(
+            apartment=create_apartment(cls.owner),
+            price_per_month=1000,
+            renter=cls.renter,
+        )
+
+    def batch(self, *paths, **item):
+        requests = [dict(item, path=path) for path in paths]
+        return self.client.post("/batch/", {"requests": requests}, format="json")
+
+    def test_responses_in_order(self):
+        self.authenticate(self.renter)
+        response = self.batch("/core/inquiries/", "/renter/my-bills/", "/nowhere/")
+        self.assertEqual(response.status_code, 200, response.content)
+        entries = response.data["responses"]
+        self.assertEqual(
+            [(entry["path"], entry["status"]) for entry in entries],
+            [("/core/inquiries/", 200), ("/renter/my-bills/", 200), ("/nowhere/", 404)],
+        )
+        self.assertEqual(entries[0]["body"]["count"], 0)
+
+    def test_get_only(self):
+        self.authenticate(self.renter)
+        response = self.batch("/core/inquiries/", method="POST")
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_size_cap(self):
+        self.authenticate(self.renter)
+        self.assertEqual(self.batch(*["/core/inquiries/"] * 2).status_code, 200)
+        self.assertEqual(self.batch(*["/core/inquiries/"] * 3).status_code, 400)
+        self.assertEqual(self.batch().status_code, 400)
+
+    def test_nested_batches_are_refused(self):
+        self.authenticate(self.renter)
+        response = self.batch("/batch/", "/core/inquiries/")
+        statuses = [entry["status"] for entry in response.data["responses"]]
+        self.assertEqual(statuses, [403, 200])
+
+    def test_failures_stay_in_their_entry(self):
+        self.authenticate(self.renter)
+        with mock.patch.object(
+            PublicRoomViewSet, "list", side_effect=RuntimeError("boom")
+        ), self.assertLogs("core.batch", "ERROR"):
+            response = self.batch("/core/feed/", "/core/inquiries/")
+        self.assertEqual(response.status_code, 200)
+        entries = response.data["responses"]
+        self.assertEqual([entry["status"] for entry in entries], [500, 200])
+        self.assertIsNone(entries[0]["body"])
+
+    def test_unauthenticated_items(self):
+        response = self.batch("/core/inquiries/", "/core/feed/")
+        statuses = [entry["status"] for entry in response.data["responses"]]
+        self.assertEqual(statuses, [401, 200])
+
+    @override_settings(QUERY_COUNT_HEADERS=True)
+    def test_sub_requests_reuse_the_batch_token(self):
+        self.client.handler.load_middleware()
+        self.authenticate(self.renter)
+        decode = CustomAuthentication.get_validated_token
+        with mock.patch.object(
+            CustomAuthentication, "get_validated_token", autospec=True
+        ) as get_validated_token:
+            get_validated_token.side_effect = decode
+            response = self.batch(
+                "/core/inquiries/", "/renter/my-bills/", "/renter/me/"
+            )
+        statuses = [entry["status"] for entry in response.data["responses"]]
+        self.assertEqual(statuses, [200, 200, 200])
+        self.assertEqual(get_validated_token.call_count, 1)
+        self.assertEqual(response["X-Auth-Token-Decodes"], "1")
+        self.assertLessEqual(int(response["X-Auth-User-Lookups"]), 1)
+
+
+class FeedCacheCheckTests(TestCase):
+    def errors(self):
+        return [message.id for message in check_feed_cache(None)]
+
+    def test_shared_cache(self):
+        self.assertEqual(self.errors(), [])
+
+    def test_locmem_cache(self):
+        locmem = {"default": {"BACKEND": LOCMEM_BACKEND}}
+        with self.settings(CACHES=locmem, DEBUG=False):
+            self.assertEqual(self.errors(), ["core.E001"])
+        with self.settings(CACHES=locmem, DEBUG=True):
+            self.assertEqual(self.errors(), ["core.W001"])
+        with self.settings(FEED_CACHE_ALIAS="feed"):
+            self.assertEqual(self.errors(), ["core.E002"])
+
+
+class GetOrComputeTests(CacheResetMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = get_feed_cache()
+        self.calls = 0
+
+    def compute(self, value="fresh"):
+        def compute():
+            self.calls += 1
+            return value
+
+        return compute
+
+    def test_miss_then_hit(self):
+        result = get_or_compute(self.cache, "k", 1, self.compute())
+        self.assertEqual(result, ("fresh", MISS))
+        result = get_or_compute(self.cache, "k", 1, self.compute())
+        self.assertEqual(result, ("fresh", HIT))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(get_cache_stats(self.cache), {HIT: 1, MISS: 1, STALE: 0})
+
+    def test_stale_while_locked(self):
+        self.cache.set("k", (1, "old"))
+        self.cache.add("k:lock", 2)
+        result = get_or_compute(self.cache, "k", 2, self.compute())
+        self.assertEqual(result, ("old", STALE))
+        self.assertEqual(self.calls, 0)
+
+    def test_entry_stored_before_the_lock_is_won(self):
+        add = self.cache.add
+
+        def add_after_other_caller(key, *args, **kwargs):
+            # Another caller stores the entry and releases the lock between
+            # this caller's read and its lock.
+            self.cache.set("k", (1, "other"))
+            return add(key, *args, **kwargs)
+
+        with mock.patch.object(self.cache, "add", add_after_other_caller):
+            result = get_or_compute(self.cache, "k", 1, self.compute())
+        self.assertEqual(result, ("other", HIT))
+        self.assertEqual(self.calls, 0)
+        self.assertIsNone(self.cache.get("k:lock"))
+
+    def test_uncacheable_result_releases_waiters(self):
+        self.assertEqual(
+            get_or_compute(self.cache, "k", 1, self.compute(None)), (None, MISS)
+        )
+        self.assertIsNone(self.cache.get("k"))
+        # A waiter behind a lock holder whose result was not cached computes
+        # its own right away instead of waiting for the lock timeout.
+        self.cache.add("k:lock", 1)
+        start = time.monotonic()
+        result = get_or_compute(self.cache, "k", 1, self.compute(None), lock_timeout=5)
+        self.assertEqual(result, (None, MISS))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(self.calls, 2)
+        # The waiter leaves the holder's lock alone.
+        self.assertEqual(self.cache.get("k:lock"), 1)
+
+
+class KeysetPaginationTests(CacheResetMixin, APITestCase):
+    """`?cursor=` pages walk every row once, NULL ordering values included."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner, _, _ = create_users()
+        apartment = create_apartment(owner)
+        for n, size in enumerate(["12", "", "10", "big", "12", "", "30"]):
+            Room.objects.create(
+                apartment=apartment, price_per_month=1000 + n, size=size
+            )
+        cls.rooms = set(RoomListing.objects.values_list("room_id", flat=True))
+
+    def walk(self, url, link="next"):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            page = [row["id"] for row in response.data["results"]]
+            ids.extend(page if link == "next" else reversed(page))
+            url = response.data[link]
+        return ids
+
+    def test_nullable_ordering(self):
+        self.assertEqual(RoomListing.objects.filter(size_sqm=None).count(), 3)
+        with mock.patch.object(FeedPagination, "page_size", 2):
+            for ordering in ["size_sqm", "-size_sqm", "size_sqm,-price_per_month"]:
+                with self.subTest(ordering=ordering):
+                    ids = self.walk(f"/core/feed/?cursor=&ordering={ordering}")
+                    self.assertEqual(len(ids), len(self.rooms))
+                    self.assertEqual(set(ids), self.rooms)
+                    sizes = [
+                        RoomListing.objects.get(room_id=pk).size_sqm for pk in ids
+                    ]
+                    # NULLs sort after every size.
+                    descending = ordering.startswith("-")
+                    present = sorted(
+                        (size for size in sizes if size is not None),
+                        reverse=descending,
+                    )
+                    nulls = [None] * (len(sizes) - len(present))
+                    expected = nulls + present if descending else present + nulls
+                    self.assertEqual(sizes, expected)
+
+    def test_previous_links_walk_back(self):
+        with mock.patch.object(FeedPagination, "page_size", 2):
+            forward = self.walk("/core/feed/?cursor=&ordering=size_sqm")
+            response = self.client.get("/core/feed/?cursor=&ordering=size_sqm")
+            while response.data["next"]:
+                response = self.client.get(response.data["next"])
+            last_page = [row["id"] for row in response.data["results"]]
+            backward = self.walk(response.data["previous"], link="previous")
+        self.assertEqual(list(reversed(backward)) + last_page, forward)
+
+    def test_previous_link_of_an_empty_page_stays_in_keyset_mode(self):
+        with mock.patch.object(FeedPagination, "page_size", 2):
+            response = self.client.get("/core/feed/?cursor=&ordering=size_sqm")
+            RoomListing.objects.all().delete()
+            response = self.client.get(response.data["next"])
+            self.assertEqual(response.data["results"], [])
+            previous = response.data["previous"]
+            self.assertEqual(QueryDict(urlsplit(previous).query)["cursor"], "")
+            response = self.client.get(previous)
+        self.assertNotIn("count", response.data)
+
+
+class ParseSizeTests(SimpleTestCase):
+    def test_sizes(self):
+        cases = {
+            "18": "18.00",
+            "18.5 m²": "18.50",
+            "18,5 sqm": "18.50",
+            "18-20 m2": "18.00",
+            "about 25 square metres": "25.00",
+            "200 sq ft": "18.58",
+            "1,200 sq ft": "111.48",
+            "1,200.5 sqft": "111.53",
+            "1,200": "1200.00",
+            "12,5000": "12.50",
+            "1234,5": "1234.50",
+        }
+        for text, size in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_size(text), Decimal(size))
+
+    def test_no_size(self):
+        for text in [None, "", "big", "100,000,000"]:
+            with self.subTest(text=text):
+                self.assertIsNone(parse_size(text))
+
+
+class ClusterSearchTests(CacheResetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner, renter, _ = create_users()
+        seed_feed(owner, renter)
+
+    def count(self, **params):
+        response = self.client.get(
+            "/core/feed/clusters/", dict(bbox="34.7,32.0,34.9,32.2", zoom=12, **params)
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return sum(cluster["count"] for cluster in response.data["clusters"])
+
+    def test_search_narrows_clusters(self):
+        haifa = RoomListing.objects.filter(city="Haifa").count()
+        self.assertEqual(self.count(), RoomListing.objects.count())
+        self.assertEqual(self.count(search="Haifa"), haifa)
+        self.assertLess(haifa, RoomListing.objects.count())
+        self.assertEqual(self.count(search="Nowhere"), 0)
+
+
+class RoomSearchTests(CacheResetMixin, APITestCase):
+    """The room search index, its backends and `?search=` on the feed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner, _, _ = create_users()
+        cls.haifa = Room.objects.create(
+            apartment=create_apartment(owner), price_per_month=1000, size="12"
+        )
+        cls.tel_aviv = Room.objects.create(
+            apartment=create_apartment(
+                owner, city="Tel Aviv", street="Dizengoff", building_number="50"
+            ),
+            price_per_month=1000,
+            size="14",
+        )
+
+    def search(self, query, backend=None):
+        backend = backend or get_search_backend()
+        return set(backend.search(Room.objects.all(), query))
+
+    def test_documents_follow_saves(self):
+        self.assertEqual(self.haifa.search_document.document, "haifa herzl 1 1 1 12")
+        apartment = self.haifa.apartment
+        apartment.city = "Akko"
+        apartment.save(update_fields=["city"])
+        self.haifa.search_document.refresh_from_db()
+        self.assertEqual(self.haifa.search_document.document, "akko herzl 1 1 1 12")
+        self.haifa.size = "20"
+        self.haifa.save()
+        self.haifa.search_document.refresh_from_db()
+        self.assertEqual(self.haifa.search_document.document, "akko herzl 1 1 1 20")
+        self.haifa.delete()
+        self.assertFalse(RoomSearchDocument.objects.filter(room_id=self.haifa.pk))
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite FTS5 index")
+    def test_sqlite_matches_token_prefixes(self):
+        self.assertIsInstance(get_search_backend(), SQLiteSearchBackend)
+        self.assertEqual(self.search("hai"), {self.haifa})
+        self.assertEqual(self.search("TEL aviv"), {self.tel_aviv})
+        self.assertEqual(self.search("haifa dizengoff"), set())
+        # Tokens match from their start only, unlike the old `icontains`.
+        self.assertEqual(self.search("aifa"), set())
+        # Quotes and FTS5 operators are plain text.
+        self.assertEqual(self.search('"haifa" OR NEAR(tel'), set())
+        self.assertEqual(self.search("!?"), {self.haifa, self.tel_aviv})
+
+    def test_fallback_matches_substrings(self):
+        backend = BaseSearchBackend("default")
+        self.assertEqual(self.search("aifa", backend), {self.haifa})
+        self.assertEqual(self.search("dizen 50", backend), {self.tel_aviv})
+        self.assertEqual(self.search("haifa dizengoff", backend), set())
+
+    @override_settings(ROOM_SEARCH_BACKEND="core.search.BaseSearchBackend")
+    def test_backend_setting(self):
+        self.assertIs(type(get_search_backend()), BaseSearchBackend)
+
+    def test_mysql_short_tokens_use_like(self):
+        sql, params = MySQLSearchBackend("default").match_sql(["tel", "aviv", "50"])
+        self.assertIn("MATCH(document) AGAINST (%s IN BOOLEAN MODE)", sql)
+        self.assertEqual(sql.count("document LIKE %s"), 1)
+        self.assertEqual(params, ["+tel* +aviv*", "%50%"])
+
+    def test_postgresql_prefix_query(self):
+        _, params = PostgreSQLSearchBackend("default").match_sql(["tel", "aviv"])
+        self.assertEqual(params, ["tel:* & aviv:*"])
+
+    def test_feed_search(self):
+        response = self.client.get("/core/feed/", {"search": "Dizengoff"})
+        self.assertEqual(response.status_code, 200, response.content)
+        ids = [row["id"] for row in response.data["results"]]
+        self.assertEqual(ids, [self.tel_aviv.pk])
+
+
+class GeoFilterTests(CacheResetMixin, APITestCase):
+    """`?near=`, `?radius=`, `?bbox=` and distance ordering on the feed."""
+
+    POINTS = {
+        "center": (32.08, 34.78),
+        "north": (32.098, 34.78),  # 2 km
+        "east": (32.08, 34.886),  # 10 km
+        "jerusalem": (31.77, 35.21),  # 54 km
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        owner, _, _ = create_users()
+        cls.rooms = {}
+        for n, (name, (latitude, longitude)) in enumerate(cls.POINTS.items()):
+            apartment = create_apartment(
+                owner, building_number=str(n), latitude=latitude, longitude=longitude
+            )
+            cls.rooms[name] = Room.objects.create(
+                apartment=apartment, price_per_month=1000 + n, size="10"
+            ).pk
+
+    def feed(self, **params):
+        response = self.client.get("/core/feed/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        names = {pk: name for name, pk in self.rooms.items()}
+        return [names[row["id"]] for row in response.data["results"]]
+
+    def test_near(self):
+        self.assertEqual(self.feed(near="32.08,34.78"), ["center", "north"])
+        self.assertEqual(
+            self.feed(near="32.08,34.78", radius=12), ["center", "north", "east"]
+        )
+        self.assertEqual(
+            self.feed(near="32.09,34.886", radius=100),
+            ["east", "north", "center", "jerusalem"],
+        )
+        self.assertEqual(
+            self.feed(near="32.08,34.78", radius=12, ordering="-distance"),
+            ["east", "north", "center"],
+        )
+
+    def test_distance_ordering_needs_near(self):
+        self.assertEqual(
+            self.feed(ordering="distance"), ["center", "north", "east", "jerusalem"]
+        )
+
+    def test_bbox(self):
+        self.assertEqual(
+            self.feed(bbox="34.7,32.0,34.8,32.1", ordering="price_per_month"),
+            ["center", "north"],
+        )
+        self.assertEqual(self.feed(bbox="35,31,35.5,32"), ["jerusalem"])
+
+    def test_invalid_parameters(self):
+        for params in [{"near": "32.08"}, {"near": "91,0"}, {"bbox": "1,2,3"}]:
+            with self.subTest(params):
+                response = self.client.get("/core/feed/", params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_within_radius_matches_haversine(self):
+        apartments = Apartment.objects.all()
+        for latitude, longitude, radius in [
+            (32.08, 34.78, 2.1),
+            (32.08, 34.78, 1.9),
+            (32.0, 35.0, 30),
+            (31.9, 35.0, 60),
+        ]:
+            with self.subTest(near=(latitude, longitude), radius=radius):
+                expected = {
+                    apartment.pk
+                    for apartment in apartments
+                    if haversine(
+                        latitude, longitude, apartment.latitude, apartment.longitude
+                    )
+                    <= radius
+                }
+                found = within_radius(apartments, latitude, longitude, radius)
+                with self.assertNumQueries(1):
+                    self.assertEqual({a.pk for a in found}, expected)
+
+    def test_radius_bbox(self):
+        west, south, east, north = radius_bbox(32.08, 34.78, 10)
+        self.assertAlmostEqual(north - 32.08, 10 / KM_PER_DEGREE)
+        self.assertAlmostEqual(32.08 - south, 10 / KM_PER_DEGREE)
+        # Wider than tall at this latitude, and symmetric.
+        self.assertGreater(east - 34.78, north - 32.08)
+        self.assertAlmostEqual(east - 34.78, 34.78 - west)
+        # Across the antimeridian west is past east, and near a pole the
+        # box spans every longitude.
+        west, _, east, _ = radius_bbox(0, 179.99, 10)
+        self.assertGreater(west, east)
+        self.assertEqual(radius_bbox(89.99, 0, 10)[::2], (-180.0, 180.0))
+
+
+class FacetTests(CacheResetMixin, APITestCase):
+    """`/core/feed/facets/` counts, each without its own dimension's filter."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner, _, _ = create_users()
+        apartments = [
+            ({"balcony": True, "ac": True}, [500, 1500]),
+            ({"ac": True}, [2500]),
+            ({"city": "Akko"}, [800, 4000, 6000]),
+        ]
+        for n, (fields, prices) in enumerate(apartments):
+            apartment = create_apartment(owner, building_number=str(n), **fields)
+            for price in prices:
+                Room.objects.create(apartment=apartment, price_per_month=price)
+
+    def facets(self, **params):
+        response = self.client.get("/core/feed/facets/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.data
+        facets = {
+            name: (counts["true"], counts["false"])
+            for name, counts in data["facets"].items()
+        }
+        return data["count"], facets, [bucket["count"] for bucket in data["price"]]
+
+    def test_counts(self):
+        count, facets, prices = self.facets()
+        self.assertEqual(count, 6)
+        self.assertEqual(facets["balcony"], (2, 4))
+        self.assertEqual(facets["ac"], (3, 3))
+        self.assertEqual(facets["bbq_allowed"], (0, 6))
+        self.assertEqual(prices, [2, 1, 1, 1, 1])
+
+    def test_buckets(self):
+        response = self.client.get("/core/feed/facets/")
+        buckets = [(bucket["min"], bucket["max"]) for bucket in response.data["price"]]
+        self.assertEqual(
+            buckets, [(0, 1000), (1000, 2000), (2000, 3000), (3000, 5000), (5000, None)]
+        )
+
+    def test_each_facet_ignores_its_own_filter(self):
+        count, facets, prices = self.facets(balcony="true")
+        self.assertEqual(count, 2)
+        self.assertEqual(facets["balcony"], (2, 4))
+        self.assertEqual(facets["ac"], (2, 0))
+        self.assertEqual(prices, [1, 1, 0, 0, 0])
+
+        count, facets, prices = self.facets(ac="true", price_per_month__lt=2000)
+        self.assertEqual(count, 2)
+        self.assertEqual(facets["balcony"], (2, 0))
+        self.assertEqual(facets["ac"], (2, 1))
+        self.assertEqual(prices, [1, 1, 1, 0, 0])
+
+    def test_other_filters_narrow_every_count(self):
+        count, facets, prices = self.facets(search="Akko", balcony="false")
+        self.assertEqual(count, 3)
+        self.assertEqual(facets["balcony"], (0, 3))
+        self.assertEqual(facets["ac"], (0, 3))
+        self.assertEqual(prices, [1, 0, 0, 1, 1])
+
+
+class RoomListingSyncTests(CacheResetMixin, TestCase):
+    """`RoomListing` rows follow the writes to the rows they are built from."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, _ = create_users()
+        cls.apartment = create_apartment(cls.owner)
+        cls.room = Room.objects.create(
+            apartment=cls.apartment, price_per_month=1000, size="10"
+        )
+
+    def listing(self):
+        return RoomListing.objects.filter(room=self.room).first()
+
+    def test_room(self):
+        self.assertEqual(self.listing().price_per_month, 1000)
+        self.room.price_per_month = 1200
+        self.room.save()
+        self.assertEqual(self.listing().price_per_month, 1200)
+        self.room.renter = self.renter
+        self.room.save()
+        self.assertIsNone(self.listing())
+        self.room.renter = None
+        self.room.save()
+        self.assertIsNotNone(self.listing())
+        self.room.delete()
+        self.assertFalse(RoomListing.objects.exists())
+
+    def test_deleted_renter_frees_the_room(self):
+        self.room.renter = self.renter
+        self.room.save()
+        self.renter.delete()
+        self.assertIsNotNone(self.listing())
+
+    def test_apartment(self):
+        self.apartment.city = "Akko"
+        self.apartment.balcony = True
+        self.apartment.save()
+        listing = self.listing()
+        self.assertEqual((listing.city, listing.balcony), ("Akko", True))
+
+    def test_images(self):
+        image = RoomImage.objects.create(room=self.room, image="room_images/a.jpg")
+        self.assertEqual(
+            [entry["image"] for entry in self.listing().images], ["room_images/a.jpg"]
+        )
+        image.delete()
+        self.assertEqual(self.listing().images, [])
+
+    def test_contract(self):
+        contract = create_contract(self.owner)
+        self.room.contract = contract
+        self.room.save(update_fields=["contract"])
+        self.assertEqual(self.listing().contract["id"], contract.pk)
+        contract.rent_amount = Decimal("1100")
+        contract.save()
+        self.assertEqual(self.listing().contract["rent_amount"], "1100.00")
+        contract.delete()
+        self.assertIsNone(self.listing().contract)
+
+    def test_rebuild_matches_sync(self):
+        seed_feed(self.owner, self.renter)
+        Room.objects.filter(pk=self.room.pk).update(renter=self.renter)
+        room_ids = list(Room.objects.values_list("pk", flat=True))
+        sync_room_listings(room_ids)
+        synced = list(RoomListing.objects.order_by("room_id").values())
+        RoomListing.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            count = rebuild_room_listings(batch_size=5)
+        self.assertEqual(count, len(synced))
+        self.assertEqual(list(RoomListing.objects.order_by("room_id").values()), synced)
+        self.assertNotIn(self.room.pk, [row["room_id"] for row in synced])
+
+
+class ConditionalGetTests(CacheResetMixin, APITestCase):
+    """`ETag`/`Last-Modified` on the feed and the 304s they allow."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, cls.renter, _ = create_users()
+        seed_feed(cls.owner, cls.renter, apartments=2, rooms=2)
+
+    def test_not_modified(self):
+        response = self.client.get("/core/feed/")
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response = self.client.get("/core/feed/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+        response = self.client.get("/core/feed/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_runs_one_query(self):
+        etag = self.client.get("/core/feed/")["ETag"]
+        with QueryStats().record() as stats:
+            response = self.client.get("/core/feed/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(stats.count, 1)
+        self.assertIn("COUNT(", stats.queries[0][0])
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get("/core/feed/")["ETag"]
+        room = Room.objects.filter(renter=None).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            room.price_per_month = 4321
+            room.save()
+        response = self.client.get("/core/feed/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        prices = [row["price_per_month"] for row in response.data["results"]]
+        self.assertIn(4321, prices)
+
+    def test_stale_body_has_no_validators(self):
+        self.client.get("/core/feed/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.filter(renter=None).first().save()
+        # Another request is recomputing the entry.
+        request = Request(RequestFactory().get("/core/feed/"))
+        key = feed_cache_key(request, "PublicRoomViewSet")
+        get_feed_cache().add(f"{key}:lock", 0)
+
+        response = self.client.get("/core/feed/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Feed-Cache"], STALE)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
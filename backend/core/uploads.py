@@ -0,0 +1,168 @@
+import logging
+import os
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import (
+    StopFutureHandlers,
+    TemporaryFileUploadHandler,
+)
+from PIL import Image, ImageOps
+
+from .validators import MAX_FILE_SIZE_KB
+
+logger = logging.getLogger(__name__)
+
+# Encoder settings tried in order, largest first, before the image is shrunk.
+QUALITY_STEPS = (85, 75, 65, 55)
+SHRINK_FACTOR = 0.75
+MIN_DIMENSION = 320
+
+
+def get_ceiling():
+    return getattr(settings, "IMAGE_UPLOAD_MAX_SIZE", 20 * 1024 * 1024)
+
+
+def get_max_pixels():
+    return getattr(settings, "IMAGE_UPLOAD_MAX_PIXELS", 40 * 1000 * 1000)
+
+
+def check_pixels(image):
+    """
+    Raise `Image.DecompressionBombError` when the opened, not yet decoded
+    `image` has more than `IMAGE_UPLOAD_MAX_PIXELS` pixels. A small file can
+    describe a huge image, and `draft()` only bounds the decoding of JPEGs,
+    so every format is checked from its header before it is decoded.
+    """
+    width, height = image.size
+    if width * height > get_max_pixels():
+        raise Image.DecompressionBombError(
+            f"Image of {width}x{height} pixels is above IMAGE_UPLOAD_MAX_PIXELS."
+        )
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploaded images to a temporary file and, when they are above the
+    `validate_file_size` budget, downscales and re-encodes them to fit it.
+    Uploads above `IMAGE_UPLOAD_MAX_SIZE` are rejected as soon as the limit
+    is crossed, and images above `IMAGE_UPLOAD_MAX_PIXELS` once received.
+    Other files fall through to the next handlers.
+    """
+
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        self.active = (content_type or "").startswith("image/")
+        if not self.active:
+            return
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if start + len(raw_data) > get_ceiling():
+            self.upload_interrupted()
+            raise RequestDataTooBig(
+                f"Uploads cannot be larger than {get_ceiling() // 1024}KB."
+            )
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        file = super().file_complete(file_size)
+        try:
+            with Image.open(file.temporary_file_path()) as image:
+                check_pixels(image)
+            if file_size <= MAX_FILE_SIZE_KB * 1024:
+                return file
+            transcoded = fit_image(file, MAX_FILE_SIZE_KB * 1024)
+        except Image.DecompressionBombError:
+            file.close()
+            raise RequestDataTooBig(
+                f"Images cannot be larger than {get_max_pixels() // 1000000} "
+                f"megapixels."
+            )
+        except (OSError, ValueError):
+            # Not an image Pillow can read; leave it to the field validators.
+            logger.info("Could not transcode upload %s", self.file_name, exc_info=True)
+            return file
+        if transcoded is None:
+            return file
+        file.close()
+        return transcoded
+
+
+class ImageUploadMixin:
+    """
+    Runs `ImageUploadHandler` ahead of the `FILE_UPLOAD_HANDLERS` for the
+    viewset actions listed in `image_upload_actions`. Uploads to any other
+    endpoint are stored as they were sent.
+    """
+
+    image_upload_actions = ()
+
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action in self.image_upload_actions:
+            request.upload_handlers = [
+                ImageUploadHandler(request),
+                *request.upload_handlers,
+            ]
+        return drf_request
+
+
+def encode(image, image_format, quality, target):
+    target.seek(0)
+    target.truncate()
+    options = {"quality": quality}
+    if image_format == "JPEG":
+        options.update(progressive=True, optimize=True)
+    image.save(target, image_format, **options)
+    target.flush()
+    return target.tell()
+
+
+def fit_image(file, max_bytes):
+    """
+    Re-encode the uploaded image `file` into a new temporary upload of at
+    most `max_bytes`, lowering the quality and then the dimensions as
+    needed. Images above `IMAGE_UPLOAD_MAX_PIXELS` are refused before they
+    are decoded (see `check_pixels`); below it, JPEGs are decoded straight at
+    the reduced size and other formats at full size. Returns None when the
+    budget cannot be met.
+    """
+    max_dimension = getattr(settings, "IMAGE_UPLOAD_MAX_DIMENSION", 2048)
+    with Image.open(file.temporary_file_path()) as image:
+        check_pixels(image)
+        if image.format == "JPEG":
+            image.draft("RGB", (max_dimension, max_dimension))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    # WebP keeps transparency; everything else becomes a progressive JPEG.
+    image_format, extension, content_type = (
+        ("WEBP", ".webp", "image/webp")
+        if has_alpha
+        else ("JPEG", ".jpg", "image/jpeg")
+    )
+    name = os.path.splitext(file.name)[0] + extension
+    target = TemporaryUploadedFile(name, content_type, 0, None)
+    while True:
+        for quality in QUALITY_STEPS:
+            size = encode(image, image_format, quality, target)
+            if size <= max_bytes:
+                target.seek(0)
+                target.size = size
+                return target
+        width, height = image.size
+        if min(width, height) * SHRINK_FACTOR < MIN_DIMENSION:
+            target.close()
+            return None
+        image = image.resize(
+            (round(width * SHRINK_FACTOR), round(height * SHRINK_FACTOR)),
+            Image.LANCZOS,
+        )
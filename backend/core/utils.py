@@ -1,11 +1,10 @@
-from django.core.mail import send_mail
 from django.conf import settings
+from core.outbox import enqueue_email
 
 def send_email(recipient_list, subject, message):
-    send_mail(
+    enqueue_email(
         subject=subject,
         message=message,
         from_email=settings.DEFAULT_FROM_EMAIL,
         recipient_list=recipient_list,
-        fail_silently=False,
     )
@@ -1,8 +1,10 @@
 from django.core.exceptions import ValidationError
 
+MAX_FILE_SIZE_KB = 500
+
 
 def validate_file_size(file):
-    max_size_kb = 500
+    max_size_kb = MAX_FILE_SIZE_KB
 
     if file.size > max_size_kb * 1024:
         raise ValidationError(f'Files cannot be larger than {max_size_kb}KB!')
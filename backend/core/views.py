@@ -9,6 +9,7 @@ from .models import (
     Review,
     Room,
     RoomImage,
+    RoomListing,
     Bill,
     Apartment,
 )
@@ -19,27 +20,39 @@ from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework import permissions, status
 from rest_framework.filters import OrderingFilter, SearchFilter
-from core.filters import RoomFilter
-from core.pagination import DefaultPagination
+from core.filters import (
+    DistanceOrderingFilter,
+    RoomFilter,
+    RoomListingFilter,
+    RoomSearchFilter,
+)
+from core.clusters import get_clusters
+from core.downloads import serve_file
+from core.facets import get_facets
+from core.fastlist import FastListMixin
+from core.conditional import ConditionalGetMixin
+from core.feedcache import FeedCacheMixin
+from core.fieldsets import SparseFieldsetViewMixin
+from core.outbox import enqueue_email
+from core.pagination import DefaultPagination, FeedPagination
+from core.prefetch import PrefetchPlanMixin, prefetch_for
+from core.querybudget import QueryBudget
+from core.uploads import ImageUploadMixin
 from core.permissions import (
     IsApartmentOwner,
     IsAuthenticated,
     IsSearcher,
 )
-from django.core.mail import send_mail
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.http import HttpResponse
 from django.conf import settings
 import os
-import mimetypes
-from django.http import FileResponse
 from rest_framework import mixins, viewsets
 from django.db.models import Q
 from django.core.exceptions import ObjectDoesNotExist
 
 
-class ApartmentImageViewSet(ModelViewSet):
+class ApartmentImageViewSet(SparseFieldsetViewMixin, PrefetchPlanMixin, ModelViewSet):
     serializer_class = serializers.ApartmentImageSerializer
     queryset = ApartmentImage.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsApartmentOwner]
@@ -50,7 +63,7 @@ class ApartmentImageViewSet(ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RoomImageViewSet(ModelViewSet):
+class RoomImageViewSet(SparseFieldsetViewMixin, PrefetchPlanMixin, ModelViewSet):
     serializer_class = serializers.RoomImageSerializer
     queryset = RoomImage.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsApartmentOwner]
@@ -61,7 +74,7 @@ class RoomImageViewSet(ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ApartmentViewSet(ModelViewSet):
+class ApartmentViewSet(SparseFieldsetViewMixin, PrefetchPlanMixin, ModelViewSet):
     serializer_class = serializers.ApartmentSerializer
     queryset = Apartment.objects.all()
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -82,7 +95,7 @@ class ApartmentViewSet(ModelViewSet):
         "description",
         "size",
     ]
-    ordering_fields = ["price", "size"]
+    ordering_fields = ["price", "size", "size_sqm"]
     permission_classes_by_action = {
         "create": [permissions.IsAuthenticated, IsApartmentOwner],
         "update": [permissions.IsAuthenticated, IsApartmentOwner],
@@ -105,7 +118,10 @@ class ApartmentViewSet(ModelViewSet):
     @action(detail=True)
     def contracts(self, request, pk=None):
         apartment = self.get_object()
-        contracts = Contract.objects.filter(room__apartment=apartment)
+        contracts = prefetch_for(
+            Contract.objects.filter(room__apartment=apartment),
+            serializers.ContractSerializer,
+        )
         serializer = serializers.ContractSerializer(contracts, many=True)
         return Response(serializer.data)
 
@@ -125,9 +141,7 @@ class ApartmentViewSet(ModelViewSet):
             "I am interested in the apartment. Please contact me at this email address: %s"
             % request.user.email
         )
-        send_mail(
-            subject, message, "from@example.com", [owner_email], fail_silently=False
-        )
+        enqueue_email(subject, message, "from@example.com", [owner_email])
         return Response({"message": "Email sent"})
 
     def get_queryset(self):
@@ -141,29 +155,60 @@ class ApartmentViewSet(ModelViewSet):
         serializer.save(owner=self.request.user)
 
 
-class PublicRoomViewSet(ReadOnlyModelViewSet):
-    serializer_class = serializers.RoomSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_class = RoomFilter
-    pagination_class = DefaultPagination
-    search_fields = [
-        "apartment__city",
-        "apartment__street",
-        "apartment__building_number",
-        "apartment__apartment_number",
-        "apartment__floor",
-        "size",
-    ]
-    ordering_fields = ["price_per_month"]
+class PublicRoomViewSet(
+    ConditionalGetMixin,
+    FeedCacheMixin,
+    FastListMixin,
+    SparseFieldsetViewMixin,
+    PrefetchPlanMixin,
+    ReadOnlyModelViewSet,
+):
+    serializer_class = serializers.RoomListingSerializer
+    filter_backends = [DjangoFilterBackend, RoomSearchFilter, DistanceOrderingFilter]
+    filterset_class = RoomListingFilter
+    pagination_class = FeedPagination
+    ordering_fields = ["price_per_month", "size_sqm", "distance"]
     permission_classes = [permissions.AllowAny]
+    conditional_updated_field = None
+    # `?near=` reads its radius candidates in one more query.
+    query_budget = {
+        "list": QueryBudget(max_queries=5, max_repeats=1),
+        "retrieve": QueryBudget(max_queries=3, max_repeats=1),
+        "clusters": QueryBudget(max_queries=1, max_repeats=1),
+        "facets": QueryBudget(max_queries=2, max_repeats=1),
+    }
 
     def get_queryset(self):
-        return Room.objects.filter(renter=None)
+        return RoomListing.objects.all()
+
+    @action(detail=False)
+    def clusters(self, request):
+        """
+        Map clusters of the vacant rooms for `?bbox=west,south,east,north`
+        and `?zoom=`, with the feed filters and `?search=`: `{"zoom",
+        "clusters": [{geohash, count, min_price, max_price, latitude,
+        longitude}, ...]}`.
+        """
+        queryset = RoomSearchFilter().filter_queryset(
+            request, self.get_queryset(), self
+        )
+        return Response(get_clusters(request, queryset, self.filterset_class))
 
+    @action(detail=False)
+    def facets(self, request):
+        """
+        Result counts per `RoomListingFilter` option and price bucket for the
+        current filters and `?search=`, for the search UI.
+        """
+        queryset = RoomSearchFilter().filter_queryset(
+            request, self.get_queryset(), self
+        )
+        return Response(get_facets(request, queryset, self.filterset_class))
 
-class RoomViewSet(ModelViewSet):
+
+class RoomViewSet(SparseFieldsetViewMixin, PrefetchPlanMixin, ModelViewSet):
     serializer_class = serializers.RoomSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, SearchFilter, DistanceOrderingFilter]
     filterset_class = RoomFilter
     pagination_class = DefaultPagination
     search_fields = [
@@ -174,7 +219,7 @@ class RoomViewSet(ModelViewSet):
         "apartment__floor",
         "size",
     ]
-    ordering_fields = ["price_per_month"]
+    ordering_fields = ["price_per_month", "size_sqm", "distance"]
 
     def get_permissions(self):
         if self.action in [
@@ -263,10 +308,11 @@ class RoomViewSet(ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class CustomUserViewSet(ModelViewSet):
+class CustomUserViewSet(ImageUploadMixin, ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = serializers.CustomUserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    image_upload_actions = ("create", "update", "partial_update", "patch")
 
     @action(detail=True, methods=["patch"])
     def patch(self, request, *args, **kwargs):
@@ -302,17 +348,13 @@ class CustomUserViewSet(ModelViewSet):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-
-        # If the avatar field is included in the request, save the file and update the user model
-        if "avatar" in request.FILES:
-            instance.avatar = request.FILES["avatar"]
-            instance.save()
-
+        # The serializer saves an uploaded avatar; saving it here as well
+        # would store the file twice, or fail once a temporary upload moved.
         self.perform_update(serializer)
         return Response(serializer.data)
 
 
-class ContractViewSet(ModelViewSet):
+class ContractViewSet(SparseFieldsetViewMixin, PrefetchPlanMixin, ModelViewSet):
     queryset = Contract.objects.all()
     serializer_class = serializers.ContractSerializer
     permission_classes = [IsAuthenticated, IsApartmentOwner]
@@ -342,7 +384,8 @@ class ContractViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
         contract = self.perform_create(serializer)
         room.contract = contract
-        room.save()
+        # The room's listing and the feed cache follow through its signals.
+        room.save(update_fields=["contract"])
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
@@ -363,13 +406,9 @@ class ContractViewSet(ModelViewSet):
 
         file_path = contract.file.path
         if os.path.exists(file_path):
-            response = FileResponse(
-                open(file_path, "rb"), content_type="application/octet-stream"
+            return serve_file(
+                request, file_path, content_type="application/octet-stream"
             )
-            response[
-                "Content-Disposition"
-            ] = f"attachment; filename={os.path.basename(file_path)}"
-            return response
         else:
             return Response(
                 {"error": "File not found."}, status=status.HTTP_404_NOT_FOUND
@@ -385,7 +424,7 @@ class ContractViewSet(ModelViewSet):
         return Response({"message": "File deleted successfully."})
 
 
-class BillViewSet(ModelViewSet):
+class BillViewSet(SparseFieldsetViewMixin, PrefetchPlanMixin, ModelViewSet):
     serializer_class = serializers.BillSerializer
     permission_classes = [permissions.IsAuthenticated, IsApartmentOwner]
 
@@ -421,19 +460,12 @@ class BillViewSet(ModelViewSet):
 
     @action(detail=True, methods=["get"])
     def download(self, request, apartment_id=None, bill_id=None):
-        bill = get_object_or_404(Bill, id=bill_id, apartment_id=apartment_id)
+        bill = get_object_or_404(
+            self.get_queryset(), id=bill_id, apartment_id=apartment_id
+        )
         file_path = os.path.join(settings.MEDIA_ROOT, str(bill.file))
         if os.path.exists(file_path):
-            content_type, encoding = mimetypes.guess_type(file_path)
-            content_type = content_type or "application/octet-stream"
-            with open(file_path, "rb") as fh:
-                response = HttpResponse(fh.read(), content_type=content_type)
-                response[
-                    "Content-Disposition"
-                ] = f"attachment; filename={os.path.basename(file_path)}"
-                if encoding:
-                    response["Content-Encoding"] = encoding
-                return response
+            return serve_file(request, file_path)
         return Response(
             {"message": "File not found."}, status=status.HTTP_404_NOT_FOUND
         )
@@ -463,6 +495,8 @@ class ReviewViewSet(ModelViewSet):
 
 
 class ApartmentInquiryViewSet(
+    SparseFieldsetViewMixin,
+    PrefetchPlanMixin,
     mixins.CreateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
 ):
     queryset = Inquiry.objects.all()
@@ -519,7 +553,13 @@ class ApartmentInquiryViewSet(
             return room.apartment if room else None
 
 
-class UserInquiryViewSet(viewsets.ModelViewSet):
+class UserInquiryViewSet(
+    ConditionalGetMixin,
+    FastListMixin,
+    SparseFieldsetViewMixin,
+    PrefetchPlanMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Inquiry.objects.all()
     serializer_class = serializers.InquirySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -543,6 +583,11 @@ class UserInquiryViewSet(viewsets.ModelViewSet):
         "receiver__username",
     ]
     ordering_fields = ["created_at"]
+    conditional_versions = ("feed", "inquiries")
+    query_budget = {
+        "list": QueryBudget(max_queries=9, max_repeats=1),
+        "retrieve": QueryBudget(max_queries=8, max_repeats=1),
+    }
 
     def get_queryset(self):
         user = self.request.user
@@ -567,6 +612,8 @@ class UserInquiryViewSet(viewsets.ModelViewSet):
 
 
 class InquiryReplyViewSet(
+    SparseFieldsetViewMixin,
+    PrefetchPlanMixin,
     mixins.CreateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet
 ):
     queryset = InquiryReply.objects.all()
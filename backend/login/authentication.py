@@ -1,6 +1,7 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.conf import settings
 from datetime import datetime
+from functools import partial
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.authentication import CSRFCheck
@@ -8,6 +9,8 @@ from rest_framework import exceptions
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.response import Response
 from django.middleware import csrf
+from rest_framework_simplejwt.settings import api_settings
+from login import cache
 
 def enforce_csrf(get_response):
     def middleware(request):
@@ -19,7 +22,60 @@ def enforce_csrf(get_response):
         return get_response(request)
     return middleware
 
+class RequestAuthentication:
+    """
+    Request-scoped JWT authentication result. Whichever layer authenticates
+    the request first (JWTAuthenticationMiddleware or CustomAuthentication)
+    stores the validated token and user here, and later layers reuse them.
+    `token_decodes` and `user_lookups` count the work actually done.
+    """
+
+    def __init__(self):
+        self.raw_token = None
+        self.result = None
+        self.error = None
+        self.token_decodes = 0
+        self.user_lookups = 0
+
+    @classmethod
+    def for_request(cls, request):
+        # DRF wraps the Django request; keep the result on the inner one.
+        request = getattr(request, "_request", request)
+        auth = getattr(request, "jwt_auth", None)
+        if auth is None:
+            auth = request.jwt_auth = cls()
+        return auth
+
+    def authenticate(self, raw_token, authentication):
+        if raw_token != self.raw_token:
+            self.raw_token = raw_token
+            self.result = self.error = None
+            try:
+                self.token_decodes += 1
+                validated_token = authentication.get_validated_token(raw_token)
+                self.user_lookups += 1
+                user = authentication.get_user(validated_token)
+            except exceptions.AuthenticationFailed as error:
+                self.error = error
+            else:
+                self.result = (user, validated_token)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
 class CustomAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        return cache.get_validated_token(raw_token, super().get_validated_token)
+
+    def get_user(self, validated_token):
+        if getattr(api_settings, "CHECK_REVOKE_TOKEN", False):
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        return cache.get_user(user_id, partial(super().get_user, validated_token))
+
     def authenticate(self, request):
         header = self.get_header(request)
         
@@ -30,9 +86,9 @@ class CustomAuthentication(JWTAuthentication):
         if raw_token is None:
             return None
 
-        validated_token = self.get_validated_token(raw_token)
+        result = RequestAuthentication.for_request(request).authenticate(raw_token, self)
         enforce_csrf(request)
-        return self.get_user(validated_token), validated_token
+        return result
     
 class ExpiredTokenAuthentication(JWTAuthentication):
     def authenticate(self, request):
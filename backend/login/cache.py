@@ -0,0 +1,134 @@
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+class TTLCache:
+    """
+    Thread-safe, bounded LRU cache whose entries each carry their own expiry.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        if expires_at <= time.time():
+            return
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TTLCache(getattr(settings, "JWT_TOKEN_CACHE_SIZE", 1024))
+user_cache = TTLCache(getattr(settings, "JWT_USER_CACHE_SIZE", 1024))
+
+
+def token_digest(raw_token):
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    return hashlib.sha256(raw_token).hexdigest()
+
+
+def get_validated_token(raw_token, validate):
+    """
+    Return the validated token for `raw_token`, calling `validate` only when
+    it is not cached yet. Entries never outlive the token's `exp` claim.
+    """
+    key = token_digest(raw_token)
+    token = token_cache.get(key)
+    if token is None:
+        token = validate(raw_token)
+        expires_at = token.payload.get("exp")
+        if expires_at is not None:
+            token_cache.set(key, token, expires_at)
+    return token
+
+
+def get_ttl():
+    return getattr(settings, "JWT_USER_CACHE_TTL", 60)
+
+
+def get_shared_cache():
+    return caches[getattr(settings, "JWT_USER_CACHE_ALIAS", "default")]
+
+
+def version_key(user_id):
+    return f"auth:user:{user_id}:version"
+
+
+def get_user(user_id, load):
+    """
+    Return a copy of the cached user for `user_id`, calling `load` on a miss.
+
+    Users are cached per process, each entry tagged with the user's version
+    in the shared cache at load time. `invalidate_users` changes that version,
+    so a save or delete on any process makes every process reload the user;
+    a hit costs one shared cache read instead of a user query.
+    """
+    key = str(user_id)
+    version = get_shared_cache().get(version_key(key))
+    entry = user_cache.get(key)
+    if entry is None or entry[1] != version:
+        user = load()
+        user_cache.set(key, (user, version), time.time() + get_ttl())
+    else:
+        user = entry[0]
+    # Hand out copies so request-level changes never leak into the cache.
+    return copy.copy(user)
+
+
+def invalidate_users(user_ids):
+    """
+    Make every process reload the given users. Saves and deletes call this
+    through signals; bulk `QuerySet.update()`/`delete()` calls on users must
+    call it themselves.
+    """
+    shared = get_shared_cache()
+    for user_id in user_ids:
+        key = str(user_id)
+        user_cache.delete(key)
+        # Entries loaded before the bump expire with the version key, so it
+        # only has to outlive them.
+        shared.set(version_key(key), uuid.uuid4().hex, get_ttl() + 1)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user(sender, instance, using=None, **kwargs):
+    invalidate_users([instance.pk])
+    # Again once committed, so no process caches the uncommitted state.
+    transaction.on_commit(lambda: invalidate_users([instance.pk]), using=using)
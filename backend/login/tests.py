@@ -1,3 +1,129 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import CustomUser
+from login.cache import (
+    get_shared_cache,
+    get_user,
+    invalidate_users,
+    token_cache,
+    user_cache,
+    version_key,
+)
+
+JWT_MIDDLEWARE = settings.MIDDLEWARE + ["core.middleware.JWTAuthenticationMiddleware"]
+
+
+@override_settings(QUERY_COUNT_HEADERS=True)
+class RequestAuthenticationTests(APITestCase):
+    """Each request decodes its JWT once and looks its user up at most once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "renter", "renter@example.com", "pw", user_type="renter"
+        )
+
+    def setUp(self):
+        # Neither is rolled back with the test database.
+        token_cache.clear()
+        user_cache.clear()
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def get(self):
+        self.client.handler.load_middleware()
+        response = self.client.get("/core/inquiries/")
+        return (
+            response,
+            int(response["X-Auth-Token-Decodes"]),
+            int(response["X-Auth-User-Lookups"]),
+        )
+
+    def test_cookie_through_middleware_and_drf(self):
+        self.client.cookies[settings.SIMPLE_JWT["AUTH_COOKIE"]] = self.token
+        with self.settings(MIDDLEWARE=JWT_MIDDLEWARE):
+            for _ in range(2):
+                response, decodes, lookups = self.get()
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(decodes, 1)
+                self.assertLessEqual(lookups, 1)
+
+    def test_header_through_drf(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        response, decodes, lookups = self.get()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((decodes, lookups), (1, 1))
+
+    def test_unauthenticated(self):
+        with self.settings(MIDDLEWARE=JWT_MIDDLEWARE):
+            response, decodes, lookups = self.get()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual((decodes, lookups), (0, 0))
+
+
+class UserCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            "renter", "renter@example.com", "pw", user_type="renter"
+        )
+
+    def setUp(self):
+        user_cache.clear()
+        get_shared_cache().clear()
+        self.loads = 0
+
+    def get(self):
+        def load():
+            self.loads += 1
+            return CustomUser.objects.get(pk=self.user.pk)
+
+        return get_user(self.user.pk, load)
+
+    def test_hit(self):
+        first, second = self.get(), self.get()
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(first.pk, second.pk)
+        self.assertIsNot(first, second)
+
+    @override_settings(JWT_USER_CACHE_TTL=60)
+    def test_expiry(self):
+        self.get()
+        now = time.time()
+        with mock.patch("login.cache.time.time", return_value=now + 59):
+            self.get()
+        self.assertEqual(self.loads, 1)
+        with mock.patch("login.cache.time.time", return_value=now + 61):
+            self.get()
+        self.assertEqual(self.loads, 2)
+
+    def test_save_and_delete_invalidate(self):
+        self.get()
+        self.user.first_name = "Changed"
+        self.user.save()
+        self.assertEqual(self.get().first_name, "Changed")
+        self.assertEqual(self.loads, 2)
+        CustomUser.objects.get(pk=self.user.pk).delete()
+        with self.assertRaises(CustomUser.DoesNotExist):
+            self.get()
+
+    def test_invalidation_from_another_process(self):
+        self.get()
+        # Another process saved the user: only the shared version changes.
+        get_shared_cache().set(version_key(self.user.pk), "other")
+        self.get()
+        self.assertEqual(self.loads, 2)
+        self.get()
+        self.assertEqual(self.loads, 2)
+
+    def test_bulk_update(self):
+        self.get()
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertTrue(self.get().is_active)
+        invalidate_users([self.user.pk])
+        self.assertFalse(self.get().is_active)
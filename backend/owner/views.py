@@ -2,6 +2,12 @@ from django.shortcuts import get_object_or_404
 from core import serializers
 from core.models import Apartment, Bill, Contract, Room
 from core.permissions import IsApartmentOwner
+from core.conditional import ConditionalGetMixin
+from core.feedcache import FeedCacheMixin
+from core.includes import APARTMENT_INCLUDES, IncludeMixin
+from core.prefetch import prefetch_for
+from core.querybudget import QueryBudget
+from core.uploads import ImageUploadMixin
 from rest_framework import permissions, status
 from core.views import ApartmentViewSet, RoomViewSet
 from rest_framework.decorators import action
@@ -9,9 +15,24 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 
 
-class OwnerApartmentViewSet(ApartmentViewSet):
+class OwnerApartmentViewSet(
+    ImageUploadMixin,
+    ConditionalGetMixin,
+    IncludeMixin,
+    FeedCacheMixin,
+    ApartmentViewSet,
+):
     serializer_class = serializers.ApartmentSerializer
+    image_upload_actions = ("upload_image",)
+    include_relations = APARTMENT_INCLUDES
+    feed_cache_per_user = True
     permission_classes = [permissions.IsAuthenticated, IsApartmentOwner]
+    # Includes add a query per relation type, and side-loaded rooms prefetch
+    # their images a second time.
+    query_budget = {
+        "list": QueryBudget(max_queries=13, max_repeats=2),
+        "retrieve": QueryBudget(max_queries=12, max_repeats=2),
+    }
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -65,7 +86,10 @@ class OwnerApartmentViewSet(ApartmentViewSet):
     @action(detail=True)
     def contracts(self, request, pk=None):
         apartment = self.get_object()
-        contracts = Contract.objects.filter(room__apartment=apartment)
+        contracts = prefetch_for(
+            Contract.objects.filter(room__apartment=apartment),
+            serializers.ContractSerializer,
+        )
         serializer = serializers.ContractSerializer(contracts, many=True)
         return Response(serializer.data)
 
@@ -77,8 +101,9 @@ class OwnerApartmentViewSet(ApartmentViewSet):
         return Response(serializer.data)
 
 
-class OwnerRoomViewSet(RoomViewSet):
+class OwnerRoomViewSet(ImageUploadMixin, RoomViewSet):
     parser_classes = (MultiPartParser,)
+    image_upload_actions = ("upload_image",)
 
     def get_queryset(self):
         user = self.request.user
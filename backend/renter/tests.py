@@ -1,3 +1,92 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.feedcache import get_feed_cache
+from core.models import Apartment, Bill, Contract, CustomUser, Room
+from login.cache import user_cache
+
+
+def create_contract(owner):
+    return Contract.objects.create(
+        owner=owner,
+        start_date=datetime.date(2023, 1, 1),
+        end_date=datetime.date(2024, 1, 1),
+        rent_amount=Decimal("1000"),
+        deposit_amount=Decimal("500"),
+    )
+
+
+class RenterApartmentIncludeTests(APITestCase):
+    """`?include=` on /renter/my-apartment/ only side-loads the renter's own data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = CustomUser.objects.create_user(
+            "owner", "owner@example.com", "pw", user_type="owner"
+        )
+        cls.renter, cls.co_tenant = [
+            CustomUser.objects.create_user(
+                name, f"{name}@example.com", "pw", user_type="renter"
+            )
+            for name in ("renter", "cotenant")
+        ]
+        apartment = Apartment.objects.create(
+            owner=owner,
+            city="Haifa",
+            street="Herzl",
+            building_number="1",
+            apartment_number="1",
+            floor=1,
+            size="80",
+        )
+        cls.room, cls.other_room = [
+            Room.objects.create(
+                apartment=apartment,
+                price_per_month=1000,
+                size="10",
+                renter=renter,
+                contract=create_contract(owner),
+            )
+            for renter in (cls.renter, cls.co_tenant)
+        ]
+        cls.bill = Bill.objects.create(
+            apartment=apartment,
+            bill_type="gas",
+            amount=10,
+            date=datetime.date(2023, 1, 1),
+            created_by=owner,
+        )
+
+    def setUp(self):
+        # Neither is rolled back with the test database.
+        user_cache.clear()
+        get_feed_cache().clear()
+        token = RefreshToken.for_user(self.renter).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_co_tenant_room_and_contract_are_not_included(self):
+        response = self.client.get(
+            "/renter/my-apartment/", {"include": "rooms,rooms.contract,bills"}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        included = response.data["included"]
+        self.assertEqual([room["id"] for room in included["rooms"]], [self.room.pk])
+        self.assertEqual(
+            [contract["id"] for contract in included["contracts"]],
+            [self.room.contract_id],
+        )
+        self.assertEqual([bill["id"] for bill in included["bills"]], [self.bill.pk])
+
+    def test_contracts_alone_are_limited_too(self):
+        response = self.client.get(
+            "/renter/my-apartment/", {"include": "rooms.contract"}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn("rooms", response.data["included"])
+        self.assertEqual(
+            [contract["id"] for contract in response.data["included"]["contracts"]],
+            [self.room.contract_id],
+        )
@@ -1,10 +1,14 @@
-import mimetypes
 import os
 from django.conf import settings
-from django.http import FileResponse, Http404, HttpResponse
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from core.permissions import IsAuthenticated, IsRoomRenter
+from core.conditional import ConditionalGetMixin
+from core.downloads import serve_file
+from core.fieldsets import SparseFieldsetViewMixin
+from core.includes import APARTMENT_INCLUDES, IncludeMixin
+from core.prefetch import PrefetchPlanMixin, prefetch_for
 from rest_framework import permissions
 from rest_framework.response import Response
 from core.serializers import (
@@ -29,29 +33,54 @@ from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.response import Response
 
 
-class RenterApartmentViewSet(viewsets.ReadOnlyModelViewSet):
+class RenterApartmentViewSet(
+    ConditionalGetMixin, IncludeMixin, PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet
+):
     serializer_class = RenterApartmentSerializer
+    include_relations = APARTMENT_INCLUDES
     permission_classes = [permissions.IsAuthenticated, IsRoomRenter]
 
     def get_apartment(self):
         user = self.request.user
         room = Room.objects.filter(renter=user).first()
-        apartment = room.apartment if room else None
-        return apartment
+        if room is None:
+            return None
+        apartments = Apartment.objects.filter(pk=room.apartment_id)
+        return prefetch_for(apartments, self.get_serializer_class()).first()
 
     def get_queryset(self):
         return Apartment.objects.none()
 
+    def get_include_queryset(self, path, queryset):
+        # Co-tenants' rooms, and with them their contracts, stay private.
+        if path == "rooms":
+            return queryset.filter(renter=self.request.user)
+        return queryset
+
+    def get_conditional_queryset(self):
+        if self.action == "list":
+            return Apartment.objects.filter(rooms__renter=self.request.user)
+        return super().get_conditional_queryset()
+
     def list(self, request, *args, **kwargs):
+        return self.conditional(self.show_apartment, request, *args, **kwargs)
+
+    def show_apartment(self, request, *args, **kwargs):
+        includes = self.get_includes()
         apartment = self.get_apartment()
         if apartment:
             serializer = self.get_serializer(apartment)
-            return Response(serializer.data)
+            return self.add_included(Response(serializer.data), includes)
         else:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
 
-class RenterRoomViewSet(viewsets.ReadOnlyModelViewSet):
+class RenterRoomViewSet(
+    ConditionalGetMixin,
+    SparseFieldsetViewMixin,
+    PrefetchPlanMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     serializer_class = RoomSerializer
     permission_classes = [permissions.IsAuthenticated, IsRoomRenter]
 
@@ -59,26 +88,28 @@ class RenterRoomViewSet(viewsets.ReadOnlyModelViewSet):
         return Room.objects.filter(renter=self.request.user)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset().first()
+        return self.conditional(self.show_room, request, *args, **kwargs)
+
+    def show_room(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).first()
         if not queryset:
             return Response(status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(queryset)
         return Response(serializer.data)
 
 
-class RenterBillViewSet(viewsets.ReadOnlyModelViewSet):
+class RenterBillViewSet(
+    ConditionalGetMixin,
+    SparseFieldsetViewMixin,
+    PrefetchPlanMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     serializer_class = BillSerializer
     permission_classes = [permissions.IsAuthenticated, IsRoomRenter]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
 
     def get_queryset(self):
-        user = self.request.user
-        try:
-            room = user.rooms_rented
-            apartment = room.apartment
-            return Bill.objects.filter(apartment=apartment)
-        except Room.DoesNotExist:
-            return Bill.objects.none()
+        return Bill.objects.filter(apartment__rooms__renter=self.request.user)
 
     @action(detail=True, methods=["post"])
     def pay(self, request, pk=None):
@@ -95,25 +126,18 @@ class RenterBillViewSet(viewsets.ReadOnlyModelViewSet):
         detail=False, methods=["get"], url_path=r"my-bills/(?P<bill_id>\d+)/download"
     )
     def download(self, request, bill_id=None):
-        bill = get_object_or_404(Bill, id=bill_id)
+        bill = get_object_or_404(self.get_queryset(), id=bill_id)
         file_path = os.path.join(settings.MEDIA_ROOT, str(bill.file))
         if os.path.exists(file_path):
-            content_type, encoding = mimetypes.guess_type(file_path)
-            content_type = content_type or "application/octet-stream"
-            with open(file_path, "rb") as fh:
-                response = HttpResponse(fh.read(), content_type=content_type)
-                response[
-                    "Content-Disposition"
-                ] = f"attachment; filename={os.path.basename(file_path)}"
-                if encoding:
-                    response["Content-Encoding"] = encoding
-                return response
+            return serve_file(request, file_path)
         return Response(
             {"message": "File not found."}, status=status.HTTP_404_NOT_FOUND
         )
 
 
-class RenterContractViewSet(viewsets.ModelViewSet):
+class RenterContractViewSet(
+    SparseFieldsetViewMixin, PrefetchPlanMixin, viewsets.ModelViewSet
+):
     serializer_class = ContractSerializer
     permission_classes = [IsAuthenticated, IsRoomRenter]
 
@@ -142,13 +166,9 @@ class RenterContractViewSet(viewsets.ModelViewSet):
 
         file_path = contract.file.path
         if os.path.exists(file_path):
-            response = FileResponse(
-                open(file_path, "rb"), content_type="application/octet-stream"
+            return serve_file(
+                request, file_path, content_type="application/octet-stream"
             )
-            response[
-                "Content-Disposition"
-            ] = f"attachment; filename={os.path.basename(file_path)}"
-            return response
         else:
             return Response(
                 {"error": "File not found."}, status=status.HTTP_404_NOT_FOUND
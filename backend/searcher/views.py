@@ -1,14 +1,20 @@
 import os
-from django.http import FileResponse, Http404
+from django.http import Http404
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework import permissions
 from core import serializers
-from core.filters import RoomFilter
-from core.models import Contract, Room
+from core.filters import DistanceOrderingFilter, RoomListingFilter, RoomSearchFilter
+from core.models import Contract, Room, RoomListing
 from rest_framework import viewsets, permissions
 from django.db.models import Q
-from core.pagination import DefaultPagination
+from core.conditional import ConditionalGetMixin
+from core.fastlist import FastListMixin
+from core.feedcache import FeedCacheMixin
+from core.fieldsets import SparseFieldsetViewMixin
+from core.pagination import FeedPagination
+from core.downloads import serve_file
+from core.prefetch import PrefetchPlanMixin, prefetch_for
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework import status
@@ -20,40 +26,46 @@ from searcher.serializers import SearcherRoomSerializer
 from django.db.models import Q
 
 
-class SearcherRoomViewSet(viewsets.ReadOnlyModelViewSet):
+class SearcherRoomViewSet(
+    ConditionalGetMixin,
+    FeedCacheMixin,
+    FastListMixin,
+    SparseFieldsetViewMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     serializer_class = SearcherRoomSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_class = RoomFilter
-    pagination_class = DefaultPagination
-    search_fields = [
-        "apartment__city",
-        "apartment__street",
-        "apartment__building_number",
-        "apartment__apartment_number",
-        "apartment__floor",
-    ]
+    conditional_updated_field = None
+    filter_backends = [DjangoFilterBackend, RoomSearchFilter, DistanceOrderingFilter]
+    filterset_class = RoomListingFilter
+    pagination_class = FeedPagination
 
-    ordering_fields = ["price_per_month"]
+    ordering_fields = ["price_per_month", "size_sqm", "distance"]
 
     def get_queryset(self):
-        query = self.request.query_params.get("search")
-        if query:
-            queryset = Room.objects.filter(
-                Q(apartment__city__icontains=query)
-                | Q(apartment__street__icontains=query)
-                | Q(apartment__building_number__icontains=query)
-                | Q(apartment__apartment_number__icontains=query)
-                | Q(apartment__floor__icontains=query)
-                | Q(size__icontains=query),
-                renter=None,
-            )
-        else:
-            queryset = Room.objects.filter(renter=None)
-        return queryset
+        return RoomListing.objects.all()
+
+    def get_rooms(self):
+        return prefetch_for(
+            Room.objects.all(), self.get_serializer_class(), self.get_fieldset()
+        )
+
+    def get_object(self):
+        return self.get_rooms().get(pk=super().get_object().pk)
+
+    def paginate_queryset(self, queryset):
+        # Filter, order and paginate on the flat listing table, then load the
+        # full rooms for the page only, since the payload nests the apartment.
+        listings = super().paginate_queryset(queryset)
+        if listings is None:
+            return None
+        rooms = self.get_rooms().in_bulk([listing.pk for listing in listings])
+        return [rooms[listing.pk] for listing in listings if listing.pk in rooms]
 
 
-class SearcherContractViewSet(viewsets.ReadOnlyModelViewSet):
+class SearcherContractViewSet(
+    SparseFieldsetViewMixin, PrefetchPlanMixin, viewsets.ReadOnlyModelViewSet
+):
     serializer_class = serializers.ContractSerializer
     permission_classes = [IsAuthenticated]
 
@@ -84,13 +96,9 @@ class SearcherContractViewSet(viewsets.ReadOnlyModelViewSet):
 
         file_path = contract.file.path
         if os.path.exists(file_path):
-            response = FileResponse(
-                open(file_path, "rb"), content_type="application/octet-stream"
+            return serve_file(
+                request, file_path, content_type="application/octet-stream"
             )
-            response[
-                "Content-Disposition"
-            ] = f"attachment; filename={os.path.basename(file_path)}"
-            return response
         else:
             return Response(
                 {"error": "File not found."},